@@ -0,0 +1,89 @@
+"""Tests of splitting long jobs to chunks, and of stitching their results."""
+from typing import Any
+
+from whisper_qt.chunking import CHUNK_OVERLAP_SECONDS
+from whisper_qt.chunking import chunk_ranges
+from whisper_qt.chunking import ChunkedTranscription
+from whisper_qt.chunking import stitch_point
+from whisper_qt.jobs import TranscriptionJob
+
+
+def create_segments(start: float, end: float, text: str) -> list[dict[str, Any]]:
+    """Create a segment for every 10 seconds from `start` to `end`."""
+    return [
+        {"start": float(time), "end": float(time + 10), "text": text}
+        for time in range(int(start), int(end), 10)
+    ]
+
+
+def test_short_audio_is_one_chunk() -> None:
+    """Audio under the minimum chunk length is not split."""
+    assert chunk_ranges(300, 4) == [(0, 300)]
+
+
+def test_chunks_overlap() -> None:
+    """Every chunk overlaps with the next one, and the last ends with the audio."""
+    assert chunk_ranges(3000, 3) == [
+        (0, 1000 + CHUNK_OVERLAP_SECONDS),
+        (1000, 2000 + CHUNK_OVERLAP_SECONDS),
+        (2000, 3000),
+    ]
+
+
+def test_stitch_point_in_silence() -> None:
+    """Chunks are stitched in the longest silence in the middle of the overlap."""
+    segments = [
+        {"start": 590.0, "end": 608.0},
+        {"start": 610.0, "end": 616.0},
+        {"start": 620.0, "end": 630.0},
+    ]
+
+    assert stitch_point(segments, 600) == 618
+
+
+def test_stitch_point_without_silence() -> None:
+    """Without a silence, chunks are stitched in the middle of the overlap."""
+    segments = create_segments(590, 640, "")
+
+    assert stitch_point(segments, 600) == 600 + CHUNK_OVERLAP_SECONDS / 2
+
+
+def test_stitch() -> None:
+    """Every part of the audio is in the stitched result once, in order."""
+    job = TranscriptionJob("audio.mp3", "output", "tiny", "cpu", "Auto", {})
+    chunked = ChunkedTranscription(job, 1800, 3)
+    assert [chunk.chunk for chunk in chunked.chunks] == [
+        (0, 630),
+        (600, 1230),
+        (1200, 1800),
+    ]
+
+    # The chunks can finish in any order.
+    for index in (2, 0, 1):
+        assert not chunked.finished
+        start, end = chunked.chunks[index].chunk or (0, 0)
+        chunked.add_result(
+            chunked.chunks[index], create_segments(start, end, str(index)), "en"
+        )
+    assert chunked.finished
+
+    result = chunked.stitch()
+    segments = result["segments"]
+
+    assert [segment["start"] for segment in segments] == list(range(0, 1800, 10))
+    assert [segment["id"] for segment in segments] == list(range(len(segments)))
+    # The segment in the middle of the overlap is from the next chunk.
+    assert segments[60]["text"] == "0"
+    assert segments[61]["text"] == "1"
+    assert result["text"] == "".join(segment["text"] for segment in segments)
+    assert result["language"] == "en"
+
+
+def test_position_of_chunks() -> None:
+    """The position of the whole job adds the positions of its chunks."""
+    job = TranscriptionJob("audio.mp3", "output", "tiny", "cpu", "Auto", {})
+    chunked = ChunkedTranscription(job, 1800, 3)
+
+    assert chunked.update_position(chunked.chunks[0], 100) == 100
+    assert chunked.update_position(chunked.chunks[2], 50) == 150
+    assert chunked.update_position(chunked.chunks[0], 630) == 680
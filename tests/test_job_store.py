@@ -0,0 +1,166 @@
+"""Tests of the states of stored jobs, and of the retries of failed ones."""
+import sqlite3
+import time
+from pathlib import Path
+from typing import cast
+from typing import Iterator
+
+import pytest
+
+from whisper_qt.job_store import JobStore
+from whisper_qt.job_store import MAX_RETRY_BACKOFF
+from whisper_qt.jobs import TranscriptionJob
+
+# Id of a process that can't exist, since it's over the Linux limit.
+STOPPED_PID = 2**31 - 1
+
+
+def create_job(file: str = "audio.mp3") -> TranscriptionJob:
+    """Create a job with the default options."""
+    return TranscriptionJob(file, "output", "tiny", "cpu", "Auto", {})
+
+
+def store_ids(*jobs: TranscriptionJob) -> list[int]:
+    """Get the store ids of jobs that were added."""
+    return [cast(int, job.store_id) for job in jobs]
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Iterator[JobStore]:
+    """Open a job store in a temporary directory."""
+    job_store = JobStore(tmp_path / "jobs.sqlite3", max_attempts=3, retry_backoff=30)
+    try:
+        yield job_store
+    finally:
+        job_store.close()
+
+
+def test_add_queues_jobs(store: JobStore) -> None:
+    """Added jobs get their store ids, and are queued."""
+    jobs = [create_job("a.mp3"), create_job("b.mp3")]
+    store.add(jobs, "batch")
+
+    assert all(job.store_id is not None for job in jobs)
+    assert jobs[0].store_id != jobs[1].store_id
+    assert store.counts()["queued"] == 2
+
+
+def test_success(store: JobStore) -> None:
+    """A job that succeeds is done, and is not retried."""
+    job = create_job()
+    store.add([job], "batch")
+    store.started(job)
+    assert store.counts()["running"] == 1
+
+    assert store.finished(job, True) is None
+    assert store.counts()["done"] == 1
+    assert store.next_retry(store_ids(job)) is None
+
+
+def test_failures_back_off(store: JobStore) -> None:
+    """The wait before a retry doubles, until the last attempt fails for good."""
+    job = create_job()
+    job.error = "Broken file."
+    store.add([job], "batch")
+
+    waits = []
+    for _ in range(store.max_attempts):
+        store.started(job)
+        before = time.time()
+        retry_at = store.finished(job, False)
+        waits.append(None if retry_at is None else retry_at - before)
+
+    assert waits[0] == pytest.approx(30, abs=1)
+    assert waits[1] == pytest.approx(60, abs=1)
+    assert waits[2] is None
+    assert store.next_retry(store_ids(job)) is None
+    assert [failure["error"] for failure in store.failures()] == ["Broken file."]
+
+
+def test_backoff_is_capped(tmp_path: Path) -> None:
+    """A retry waits at most `MAX_RETRY_BACKOFF` seconds."""
+    store = JobStore(tmp_path / "jobs.sqlite3", max_attempts=10, retry_backoff=3000)
+    job = create_job()
+    store.add([job], "batch")
+
+    for _ in range(2):
+        store.started(job)
+        before = time.time()
+        retry_at = store.finished(job, False)
+    store.close()
+
+    assert retry_at is not None
+    assert retry_at - before == pytest.approx(MAX_RETRY_BACKOFF, abs=1)
+
+
+def test_due_retries(tmp_path: Path) -> None:
+    """A failed job is retried as a new job of the same stored job, once it's due."""
+    store = JobStore(tmp_path / "jobs.sqlite3", max_attempts=2, retry_backoff=0)
+    job = create_job()
+    store.add([job], "batch")
+    store.started(job)
+    retry_at = store.finished(job, False)
+
+    assert store.next_retry(store_ids(job)) == retry_at
+    (retry,) = store.due_retries(store_ids(job))
+    assert retry.store_id == job.store_id
+    assert retry.job_id != job.job_id
+    assert retry.audio_file_path == job.audio_file_path
+
+    store.started(retry)
+    assert store.finished(retry, False) is None
+    assert store.due_retries(store_ids(job)) == []
+    store.close()
+
+
+def test_retries_wait(store: JobStore) -> None:
+    """A failed job is not retried before its wait is over."""
+    job = create_job()
+    store.add([job], "batch")
+    store.started(job)
+    store.finished(job, False)
+
+    assert store.due_retries(store_ids(job)) == []
+
+
+def test_cancel(store: JobStore) -> None:
+    """Queued and retried jobs are cancelled, and the done ones stay done."""
+    done, queued, retried = create_job("a.mp3"), create_job("b.mp3"), create_job()
+    store.add([done, queued, retried], "gui")
+    store.started(done)
+    store.finished(done, True)
+    store.started(retried)
+    store.finished(retried, False)
+
+    store.cancel(store_ids(done, queued, retried))
+
+    assert store.counts()["done"] == 1
+    assert store.counts()["cancelled"] == 2
+    assert store.next_retry(store_ids(retried)) is None
+
+
+def test_claim_unfinished(store: JobStore) -> None:
+    """The cancelled jobs of a source are claimed once, in the order of adding."""
+    jobs = [create_job("a.mp3"), create_job("b.mp3")]
+    store.add(jobs, "gui")
+    store.add([create_job("c.mp3")], "batch")
+    store.cancel(store_ids(*jobs))
+
+    claimed = store.claim_unfinished("gui")
+
+    assert store_ids(*claimed) == store_ids(*jobs)
+    assert [job.audio_file_path for job in claimed] == ["a.mp3", "b.mp3"]
+    assert store.claim_unfinished("gui") == []
+
+
+def test_recover(store: JobStore) -> None:
+    """The running jobs of a process that stopped are queued again."""
+    job = create_job()
+    store.add([job], "batch")
+    store.started(job)
+    with sqlite3.connect(store.path) as connection:
+        connection.execute("UPDATE jobs SET pid = ?", (STOPPED_PID,))
+
+    assert store.recover() == 1
+    assert store.counts()["queued"] == 1
+    assert store_ids(*store.claim_unfinished("batch")) == store_ids(job)
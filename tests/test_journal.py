@@ -0,0 +1,33 @@
+"""Tests of the keys of the journals that resume interrupted jobs."""
+from pathlib import Path
+
+from whisper_qt.jobs import TranscriptionJob
+from whisper_qt.whisper_process import journal_key
+
+
+def create_job(audio_file_path: Path) -> TranscriptionJob:
+    """Create a job of a file with the default options."""
+    return TranscriptionJob(str(audio_file_path), "output", "tiny", "cpu", "Auto", {})
+
+
+def test_key_ignores_locked_language(tmp_path: Path) -> None:
+    """A job finds its journal when its language is locked differently."""
+    audio_file_path = tmp_path / "audio.mp3"
+    audio_file_path.write_bytes(b"audio")
+    job, locked = create_job(audio_file_path), create_job(audio_file_path)
+    locked.locked_language = "English"
+
+    assert journal_key(locked) == journal_key(job)
+
+
+def test_key_changes_with_decoding_options(tmp_path: Path) -> None:
+    """A job with other decoding options doesn't use the journal of another job."""
+    audio_file_path = tmp_path / "audio.mp3"
+    audio_file_path.write_bytes(b"audio")
+    job, other = create_job(audio_file_path), create_job(audio_file_path)
+    other.options["temperature"] = 0.5
+    vad = create_job(audio_file_path)
+    vad.vad_aggressiveness = 2
+
+    assert journal_key(other) != journal_key(job)
+    assert journal_key(vad) != journal_key(job)
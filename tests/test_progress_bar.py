@@ -0,0 +1,46 @@
+"""Tests of the progress bar that reports whisper's progress from the workers."""
+import io
+from typing import Any
+from typing import Iterator
+
+import pytest
+
+pytest.importorskip("tqdm")
+
+from whisper_qt.progress_bar import ProgressBar  # noqa: E402
+
+
+@pytest.fixture
+def events() -> Iterator[list[tuple[str, Any]]]:
+    """Install a callback that collects the reported events, like the worker."""
+    reported: list[tuple[str, Any]] = []
+    ProgressBar.report = lambda kind, data: reported.append((kind, data))
+    try:
+        yield reported
+    finally:
+        ProgressBar.report = None
+
+
+def test_reports_decoded_duration(events: list[tuple[str, Any]]) -> None:
+    """The duration is reported when whisper creates the bar."""
+    with ProgressBar(total=3000, file=io.StringIO()):
+        pass
+
+    assert events == [("decoded", 30.0)]
+
+
+def test_reports_segments(events: list[tuple[str, Any]]) -> None:
+    """Every update reports the segment number, the position and the duration."""
+    with ProgressBar(total=3000, file=io.StringIO()) as bar:
+        bar.update(1000)
+        bar.update(500)
+
+    assert events[1:] == [("segment", (1, 10.0, 30.0)), ("segment", (2, 15.0, 30.0))]
+
+
+def test_without_callback() -> None:
+    """Nothing is reported outside of a job."""
+    with ProgressBar(total=100, file=io.StringIO()) as bar:
+        bar.update(100)
+
+    assert bar.n == 100
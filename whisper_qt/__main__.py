@@ -1,11 +1,34 @@
 """A launcher for the application."""
 from sys import argv
 
-from .gui.main import ui_main
+from . import startup  # noqa: F401  Imported first to start the clock.
 
 
 def main() -> int:
     """Entry point for the application."""
+    # Import the interfaces lazily, so the batch mode never imports Qt.
+    if len(argv) > 1 and argv[1] == "batch":
+        from .cli import batch_main
+
+        return batch_main(argv[2:])
+
+    if len(argv) > 1 and argv[1] == "watch":
+        from .cli import watch_main
+
+        return watch_main(argv[2:])
+
+    if len(argv) > 1 and argv[1] == "serve":
+        from .cli import serve_main
+
+        return serve_main(argv[2:])
+
+    if len(argv) > 1 and argv[1] == "jobs":
+        from .cli import jobs_main
+
+        return jobs_main(argv[2:])
+
+    from .gui.main import ui_main
+
     return ui_main(argv)
 
 
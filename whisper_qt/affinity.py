@@ -0,0 +1,65 @@
+"""Split the CPU cores between the workers, so their torch threads don't compete."""
+import os
+from typing import NamedTuple
+
+from .system import cpu_topology
+
+
+class CoreAllocation(NamedTuple):
+    """The torch threads of a worker, and the CPUs it's pinned to if it's pinned."""
+
+    threads: int
+    cpus: tuple[int, ...]
+
+
+def allocate_cores(workers: int, threads: int = 0) -> list[CoreAllocation]:
+    """
+    Give every worker its own physical cores, the same number to each one.
+
+    Cores are given in the order of their NUMA nodes, so a worker stays on one node
+    when the cores of a node can be split evenly. A worker runs one thread on each
+    of its physical cores, unless `threads` is more than 0. When there are more
+    workers than cores, the workers share the cores.
+    """
+    cores = [core for node in cpu_topology() for core in node]
+    allocations = []
+
+    for index in range(max(1, workers)):
+        if workers <= len(cores):
+            start = index * len(cores) // workers
+            end = (index + 1) * len(cores) // workers
+            share = cores[start:end]
+        else:
+            share = [cores[index % len(cores)]]
+
+        cpus = tuple(sorted(cpu for core in share for cpu in core))
+        allocations.append(CoreAllocation(threads or len(share), cpus))
+
+    return allocations
+
+
+def format_cpus(cpus: tuple[int, ...]) -> str:
+    """Format CPUs like `0-3,8-11`, the way `taskset` does."""
+    ranges: list[list[int]] = []
+    for cpu in cpus:
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+
+    return ",".join(
+        str(first) if first == last else f"{first}-{last}" for first, last in ranges
+    )
+
+
+def pin_process(cpus: tuple[int, ...]) -> bool:
+    """Run the current process only on the given CPUs, if the platform allows it."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError:
+        return False
+
+    return True
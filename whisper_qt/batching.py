@@ -0,0 +1,312 @@
+"""Transcribe several files at once, encoding a window of every file in one pass."""
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import torch
+
+from .jobs import TranscriptionJob
+from .journal import SegmentJournal
+from .tracing import tracer
+from .whisper.whisper.audio import HOP_LENGTH
+from .whisper.whisper.audio import N_FRAMES
+from .whisper.whisper.audio import pad_or_trim
+from .whisper.whisper.audio import SAMPLE_RATE
+from .whisper.whisper.decoding import DecodingOptions
+from .whisper.whisper.decoding import DecodingResult
+from .whisper.whisper.tokenizer import get_tokenizer
+from .whisper_process import JOURNAL_CHUNK_SECONDS
+from .whisper_process import offset_segment
+from .whisper_process import restore_segment_times
+
+if TYPE_CHECKING:
+    from .vad import TimeMap
+
+# Mel frames in a second of audio.
+FRAMES_PER_SECOND = SAMPLE_RATE // HOP_LENGTH
+
+# The defaults of `whisper.transcribe`.
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class BatchItem:
+    """
+    A file in a batch, decoded window by window like in `whisper.transcribe`.
+
+    `segments` were already transcribed until `start` seconds, and have the times of
+    the original audio, while `start` is in the audio without silence if there is a
+    `time_map`. New segments are committed to the `journal` every few minutes.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        job: TranscriptionJob,
+        mel: torch.Tensor,
+        language: Optional[str],
+        segments: list[dict[str, Any]],
+        start: float,
+        time_map: Optional["TimeMap"] = None,
+        journal: Optional[SegmentJournal] = None,
+    ) -> None:
+        """Initialize the decoding state, the `language` is `None` only in English."""
+        self.job = job
+        self.mel = mel
+        self.frames = mel.shape[-1]
+        self.time_map = time_map
+        self.journal = journal
+
+        self.seek = int(start * FRAMES_PER_SECOND)
+        self.windows = 0
+        self.segments = segments
+        self.__committed = len(segments)
+        self.__committed_seek = self.seek
+        # Segments of the last decoded window.
+        self.new_segments: list[dict[str, Any]] = []
+
+        # Previous text is given as a prompt, so it's like the file wasn't interrupted.
+        self.tokens = [token for segment in segments for token in segment["tokens"]]
+        self.prompt_reset_since = 0
+
+        options = dict(job.options)
+        temperature = options.pop("temperature", TEMPERATURES)
+        self.temperatures = (
+            (temperature,) if isinstance(temperature, (int, float)) else temperature
+        )
+        self.compression_ratio_threshold = options.pop(
+            "compression_ratio_threshold", COMPRESSION_RATIO_THRESHOLD
+        )
+        self.logprob_threshold = options.pop("logprob_threshold", LOGPROB_THRESHOLD)
+        self.no_speech_threshold = options.pop(
+            "no_speech_threshold", NO_SPEECH_THRESHOLD
+        )
+        self.condition_on_previous_text = options.pop(
+            "condition_on_previous_text", True
+        )
+        # The batch is always run in float32, like whisper does on the CPU.
+        options.pop("fp16", None)
+        self.decode_options = options
+
+        # English only models don't detect the language.
+        self.language = language or "en"
+        self.tokenizer = get_tokenizer(
+            model.is_multilingual,
+            language=self.language,
+            task=options.get("task", "transcribe"),
+        )
+
+    @property
+    def finished(self) -> bool:
+        """Whether all the audio was decoded."""
+        return self.seek >= self.frames
+
+    @property
+    def duration(self) -> float:
+        """Seconds of the audio."""
+        return self.frames / FRAMES_PER_SECOND
+
+    @property
+    def position(self) -> float:
+        """Seconds of the audio that were decoded."""
+        return min(self.seek, self.frames) / FRAMES_PER_SECOND
+
+    def window(self) -> torch.Tensor:
+        """Mel spectrogram of the next 30 seconds."""
+        seek = self.seek
+
+        return pad_or_trim(self.mel[:, seek:], N_FRAMES)
+
+    def decode(self, model: Any, audio_features: torch.Tensor) -> None:
+        """Decode the encoded window, with higher temperatures when it fails."""
+        result: Optional[DecodingResult] = None
+        prompt_start = self.prompt_reset_since
+
+        for temperature in self.temperatures:
+            options = dict(self.decode_options)
+            if temperature > 0:
+                options.pop("beam_size", None)
+                options.pop("patience", None)
+            else:
+                options.pop("best_of", None)
+
+            result = model.decode(
+                audio_features,
+                DecodingOptions(
+                    language=self.language,
+                    prompt=self.tokens[prompt_start:],
+                    temperature=temperature,
+                    fp16=False,
+                    **options,
+                ),
+            )
+
+            if (
+                self.compression_ratio_threshold is not None
+                and result.compression_ratio > self.compression_ratio_threshold
+            ):
+                continue
+            if (
+                self.logprob_threshold is not None
+                and result.avg_logprob < self.logprob_threshold
+            ):
+                continue
+            break
+
+        self.windows += 1
+        self.__add_result(cast(DecodingResult, result))
+
+        uncommitted = (self.seek - self.__committed_seek) / FRAMES_PER_SECOND
+        if uncommitted >= JOURNAL_CHUNK_SECONDS:
+            self.commit()
+
+    def commit(self) -> None:
+        """Commit the new segments to the journal, if there is one."""
+        if self.journal is not None:
+            committed = self.__committed
+            self.journal.append(self.segments[committed:], self.position, self.language)
+
+        self.__committed = len(self.segments)
+        self.__committed_seek = self.seek
+
+    def __add_result(self, result: DecodingResult) -> None:
+        """Split the decoded tokens to segments and move to the next window."""
+        tokenizer = self.tokenizer
+        self.new_segments = []
+
+        if self.no_speech_threshold is not None:
+            should_skip = result.no_speech_prob > self.no_speech_threshold
+            if (
+                self.logprob_threshold is not None
+                and result.avg_logprob > self.logprob_threshold
+            ):
+                should_skip = False
+
+            if should_skip:
+                self.seek += N_FRAMES
+                return
+
+        # Every audio feature is two mel frames, so 20 ms.
+        input_stride = 2
+        time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+        offset = self.seek / FRAMES_PER_SECOND
+
+        tokens = torch.tensor(result.tokens)
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
+        consecutive.add_(1)
+
+        if len(consecutive) > 0:
+            last_slice = 0
+            for current_slice in consecutive:
+                sliced_tokens = tokens[last_slice:current_slice]
+                start = sliced_tokens[0].item() - tokenizer.timestamp_begin
+                end = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                self.__add_segment(
+                    offset + start * time_precision,
+                    offset + end * time_precision,
+                    sliced_tokens[1:-1],
+                    result,
+                )
+                last_slice = current_slice
+
+            last_timestamp = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+            self.seek += last_timestamp * input_stride
+            self.tokens.extend(tokens[: last_slice + 1].tolist())
+        else:
+            duration = N_FRAMES / FRAMES_PER_SECOND
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1] != tokenizer.timestamp_begin:
+                # Only the start of the last segment was predicted.
+                last_timestamp = timestamps[-1].item() - tokenizer.timestamp_begin
+                duration = last_timestamp * time_precision
+
+            self.__add_segment(offset, offset + duration, tokens, result)
+            self.seek += N_FRAMES
+            self.tokens.extend(tokens.tolist())
+
+        if not self.condition_on_previous_text or result.temperature > 0.5:
+            # Don't give a bad transcription as a prompt for the next window.
+            self.prompt_reset_since = len(self.tokens)
+
+    def __add_segment(
+        self,
+        start: float,
+        end: float,
+        text_tokens: torch.Tensor,
+        result: DecodingResult,
+    ) -> None:
+        """Add a segment like whisper does, unless it has no text."""
+        tokenizer = self.tokenizer
+        text = tokenizer.decode(
+            [token for token in text_tokens if token < tokenizer.eot]
+        )
+        if not text.strip():
+            return
+
+        segment = {
+            "id": len(self.segments),
+            "seek": self.seek,
+            "start": start,
+            "end": end,
+            "text": text,
+            "tokens": text_tokens.tolist(),
+            "temperature": result.temperature,
+            "avg_logprob": result.avg_logprob,
+            "compression_ratio": result.compression_ratio,
+            "no_speech_prob": result.no_speech_prob,
+        }
+        if self.time_map is not None:
+            segment = restore_segment_times(segment, self.time_map)
+
+        self.segments.append(segment)
+        self.new_segments.append(segment)
+
+    def result(self) -> dict[str, Any]:
+        """Get the result of the file, like `whisper.transcribe` returns it."""
+        segments = self.segments
+        if self.job.chunk is not None:
+            chunk_start, _ = self.job.chunk
+            segments = [offset_segment(segment, chunk_start) for segment in segments]
+
+        for number, segment in enumerate(segments):
+            segment["id"] = number
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": self.language,
+        }
+
+
+def transcribe_batch(
+    model: Any,
+    items: list[BatchItem],
+    on_window: Optional[Callable[[BatchItem], None]] = None,
+) -> None:
+    """
+    Decode all the items together until all of them are finished.
+
+    The next window of every item goes through the encoder in one batch, which uses
+    the CPU much better than encoding every window alone, then every item is decoded
+    with its own prompt. `on_window` is called after every decoded window.
+    """
+    active = [item for item in items if not item.finished]
+
+    while active:
+        # The encoder pass is a stage of all the items in it.
+        with tracer.jobs(*(item.job for item in active)), torch.no_grad():
+            windows = torch.stack([item.window() for item in active])
+            audio_features = model.embed_audio(windows.to(model.device))
+
+        for item, item_features in zip(active, audio_features):
+            with tracer.jobs(item.job):
+                item.decode(model, item_features)
+            if on_window is not None:
+                on_window(item)
+
+        active = [item for item in active if not item.finished]
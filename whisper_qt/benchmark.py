@@ -0,0 +1,361 @@
+"""
+Measure the throughput of the whole transcription pipeline, without network access.
+
+Run this module to transcribe audio fixtures across a matrix of settings, and to
+compare the results with a stored baseline. Models that are not downloaded are
+replaced by models of the same size with random weights.
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+import multiprocessing
+import queue
+import resource
+import tempfile
+import time
+import wave
+from pathlib import Path
+from typing import Any
+
+from .checkpoints import CheckpointIndex
+from .default_files import xdg_cache_dir
+from .jobs import PRECISIONS
+from .jobs import TranscriptionJob
+from .media import probe_duration
+from .scheduler import JobScheduler
+from .tracing import stage_times
+from .whisper_metadata import CHECKPOINTS
+
+# Same as `whisper.audio.SAMPLE_RATE`.
+SAMPLE_RATE = 16000
+
+# Width, attention heads and layers of the models of every size.
+MODEL_DIMENSIONS = {
+    "tiny": (384, 6, 4),
+    "base": (512, 8, 6),
+    "small": (768, 12, 12),
+    "medium": (1024, 16, 24),
+    "large": (1280, 20, 32),
+}
+
+# Settings that every case of the matrix has, in the order they are varied.
+CASE_SETTINGS = ("model", "threads", "workers", "precision", "beam_size")
+
+# Measurements that are compared with the baseline.
+COMPARED_METRICS = ("real_time_factor", "files_per_hour", "peak_rss")
+
+
+def random_checkpoint(model: str, directory: Path) -> Path:
+    """
+    Create a checkpoint with random weights, in the architecture of a model.
+
+    The weights are always the same, so the results of different runs can be
+    compared. The checkpoint is only created once.
+    """
+    path = directory / f"random-{model}.pt"
+    if path.is_file():
+        return path
+
+    from .whisper_process import import_whisper
+
+    whisper = import_whisper()
+    torch = whisper.torch
+
+    size = model.split(".")[0].split("-")[0]
+    state, heads, layers = MODEL_DIMENSIONS.get(size, MODEL_DIMENSIONS["tiny"])
+    v3 = "v3" in model or "turbo" in model
+    if model.endswith(".en"):
+        vocabulary = 51864
+    else:
+        vocabulary = 51866 if v3 else 51865
+
+    dimensions = whisper.model.ModelDimensions(
+        n_mels=128 if v3 else 80,
+        n_audio_ctx=1500,
+        n_audio_state=state,
+        n_audio_head=heads,
+        n_audio_layer=layers,
+        n_vocab=vocabulary,
+        n_text_ctx=448,
+        n_text_state=state,
+        n_text_head=heads,
+        n_text_layer=4 if "turbo" in model else layers,
+    )
+
+    torch.manual_seed(0)
+    random_model = whisper.model.Whisper(dimensions)
+
+    Path.mkdir(directory, parents=True, exist_ok=True)
+    torch.save(
+        {
+            "dims": dataclasses.asdict(dimensions),
+            "model_state_dict": random_model.state_dict(),
+        },
+        path,
+    )
+
+    return path
+
+
+def resolve_model(model: str, model_dir: str, random_dir: Path) -> tuple[str, bool]:
+    """Choose the model to load, and tell whether it has random weights."""
+    if model in CHECKPOINTS and CheckpointIndex(model_dir).is_downloaded(model):
+        return model, False
+
+    return str(random_checkpoint(model, random_dir)), True
+
+
+def synthetic_fixture(path: Path, seconds: float, seed: int = 0) -> None:
+    """
+    Write a WAV file with bursts of harmonic tones separated by pauses.
+
+    The bursts have the energy of speech syllables, so the speech detection finds
+    regions to transcribe.
+    """
+    import numpy
+
+    generator = numpy.random.default_rng(seed)
+    times = numpy.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+
+    audio = numpy.zeros_like(times)
+    position = 0.0
+    while position < seconds:
+        # A phrase of a few syllables, then a pause.
+        length = generator.uniform(1, 4)
+        phrase = (times >= position) & (times < position + length)
+        pitch = generator.uniform(100, 250)
+        for harmonic in range(1, 6):
+            audio[phrase] += numpy.sin(2 * numpy.pi * pitch * harmonic * times[phrase])
+        audio[phrase] *= 0.5 + 0.5 * numpy.sin(2 * numpy.pi * 4 * times[phrase])
+        position += length + generator.uniform(0.3, 1.5)
+
+    audio = 0.1 * audio / max(1.0, numpy.abs(audio).max())
+    audio += generator.normal(0, 0.002, audio.shape)
+
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(SAMPLE_RATE)
+        file.writeframes((audio * 32767).astype("<i2").tobytes())
+
+
+def synthetic_fixtures(
+    directory: Path, count: int, seconds: float
+) -> list[tuple[str, float]]:
+    """Write different synthetic files, and get their paths and durations."""
+    fixtures = []
+    for number in range(count):
+        path = directory / f"fixture-{number}.wav"
+        synthetic_fixture(path, seconds, number)
+        fixtures.append((str(path), seconds))
+
+    return fixtures
+
+
+def run_case(
+    case: dict[str, Any],
+    fixtures: list[tuple[str, float]],
+    model_dir: str,
+    output_dir: str,
+) -> dict[str, Any]:
+    """
+    Transcribe all the fixtures with the settings of a case, and measure it.
+
+    The stage timings are summed over the files, and traced by their workers.
+    """
+    scheduler = JobScheduler(
+        model_dir,
+        case["threads"],
+        case["workers"],
+        result_cache=None,
+        verbose=False,
+        trace=True,
+    )
+    for audio_file_path, _duration in fixtures:
+        scheduler.submit(
+            TranscriptionJob(
+                audio_file_path,
+                output_dir,
+                case["model_path"],
+                "cpu",
+                "Auto",
+                options={
+                    "task": "transcribe",
+                    "temperature": 0.0,
+                    "beam_size": case["beam_size"],
+                    "fp16": False,
+                },
+                precision=case["precision"],
+            )
+        )
+
+    finished_jobs = []
+    started_at = time.monotonic()
+
+    try:
+        scheduler.run(on_job_finished=lambda job, _success: finished_jobs.append(job))
+        seconds = time.monotonic() - started_at
+    finally:
+        scheduler.shutdown()
+
+    audio_seconds = sum(duration for _path, duration in fixtures)
+
+    return {
+        **{setting: case[setting] for setting in CASE_SETTINGS},
+        "random_weights": case["random_weights"],
+        "files": len(fixtures),
+        "audio_seconds": audio_seconds,
+        "seconds": seconds,
+        "real_time_factor": seconds / audio_seconds,
+        "files_per_hour": len(fixtures) / seconds * 3600,
+        # Of the biggest worker, which already stopped, in kB on Linux.
+        "peak_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        "stages": stage_times(span for job in finished_jobs for span in job.spans),
+        "errors": [job.error for job in finished_jobs if job.error is not None],
+    }
+
+
+def run_case_process(
+    case: dict[str, Any],
+    fixtures: list[tuple[str, float]],
+    model_dir: str,
+    output_dir: str,
+    results: multiprocessing.Queue,
+) -> None:
+    """Run a case in its own process, so its peak memory is not of other cases."""
+    results.put(run_case(case, fixtures, model_dir, output_dir))
+
+
+def run_matrix(
+    matrix: dict[str, list[Any]],
+    fixtures: list[tuple[str, float]],
+    model_dir: str,
+    random_dir: Path,
+) -> list[dict[str, Any]]:
+    """Run every combination of the settings in the matrix."""
+    reports = []
+
+    for values in itertools.product(*(matrix[setting] for setting in CASE_SETTINGS)):
+        case = dict(zip(CASE_SETTINGS, values))
+        case["model_path"], case["random_weights"] = resolve_model(
+            case["model"], model_dir, random_dir
+        )
+
+        results: multiprocessing.Queue[dict[str, Any]] = multiprocessing.Queue()
+        with tempfile.TemporaryDirectory() as output_dir:
+            process = multiprocessing.Process(
+                target=run_case_process,
+                args=(case, fixtures, model_dir, output_dir, results),
+            )
+            process.start()
+            while True:
+                try:
+                    report = results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not process.is_alive() and results.empty():
+                        raise RuntimeError(
+                            f"The benchmark of {case['model']} stopped unexpectedly "
+                            f"({process.exitcode})."
+                        )
+            process.join()
+
+        reports.append(report)
+
+    return reports
+
+
+def case_key(report: dict[str, Any]) -> tuple[Any, ...]:
+    """Get the settings that identify a case in different runs."""
+    return tuple(report[setting] for setting in CASE_SETTINGS)
+
+
+def compare_with_baseline(
+    reports: list[dict[str, Any]], baseline: list[dict[str, Any]]
+) -> None:
+    """Add the relative change of every metric from the same case in the baseline."""
+    baseline_cases = {case_key(report): report for report in baseline}
+
+    for report in reports:
+        previous = baseline_cases.get(case_key(report))
+        if previous is None:
+            continue
+
+        report["baseline"] = {
+            metric: {
+                "value": previous[metric],
+                "change": (report[metric] - previous[metric]) / previous[metric],
+            }
+            for metric in COMPARED_METRICS
+            if previous.get(metric)
+        }
+
+
+if __name__ == "__main__":
+    from .config import Config
+
+    config = Config()
+    config.read_config()
+
+    parser = argparse.ArgumentParser(
+        description="Measure the transcription throughput across a matrix of settings."
+    )
+    parser.add_argument(
+        "--audio",
+        nargs="+",
+        default=[],
+        help="audio fixtures to transcribe, instead of synthetic ones",
+    )
+    parser.add_argument(
+        "--files", type=int, default=4, help="number of synthetic fixtures"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=60, help="duration of the synthetic fixtures"
+    )
+    parser.add_argument("--models", nargs="+", default=["tiny"])
+    parser.add_argument(
+        "--threads", nargs="+", type=int, default=[0], help="0 splits the cores"
+    )
+    parser.add_argument("--workers", nargs="+", type=int, default=[1])
+    parser.add_argument(
+        "--precisions", nargs="+", choices=PRECISIONS, default=[PRECISIONS[0]]
+    )
+    parser.add_argument("--beam-sizes", nargs="+", type=int, default=[5])
+    parser.add_argument(
+        "--model-dir",
+        default=config.get_option("preferences", "model_directory")
+        or str(xdg_cache_dir()),
+    )
+    parser.add_argument("--baseline", help="report of a previous run to compare with")
+    parser.add_argument("--save", help="where to write the report, e.g. as a baseline")
+    arguments = parser.parse_args()
+
+    matrix = {
+        "model": arguments.models,
+        "threads": arguments.threads,
+        "workers": arguments.workers,
+        "precision": arguments.precisions,
+        "beam_size": arguments.beam_sizes,
+    }
+
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        if arguments.audio:
+            fixtures = [(path, probe_duration(path)) for path in arguments.audio]
+        else:
+            fixtures = synthetic_fixtures(
+                Path(fixtures_dir), arguments.files, arguments.seconds
+            )
+
+        reports = run_matrix(
+            matrix, fixtures, arguments.model_dir, xdg_cache_dir() / "benchmark"
+        )
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            compare_with_baseline(reports, json.load(file))
+
+    output = json.dumps(reports, indent=2)
+    if arguments.save:
+        Path(arguments.save).write_text(output)
+    print(output)
@@ -0,0 +1,172 @@
+"""Verify the model checkpoints once, instead of hashing them on every load."""
+import hashlib
+import json
+import os
+import urllib.request
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from .whisper_metadata import CHECKPOINT_URL
+from .whisper_metadata import CHECKPOINTS
+
+# Name of the index of verified checkpoints in the model directory.
+INDEX_FILE_NAME = "verified-checkpoints.json"
+
+# Bytes read from a checkpoint at once while hashing or downloading it.
+CHUNK_SIZE = 1024**2
+
+
+class CheckpointError(Exception):
+    """A checkpoint is missing or doesn't match its digest."""
+
+
+def file_signature(path: Path) -> dict[str, int]:
+    """Describe a file by what changes when it's modified or replaced."""
+    stat = path.stat()
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+
+class CheckpointIndex:
+    """
+    Checkpoints in a model directory that matched their digest.
+
+    A checkpoint is only hashed again when its size, modification time or inode
+    changed since it was verified.
+    """
+
+    def __init__(self, model_dir: str) -> None:
+        """Initialize the index of a model directory."""
+        self.model_dir = Path(model_dir)
+        self.path = self.model_dir / INDEX_FILE_NAME
+
+    def checkpoint_path(self, model: str) -> Path:
+        """Where whisper stores the checkpoint of a model."""
+        _digest, file_name = CHECKPOINTS[model]
+
+        return self.model_dir / file_name
+
+    def __read(self) -> dict[str, Any]:
+        """File name -> signature and digest of every verified checkpoint."""
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def __write(self, index: dict[str, Any]) -> None:
+        """Replace the index, without leaving it half written."""
+        temporary_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, "w") as file:
+            json.dump(index, file)
+        os.replace(temporary_path, self.path)
+
+    def __record(self, model: str, verified: bool) -> None:
+        """Add or remove a checkpoint from the index."""
+        path = self.checkpoint_path(model)
+        index = self.__read()
+
+        if verified:
+            index[path.name] = {
+                **file_signature(path),
+                "sha256": CHECKPOINTS[model][0],
+            }
+        elif index.pop(path.name, None) is None:
+            return
+
+        self.__write(index)
+
+    def is_downloaded(self, model: str) -> bool:
+        """Whether the checkpoint of a model exists, verified or not."""
+        return self.checkpoint_path(model).is_file()
+
+    def is_verified(self, model: str) -> bool:
+        """Whether the checkpoint was verified and didn't change since."""
+        path = self.checkpoint_path(model)
+        entry = self.__read().get(path.name)
+        if entry is None:
+            return False
+
+        try:
+            signature = file_signature(path)
+        except FileNotFoundError:
+            return False
+
+        expected: dict[str, Any] = {**signature, "sha256": CHECKPOINTS[model][0]}
+
+        return entry == expected
+
+    def verify(self, model: str) -> bool:
+        """Hash the checkpoint now, and remember the result."""
+        path = self.checkpoint_path(model)
+        digest = hashlib.sha256()
+
+        try:
+            with open(path, "rb") as file:
+                while chunk := file.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            self.__record(model, False)
+            return False
+
+        verified = digest.hexdigest() == CHECKPOINTS[model][0]
+        self.__record(model, verified)
+
+        return verified
+
+    def ensure_verified(self, model: str) -> Path:
+        """
+        Get the path of a checkpoint that can be loaded without hashing it.
+
+        Raise `CheckpointError` if it's missing or corrupted, instead of downloading.
+        """
+        path = self.checkpoint_path(model)
+
+        if not path.is_file():
+            raise CheckpointError(
+                f"The {model} model is not downloaded to {self.model_dir}."
+            )
+
+        if not self.is_verified(model) and not self.verify(model):
+            raise CheckpointError(
+                f"The {model} model in {path} is corrupted, download it again."
+            )
+
+        return path
+
+    def download(
+        self, model: str, on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> None:
+        """
+        Download and verify the checkpoint of a model.
+
+        `on_progress` receives the downloaded and the total bytes.
+        """
+        path = self.checkpoint_path(model)
+        expected_digest, file_name = CHECKPOINTS[model]
+        Path.mkdir(self.model_dir, parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        temporary_path = path.with_name(f".{path.name}.download")
+        url = CHECKPOINT_URL.format(expected_digest, file_name)
+        with urllib.request.urlopen(url) as response, open(
+            temporary_path, "wb"
+        ) as file:
+            total = int(response.info().get("Content-Length") or 0)
+            done = 0
+
+            while chunk := response.read(CHUNK_SIZE):
+                file.write(chunk)
+                digest.update(chunk)
+                done += len(chunk)
+                if on_progress is not None:
+                    on_progress(done, total)
+
+        if digest.hexdigest() != expected_digest:
+            os.remove(temporary_path)
+            raise CheckpointError(f"The downloaded {model} model is corrupted.")
+
+        os.replace(temporary_path, path)
+        self.__record(model, True)
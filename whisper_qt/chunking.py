@@ -0,0 +1,118 @@
+"""Split a long job between several workers, then stitch the results together."""
+from typing import Any
+from typing import Optional
+
+from .jobs import TranscriptionJob
+
+# Minimum seconds of audio for every chunk, shorter files are not split.
+MIN_CHUNK_SECONDS = 600
+# Seconds that every chunk overlaps with the next, where they are stitched.
+CHUNK_OVERLAP_SECONDS = 30
+
+
+def chunk_ranges(duration: float, max_chunks: int) -> list[tuple[float, float]]:
+    """(start, end) seconds of overlapping chunks, or one chunk for short audio."""
+    count = max(1, min(max_chunks, int(duration // MIN_CHUNK_SECONDS)))
+    length = duration / count
+
+    return [
+        (index * length, min(duration, (index + 1) * length + CHUNK_OVERLAP_SECONDS))
+        for index in range(count)
+    ]
+
+
+def midpoint(segment: dict[str, Any]) -> float:
+    """Middle time of a segment in seconds."""
+    return (segment["start"] + segment["end"]) / 2
+
+
+def stitch_point(segments: list[dict[str, Any]], boundary: float) -> float:
+    """
+    Where to stitch a chunk with the next one, which starts at `boundary`.
+
+    It's the middle of the longest silence between segments in the middle of the
+    overlap, where both chunks have enough context to transcribe well.
+    """
+    earliest = boundary + CHUNK_OVERLAP_SECONDS / 4
+    latest = boundary + CHUNK_OVERLAP_SECONDS * 3 / 4
+
+    best_point = boundary + CHUNK_OVERLAP_SECONDS / 2
+    longest_gap = 0.0
+    for previous, following in zip(segments, segments[1:]):
+        point = (previous["end"] + following["start"]) / 2
+        gap = following["start"] - previous["end"]
+        if earliest <= point <= latest and gap > longest_gap:
+            best_point, longest_gap = point, gap
+
+    return best_point
+
+
+class ChunkedTranscription:
+    """A job that was split to chunks, waiting for all of them to finish."""
+
+    def __init__(self, job: TranscriptionJob, duration: float, max_chunks: int) -> None:
+        """Split the job to chunk jobs."""
+        self.job = job
+        self.duration = duration
+        self.started = False
+
+        self.chunks = job.split(chunk_ranges(duration, max_chunks))
+        self.__results: list[Optional[tuple[list[dict[str, Any]], str]]]
+        self.__results = [None] * len(self.chunks)
+        # Seconds transcribed from every chunk.
+        self.__positions = [0.0] * len(self.chunks)
+
+    def index(self, chunk: TranscriptionJob) -> int:
+        """Index of a chunk job."""
+        return next(
+            index for index, job in enumerate(self.chunks) if job.job_id == chunk.job_id
+        )
+
+    def update_position(self, chunk: TranscriptionJob, position: float) -> float:
+        """Set how far a chunk was transcribed, and return it for the whole job."""
+        # Workers report the position from the start of the chunk.
+        self.__positions[self.index(chunk)] = position
+
+        return min(self.duration, sum(self.__positions))
+
+    def add_result(
+        self, chunk: TranscriptionJob, segments: list[dict[str, Any]], language: str
+    ) -> None:
+        """Store the segments of a finished chunk."""
+        self.__results[self.index(chunk)] = (segments, language)
+
+    @property
+    def finished(self) -> bool:
+        """Whether all the chunks are finished."""
+        return all(result is not None for result in self.__results)
+
+    def stitch(self) -> dict[str, Any]:
+        """Join the results of all the chunks, without the overlapping segments."""
+        results = [result for result in self.__results if result is not None]
+
+        segments: list[dict[str, Any]] = []
+        start = 0.0
+        for index, (chunk_segments, _) in enumerate(results):
+            if index + 1 < len(results):
+                boundary, _ = self.chunks[index + 1].chunk or (0.0, 0.0)
+                end = stitch_point(chunk_segments, boundary)
+            else:
+                end = self.duration + 1
+
+            # A segment that was transcribed by both chunks belongs to the one that
+            # has its middle.
+            segments.extend(
+                segment
+                for segment in chunk_segments
+                if start <= midpoint(segment) < end
+            )
+            start = end
+
+        for number, segment in enumerate(segments):
+            segment["id"] = number
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": results[0][1] if results else None,
+        }
@@ -0,0 +1,845 @@
+"""Command line interface to transcribe files without the GUI."""
+import argparse
+import glob
+import json
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from typing import cast
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+from .checkpoints import CheckpointError
+from .checkpoints import CheckpointIndex
+from .config import Config
+from .default_files import xdg_cache_dir
+from .job_store import DEFAULT_MAX_ATTEMPTS
+from .job_store import JobStore
+from .job_store import RETRY_BACKOFF
+from .jobs import PRECISIONS
+from .jobs import TranscriptionJob
+from .jobs import WorkerEvent
+from .media import MediaInfoCache
+from .media import MediaProber
+from .outputs import OUTPUT_FORMATS
+from .progress import EtaEstimator
+from .progress import Throttle
+from .result_cache import DEFAULT_MAX_SIZE
+from .result_cache import ResultCache
+from .scheduler import DEFAULT_BATCH_SIZE
+from .scheduler import default_max_workers
+from .scheduler import JOB_ORDERS
+from .scheduler import JobScheduler
+from .service import default_socket_path
+from .service import ServiceClient
+from .service import ServiceError
+from .service import TranscriptionService
+from .tracing import chrome_trace
+from .tracing import stage_times
+from .watch import DEFAULT_POLL_INTERVAL
+from .watch import DEFAULT_SETTLE_SECONDS
+from .watch import FolderWatcher
+from .watch import ProcessedLedger
+from .watch import SettledFile
+from .whisper_metadata import CHECKPOINTS
+
+# Exit codes.
+EXIT_SUCCESS = 0
+EXIT_SOME_FAILED = 1
+EXIT_USAGE_ERROR = 2
+EXIT_INTERRUPTED = 130
+
+# Minimum seconds between position events of the same job.
+POSITION_EVENT_INTERVAL = 1.0
+
+# Seconds between two checks of the watched directories for settled files.
+WATCH_INTERVAL = 1.0
+
+# So the lines of events printed by different threads are not mixed.
+emit_lock = threading.Lock()
+
+
+def emit(event: str, **data: Any) -> None:
+    """Print a single progress event as a line of JSON."""
+    line = json.dumps({"event": event, "time": time.time(), **data})
+    with emit_lock:
+        print(line, flush=True)
+
+
+def transcription_arguments(config: Config) -> argparse.ArgumentParser:
+    """
+    Parser of the options of the transcription, using the saved options as defaults.
+
+    It's a parent of the parsers of the modes without the GUI.
+    """
+
+    def default(option: str, fallback: str) -> str:
+        return config.get_option("whisper", option) or fallback
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--model", default=default("model", "tiny"))
+    parser.add_argument(
+        "--language",
+        default=default("audio_lang", "Auto"),
+        help="language of the audio, or `Auto` to detect it",
+    )
+    parser.add_argument(
+        "--lock-language",
+        action=argparse.BooleanOptionalAction,
+        default=bool(int(default("lock_language", "0"))),
+        help="with `Auto`, use the language that most files were detected in for "
+        "the rest of the files",
+    )
+    parser.add_argument(
+        "--task",
+        choices=("transcribe", "translate"),
+        default=("transcribe", "translate")[int(default("task", "0"))],
+    )
+    parser.add_argument(
+        "--device", type=str.lower, default=default("device", "CUDA").lower()
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(default("threads", "0")),
+        help="torch threads for every worker, 0 to split the cores between them",
+    )
+    parser.add_argument(
+        "--temperature", type=float, default=float(default("temperature", "0.0"))
+    )
+    parser.add_argument("--best-of", type=int, default=int(default("best_of", "5")))
+    parser.add_argument("--beam-size", type=int, default=int(default("beam_size", "5")))
+    parser.add_argument(
+        "--fp16",
+        action=argparse.BooleanOptionalAction,
+        default=bool(int(default("fp16", "0"))),
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default=default("precision", PRECISIONS[0]),
+        help="precision of the model weights on the CPU, int8 is faster",
+    )
+    parser.add_argument(
+        "--vad-aggressiveness",
+        type=int,
+        choices=range(4),
+        default=int(default("vad_aggressiveness", "0")),
+        help="skip the silence before transcribing, higher skips more, 0 is off",
+    )
+    parser.add_argument(
+        "--parallel-chunks",
+        action=argparse.BooleanOptionalAction,
+        default=bool(int(default("parallel_chunks", "0"))),
+        help="split long files between the workers",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=int(config.get_option("preferences", "max_workers") or 0),
+        help="how many files to transcribe at the same time, 0 to guess it",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(
+            config.get_option("preferences", "batch_size") or DEFAULT_BATCH_SIZE
+        ),
+        help="how many files a worker on the CPU transcribes together",
+    )
+    parser.add_argument(
+        "--order",
+        choices=JOB_ORDERS,
+        default=config.get_option("preferences", "job_order") or "queued",
+        help="which files start first: as they are given, the longest ones to "
+        "finish all of them sooner, or the shortest ones to get results sooner",
+    )
+    parser.add_argument(
+        "--map-weights",
+        action=argparse.BooleanOptionalAction,
+        default=bool(int(config.get_option("preferences", "map_weights") or 0)),
+        help="share the weights of CPU models between the workers in memory",
+    )
+    parser.add_argument(
+        "--pin-workers",
+        action=argparse.BooleanOptionalAction,
+        default=bool(int(config.get_option("preferences", "pin_workers") or 0)),
+        help="run every worker only on its own share of the CPU cores",
+    )
+    parser.add_argument(
+        "--model-dir",
+        default=config.get_option("preferences", "model_directory")
+        or str(xdg_cache_dir()),
+    )
+    parser.add_argument(
+        "--download-model",
+        action="store_true",
+        help="download the model first if it's not in the model directory",
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=OUTPUT_FORMATS,
+        default=default("output_formats", "srt").split(","),
+        help="formats of the outputs, all written from the same result",
+    )
+    parser.add_argument(
+        "--no-result-cache",
+        action="store_true",
+        help="transcribe files even if they were transcribed with the same options",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=int(
+            config.get_option("preferences", "max_attempts") or DEFAULT_MAX_ATTEMPTS
+        ),
+        help="how many times to try a file before it fails, waiting longer between "
+        "the attempts",
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=float(
+            config.get_option("preferences", "retry_backoff") or RETRY_BACKOFF
+        ),
+        help="seconds to wait before trying a failed file again, doubled for every "
+        "next attempt",
+    )
+
+    return parser
+
+
+def parse_batch_arguments(args: Sequence[str], config: Config) -> argparse.Namespace:
+    """Parse the arguments of the batch mode, using the saved options as defaults."""
+    parser = argparse.ArgumentParser(
+        prog="whisper-qt batch",
+        description="Transcribe files without the GUI, printing progress as JSON.",
+        parents=[transcription_arguments(config)],
+    )
+    parser.add_argument(
+        "files", nargs="*", help="files or glob patterns of the media to transcribe"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="file with a path on each line, or `-` to read them from stdin",
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="where to write the outputs (default: next to every input file)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="time the stages of every file, and write them as a Chrome trace",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="also transcribe the unfinished files of previous runs, with their "
+        "options",
+    )
+    parser.add_argument(
+        "--service",
+        nargs="?",
+        type=Path,
+        const=default_socket_path(),
+        metavar="SOCKET",
+        help="transcribe in the running service, with its workers and models, "
+        "instead of starting workers",
+    )
+
+    return parser.parse_args(args)
+
+
+def parse_watch_arguments(args: Sequence[str], config: Config) -> argparse.Namespace:
+    """Parse the arguments of the watch mode, using the saved options as defaults."""
+    parser = argparse.ArgumentParser(
+        prog="whisper-qt watch",
+        description="Transcribe media files as they are added to directories, "
+        "printing progress as JSON.",
+        parents=[transcription_arguments(config)],
+    )
+    parser.add_argument("directories", nargs="+", help="directories to watch")
+    parser.add_argument(
+        "--output-dir",
+        help="where to write the outputs, in the same subdirectories as in the "
+        "watched directory (default: next to every input file)",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        help="seconds a file must not grow before it's transcribed",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="scan the directories for changes instead of using inotify, "
+        "e.g. for network shares",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="seconds between two scans of the directories",
+    )
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        help="file of the transcribed files, which are not transcribed again "
+        "(default: in the cache directory)",
+    )
+
+    return parser.parse_args(args)
+
+
+def manifest_paths(lines: Iterable[str]) -> Iterator[str]:
+    """Yield the paths of a manifest, skipping its empty lines and comments."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def collect_files(patterns: Sequence[str], manifest: Optional[str]) -> list[str]:
+    """Expand glob patterns and read the manifest, without duplicates."""
+    paths = []
+
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            paths.append(pattern)
+
+    if manifest == "-":
+        # Standard input is not closed, it belongs to the whole process.
+        paths.extend(manifest_paths(sys.stdin))
+    elif manifest:
+        with open(manifest) as file:
+            paths.extend(manifest_paths(file))
+
+    return list(dict.fromkeys(paths))
+
+
+def ensure_model(arguments: argparse.Namespace) -> bool:
+    """
+    Download the model with `--download-model` if it's missing, else report it.
+
+    Workers don't download models, so it's checked before starting any of them.
+    """
+    checkpoint_index = CheckpointIndex(arguments.model_dir)
+    if arguments.model not in CHECKPOINTS or checkpoint_index.is_downloaded(
+        arguments.model
+    ):
+        return True
+
+    if not arguments.download_model:
+        emit(
+            "error",
+            message=f"The {arguments.model} model is not downloaded, "
+            "use --download-model to download it.",
+        )
+        return False
+
+    emit("downloading", model=arguments.model)
+    try:
+        checkpoint_index.download(arguments.model)
+    except (CheckpointError, OSError) as error:
+        emit("error", message=str(error))
+        return False
+
+    return True
+
+
+def create_scheduler(
+    arguments: argparse.Namespace, config: Config, max_workers: int, trace: bool
+) -> JobScheduler:
+    """Create a scheduler for the options of the transcription."""
+    result_cache_size = 1024**2 * int(
+        config.get_option("preferences", "result_cache_size")
+        or DEFAULT_MAX_SIZE // 1024**2
+    )
+
+    return JobScheduler(
+        arguments.model_dir,
+        arguments.threads,
+        max_workers,
+        result_cache=ResultCache(max_size=result_cache_size)
+        if result_cache_size and not arguments.no_result_cache
+        else None,
+        # Keep the standard output for the progress events only.
+        verbose=False,
+        batch_size=arguments.batch_size,
+        lock_language=arguments.lock_language,
+        map_weights=arguments.map_weights,
+        pin_workers=arguments.pin_workers,
+        trace=trace,
+        order=arguments.order,
+    )
+
+
+def create_job(
+    file: str, output_directory: str, arguments: argparse.Namespace
+) -> TranscriptionJob:
+    """Create the job of a file with the options of the transcription."""
+    return TranscriptionJob(
+        file,
+        output_directory,
+        arguments.model,
+        arguments.device,
+        arguments.language,
+        options={
+            "task": arguments.task,
+            "temperature": arguments.temperature,
+            "best_of": arguments.best_of,
+            "beam_size": arguments.beam_size,
+            "fp16": arguments.fp16,
+        },
+        vad_aggressiveness=arguments.vad_aggressiveness,
+        parallel_chunks=arguments.parallel_chunks,
+        precision=arguments.precision,
+        output_formats=arguments.formats,
+    )
+
+
+def batch_main(args: Sequence[str]) -> int:
+    """Transcribe files from the command line and return an exit code."""
+    config = Config()
+    config.read_config()
+
+    arguments = parse_batch_arguments(args, config)
+
+    try:
+        files = collect_files(arguments.files, arguments.manifest)
+    except OSError as error:
+        emit("error", message=str(error))
+        return EXIT_USAGE_ERROR
+
+    missing = [file for file in files if not Path(file).is_file()]
+    if not (files or arguments.resume) or missing:
+        emit("error", message="No files to transcribe.", missing=missing)
+        return EXIT_USAGE_ERROR
+
+    # The service checks the models in its own model directory.
+    if not arguments.service and not ensure_model(arguments):
+        return EXIT_USAGE_ERROR
+
+    store = JobStore(
+        max_attempts=arguments.max_attempts, retry_backoff=arguments.retry_backoff
+    )
+    store.recover()
+
+    jobs = store.claim_unfinished("batch") if arguments.resume else []
+    resumed_files = {job.audio_file_path for job in jobs}
+    jobs.extend(
+        create_job(file, arguments.output_dir or str(Path(file).parent), arguments)
+        for file in files
+        if file not in resumed_files
+    )
+    if not jobs:
+        emit("error", message="No files to transcribe.", missing=[])
+        return EXIT_USAGE_ERROR
+
+    store.add(jobs, "batch")
+    store_ids = [cast(int, job.store_id) for job in jobs]
+
+    # The durations order the jobs and estimate when they are done.
+    prober = MediaProber(MediaInfoCache())
+    media_info = prober.probe_all(job.audio_file_path for job in jobs)
+    prober.shutdown()
+    for job in jobs:
+        info = media_info[job.audio_file_path]
+        if info is not None:
+            job.duration = info.duration
+    estimator = EtaEstimator.from_throughput(store.throughput())
+    workers = arguments.max_workers or default_max_workers(arguments.model)
+
+    scheduler: Union[JobScheduler, ServiceClient]
+    if arguments.service:
+        scheduler = ServiceClient(arguments.service)
+    else:
+        scheduler = create_scheduler(
+            arguments, config, arguments.max_workers, bool(arguments.trace)
+        )
+    for job in jobs:
+        scheduler.submit(job)
+
+    jobs_count = len(jobs)
+    finished_jobs = []
+    failed_jobs = []
+    finished_count = 0
+
+    # Job id -> throttle of its position events.
+    throttles: dict[int, Throttle] = {}
+    # Store id -> the unfinished jobs, with their transcribed fraction, where a
+    # retried job is a new job of the same id.
+    unfinished = {cast(int, job.store_id): (job, 0.0) for job in jobs}
+    # Job id -> when the running jobs started.
+    started_at: dict[int, float] = {}
+
+    def eta() -> Optional[float]:
+        return estimator.remaining(unfinished.values(), workers)
+
+    def on_job_started(job: TranscriptionJob) -> None:
+        throttles[job.job_id] = Throttle(POSITION_EVENT_INTERVAL)
+        started_at[job.job_id] = time.monotonic()
+        store.started(job)
+        emit("started", job=job.job_id, file=job.audio_file_path)
+
+    def on_job_progress(job: TranscriptionJob, event: WorkerEvent) -> None:
+        if event.kind == "decoded":
+            if job.duration is None:
+                job.duration = event.data
+            store.decoded(job, event.data)
+            emit("decoded", job=job.job_id, duration=event.data)
+        elif event.kind == "model_loaded":
+            model, mapped, seconds, rss, pss = event.data
+            emit(
+                "model_loaded",
+                job=job.job_id,
+                model=model,
+                mapped=mapped,
+                seconds=seconds,
+                rss=rss,
+                pss=pss,
+            )
+        elif event.kind == "language":
+            language, probability = event.data
+            emit("language", job=job.job_id, language=language, probability=probability)
+        elif event.kind == "warning":
+            emit("warning", job=job.job_id, message=event.data)
+        elif event.kind == "segment" and throttles[job.job_id].ready():
+            segment, position, duration = event.data
+            if duration:
+                unfinished[cast(int, job.store_id)] = (
+                    job,
+                    min(1.0, position / duration),
+                )
+            emit(
+                "position",
+                job=job.job_id,
+                segment=segment,
+                position=position,
+                duration=duration,
+            )
+
+    def on_job_finished(job: TranscriptionJob, success: bool) -> None:
+        nonlocal finished_count
+        throttles.pop(job.job_id, None)
+        seconds = time.monotonic() - started_at.pop(job.job_id, time.monotonic())
+        if success:
+            estimator.record(job, seconds)
+
+        retry_at = store.finished(job, success)
+        if retry_at is not None:
+            unfinished[cast(int, job.store_id)] = (job, 0.0)
+            emit(
+                "retrying",
+                job=job.job_id,
+                file=job.audio_file_path,
+                error=job.error,
+                at=retry_at,
+            )
+            return
+
+        finished_count += 1
+        finished_jobs.append(job)
+        unfinished.pop(cast(int, job.store_id), None)
+
+        if success:
+            emit("finished", job=job.job_id, file=job.audio_file_path)
+        else:
+            failed_jobs.append(job)
+            emit("failed", job=job.job_id, file=job.audio_file_path, error=job.error)
+
+        emit("progress", done=finished_count, total=jobs_count, eta=eta())
+
+    emit(
+        "batch_started",
+        total=jobs_count,
+        audio_seconds=sum(job.duration or 0 for job in jobs),
+        eta=eta(),
+    )
+
+    try:
+        scheduler.run(on_job_started, on_job_finished, on_job_progress)
+
+        # Failed jobs are retried after the others, once their wait is over.
+        while (retry_at := store.next_retry(store_ids)) is not None:
+            time.sleep(max(0.0, retry_at - time.time()))
+            for job in store.due_retries(store_ids):
+                job.duration = unfinished[cast(int, job.store_id)][0].duration
+                scheduler.submit(job)
+            scheduler.run(on_job_started, on_job_finished, on_job_progress)
+    except KeyboardInterrupt:
+        scheduler.cancel()
+        scheduler.shutdown()
+        store.cancel(store_ids)
+        emit("cancelled", done=finished_count, total=jobs_count)
+        return EXIT_INTERRUPTED
+
+    scheduler.shutdown()
+
+    if arguments.trace:
+        with open(arguments.trace, "w") as file:
+            json.dump(chrome_trace(finished_jobs), file)
+        emit(
+            "stages",
+            seconds=stage_times(span for job in finished_jobs for span in job.spans),
+        )
+
+    emit(
+        "batch_finished",
+        total=jobs_count,
+        failed=[job.audio_file_path for job in failed_jobs],
+    )
+
+    return EXIT_SOME_FAILED if failed_jobs else EXIT_SUCCESS
+
+
+def watch_output_directory(file: SettledFile, output_dir: Optional[str]) -> str:
+    """Where to write the outputs of a watched file, in the same subdirectory."""
+    if output_dir is None:
+        return str(Path(file.path).parent)
+
+    return str(Path(output_dir) / Path(file.path).parent.relative_to(file.root))
+
+
+def watch_main(args: Sequence[str]) -> int:
+    """Transcribe the files added to directories until it's stopped."""
+    config = Config()
+    config.read_config()
+
+    arguments = parse_watch_arguments(args, config)
+
+    missing = [
+        directory for directory in arguments.directories if not Path(directory).is_dir()
+    ]
+    if missing:
+        emit("error", message="The directories don't exist.", missing=missing)
+        return EXIT_USAGE_ERROR
+
+    if not ensure_model(arguments):
+        return EXIT_USAGE_ERROR
+
+    ledger = ProcessedLedger(arguments.ledger)
+    watcher = FolderWatcher(
+        arguments.directories,
+        arguments.settle,
+        ledger,
+        arguments.poll,
+        arguments.poll_interval,
+    )
+    try:
+        watcher.start()
+    except OSError as error:
+        emit("error", message=str(error))
+        return EXIT_USAGE_ERROR
+
+    # Nothing is queued when it starts, so the workers are guessed for the model.
+    scheduler = create_scheduler(
+        arguments,
+        config,
+        arguments.max_workers or default_max_workers(arguments.model),
+        trace=False,
+    )
+
+    store = JobStore(
+        max_attempts=arguments.max_attempts, retry_backoff=arguments.retry_backoff
+    )
+    store.recover()
+    # The durations order the queued jobs.
+    prober = MediaProber(MediaInfoCache())
+
+    # Store id -> the watched file, to record it in the ledger when it's transcribed.
+    watched_files: dict[int, SettledFile] = {}
+    # Store id -> when the failed job is retried.
+    retries: dict[int, float] = {}
+    stopped = threading.Event()
+
+    def watch() -> None:
+        while not stopped.is_set():
+            now = time.time()
+            due = [store_id for store_id, at in list(retries.items()) if at <= now]
+            for store_id in due:
+                del retries[store_id]
+            for job in store.due_retries(due):
+                scheduler.submit(job)
+
+            for file in watcher.wait(WATCH_INTERVAL):
+                output_directory = watch_output_directory(file, arguments.output_dir)
+                try:
+                    Path.mkdir(Path(output_directory), parents=True, exist_ok=True)
+                except OSError as error:
+                    emit("failed", file=file.path, error=str(error))
+                    continue
+
+                job = create_job(file.path, output_directory, arguments)
+                info = prober.probe(file.path)
+                if info is not None:
+                    job.duration = info.duration
+                store.add((job,), "watch")
+                watched_files[cast(int, job.store_id)] = file
+                scheduler.submit(job)
+                emit("queued", job=job.job_id, file=file.path)
+
+    def on_job_started(job: TranscriptionJob) -> None:
+        store.started(job)
+        emit("started", job=job.job_id, file=job.audio_file_path)
+
+    def on_job_progress(job: TranscriptionJob, event: WorkerEvent) -> None:
+        if event.kind == "decoded":
+            store.decoded(job, event.data)
+
+    def on_job_finished(job: TranscriptionJob, success: bool) -> None:
+        retry_at = store.finished(job, success)
+        if retry_at is not None:
+            retries[cast(int, job.store_id)] = retry_at
+            emit(
+                "retrying",
+                job=job.job_id,
+                file=job.audio_file_path,
+                error=job.error,
+                at=retry_at,
+            )
+            return
+
+        file = watched_files.pop(cast(int, job.store_id))
+        if success:
+            ledger.add(file.path, file.version)
+            emit("finished", job=job.job_id, file=job.audio_file_path)
+        else:
+            emit("failed", job=job.job_id, file=job.audio_file_path, error=job.error)
+
+    # Stop like with Ctrl+C when the service manager stops it.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    watcher_thread = threading.Thread(target=watch, name="folder-watcher")
+    watcher_thread.start()
+    emit(
+        "watching",
+        directories=watcher.roots,
+        method=watcher.method,
+        fallback_reason=watcher.fallback_reason,
+        processed=len(ledger),
+    )
+
+    try:
+        scheduler.run(on_job_started, on_job_finished, on_job_progress, keep_alive=True)
+    except KeyboardInterrupt:
+        # Interrupted jobs continue from their journals when it's started again.
+        scheduler.cancel()
+        scheduler.shutdown()
+    finally:
+        stopped.set()
+        watcher_thread.join()
+        watcher.close()
+        prober.shutdown()
+        # The files are found again when it's started again.
+        store.cancel(watched_files)
+
+    emit("stopped")
+
+    return EXIT_INTERRUPTED
+
+
+def serve_main(args: Sequence[str]) -> int:
+    """Run the jobs of the clients of the service until it's stopped."""
+    config = Config()
+    config.read_config()
+
+    parser = argparse.ArgumentParser(
+        prog="whisper-qt serve",
+        description="Keep workers and their models loaded, and transcribe the "
+        "files that clients send to a socket.",
+        parents=[transcription_arguments(config)],
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=default_socket_path(),
+        help="the Unix socket of the clients (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        help="seconds a worker keeps its model loaded without jobs",
+    )
+    arguments = parser.parse_args(args)
+
+    if not ensure_model(arguments):
+        return EXIT_USAGE_ERROR
+
+    # Nothing is queued when it starts, so the workers are guessed for the model.
+    scheduler = create_scheduler(
+        arguments,
+        config,
+        arguments.max_workers or default_max_workers(arguments.model),
+        trace=False,
+    )
+    if arguments.idle_timeout is not None:
+        scheduler.idle_timeout = arguments.idle_timeout
+
+    service = TranscriptionService(scheduler, arguments.socket)
+
+    # Stop like with Ctrl+C when the service manager stops it.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    emit("serving", socket=str(arguments.socket))
+
+    try:
+        service.serve()
+    except ServiceError as error:
+        emit("error", message=str(error))
+        return EXIT_USAGE_ERROR
+    except KeyboardInterrupt:
+        scheduler.cancel()
+        scheduler.shutdown()
+
+    emit("stopped")
+
+    return EXIT_INTERRUPTED
+
+
+def jobs_main(args: Sequence[str]) -> int:
+    """Print the states of the stored jobs and the throughput of past runs as JSON."""
+    parser = argparse.ArgumentParser(
+        prog="whisper-qt jobs",
+        description="Print the states of the stored jobs, the throughput of the "
+        "files that were done and the files that failed, as JSON.",
+    )
+    parser.add_argument(
+        "--since",
+        type=float,
+        default=0,
+        metavar="HOURS",
+        help="only the throughput of the last hours (default: all of it)",
+    )
+    parser.add_argument(
+        "--failures", type=int, default=100, help="how many failed files to print"
+    )
+    arguments = parser.parse_args(args)
+
+    store = JobStore()
+    store.recover()
+    print(
+        json.dumps(
+            {
+                "states": store.counts(),
+                "throughput": store.throughput(
+                    time.time() - arguments.since * 3600 if arguments.since else 0
+                ),
+                "failures": store.failures(arguments.failures),
+            },
+            indent=2,
+        )
+    )
+    store.close()
+
+    return EXIT_SUCCESS
@@ -31,7 +31,7 @@ class Config:
     def get_option(self, section: str, option: str) -> Optional[str]:
         """Get the string value of an option."""
         if section in self.__config.sections():
-            return self.__config.get(section, option)
+            return self.__config.get(section, option, fallback=None)
         return None
 
     def write_config(self) -> None:
@@ -7,17 +7,27 @@ from .__about__ import APP_NAME
 
 def xdg_cache_dir() -> Path:
     """XDG base cache directory."""
-    xdg_cache_home = Path(environ.get("XDG_CACHE_HOME", "")) or Path.home().joinpath(
-        ".cache"
+    # An empty variable should be treated as unset.
+    xdg_cache_home = Path(
+        environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
     )
 
     return xdg_cache_home / APP_NAME
 
 
+def xdg_data_dir() -> Path:
+    """XDG base data directory."""
+    xdg_data_home = Path(
+        environ.get("XDG_DATA_HOME") or Path.home().joinpath(".local", "share")
+    )
+
+    return xdg_data_home / APP_NAME
+
+
 def xdg_config_file() -> Path:
     """XDG base config directory."""
-    xdg_config_home = Path(environ.get("XDG_CONFIG_HOME", "")) or Path.home().joinpath(
-        ".config"
+    xdg_config_home = Path(
+        environ.get("XDG_CONFIG_HOME") or Path.home().joinpath(".config")
     )
 
     return xdg_config_home / APP_NAME / "config"
@@ -0,0 +1,37 @@
+"""Compare transcripts, to measure how much a change affects the accuracy."""
+import re
+
+
+def normalize_words(text: str) -> list[str]:
+    """Lower case words without punctuation, so only the words are compared."""
+    return re.findall(r"\w+(?:'\w+)?", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Word edits needed to turn the hypothesis to the reference, per reference word.
+
+    It's the word level Levenshtein distance divided by the reference length.
+    """
+    reference_words = normalize_words(reference)
+    hypothesis_words = normalize_words(hypothesis)
+
+    if not reference_words:
+        return float(bool(hypothesis_words))
+
+    # Distances from the reference prefix to every hypothesis prefix.
+    previous = list(range(len(hypothesis_words) + 1))
+    for index, reference_word in enumerate(reference_words, start=1):
+        current = [index]
+        for hypothesis_index, hypothesis_word in enumerate(hypothesis_words, start=1):
+            current.append(
+                min(
+                    previous[hypothesis_index] + 1,
+                    current[hypothesis_index - 1] + 1,
+                    previous[hypothesis_index - 1]
+                    + (reference_word != hypothesis_word),
+                )
+            )
+        previous = current
+
+    return previous[-1] / len(reference_words)
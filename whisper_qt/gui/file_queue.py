@@ -0,0 +1,472 @@
+"""Model of the files to transcribe, for a view of a very large queue."""
+import hashlib
+import os
+import time
+from gettext import gettext as _
+from stat import S_ISLNK
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+from PySide6 import QtCore
+
+from ..media import MediaInfo
+from ..result_cache import file_digest
+from ..watch import scan_directory
+
+# Bytes read from the start and from the end of a file for its fingerprint.
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+# Above this number of separate ranges the removed rows reset the model, since
+# removing every range moves the rows after it.
+MAX_REMOVED_RANGES = 100
+
+# Columns of the queue.
+FILE, SIZE, DURATION, STATE, ETA = range(5)
+COLUMN_NAMES = ("File", "Size", "Duration", "State", "ETA")
+
+# States of a queued file, in the order they are sorted in.
+STATES = ("running", "queued", "retrying", "failed", "done")
+STATE_NAMES = {
+    "running": "Running",
+    "queued": "Queued",
+    "retrying": "Retrying",
+    "failed": "Failed",
+    "done": "Done",
+}
+
+
+def content_fingerprint(path: str, size: int) -> Optional[bytes]:
+    """
+    Digest of the size, the start and the end of a file, or `None` if unreadable.
+
+    Only samples of a file are read, so adding many large files stays fast, and
+    only the files with the same fingerprint need to be read whole.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+
+    try:
+        with open(path, "rb") as file:
+            digest.update(file.read(FINGERPRINT_SAMPLE_SIZE))
+            if size > 2 * FINGERPRINT_SAMPLE_SIZE:
+                file.seek(-FINGERPRINT_SAMPLE_SIZE, os.SEEK_END)
+                digest.update(file.read())
+    except OSError:
+        return None
+
+    return digest.digest()
+
+
+def expand_directories(paths: Iterable[str]) -> Iterator[str]:
+    """Yield the paths of files, and the media files in the paths of directories."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        directories = [path]
+        while directories:
+            files, subdirectories = scan_directory(directories.pop())
+            yield from sorted(files)
+            directories.extend(sorted(subdirectories, reverse=True))
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    """Seconds as `H:MM:SS`, or nothing if unknown."""
+    if seconds is None:
+        return ""
+
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+def format_size(size: Optional[int]) -> str:
+    """Bytes in the largest unit that is under 1024 of them."""
+    if size is None:
+        return ""
+
+    value = float(size)
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+
+    return f"{value:.1f} GiB"
+
+
+class QueuedFile:
+    """A file in the queue, with what is known about its transcription."""
+
+    __slots__ = (
+        "path",
+        "key",
+        "size",
+        "fingerprint",
+        "digest",
+        "duration",
+        "codec",
+        "state",
+        "position",
+        "started_at",
+    )
+
+    def __init__(self, path: str, key: str, size: Optional[int]) -> None:
+        """Initialize a queued file, of which only the size is known until probed."""
+        self.path = path
+        # Resolved path, which is the same for every path of the file.
+        self.key = key
+        self.size = size
+        # Read only when another file has the same size.
+        self.fingerprint: Optional[bytes] = None
+        # Read only when another file has the same fingerprint.
+        self.digest: Optional[str] = None
+        self.duration: Optional[float] = None
+        # Codec of the first audio stream, and `None` if there is none.
+        self.codec: Optional[str] = None
+        self.state = "queued"
+        # Transcribed seconds of the audio, while it runs.
+        self.position = 0.0
+        self.started_at: Optional[float] = None
+
+    def eta(self, real_time_factor: Optional[float]) -> Optional[float]:
+        """
+        Seconds until it's transcribed, if it's known.
+
+        A running file is estimated at its current speed, and a queued one by the
+        real-time factor of the model.
+        """
+        if self.state == "running" and self.duration and self.position:
+            elapsed = time.monotonic() - (self.started_at or 0)
+            return elapsed * (self.duration - self.position) / self.position
+
+        if (
+            self.state in ("queued", "retrying")
+            and self.duration is not None
+            and real_time_factor is not None
+        ):
+            return self.duration * real_time_factor
+
+        return None
+
+
+class FileQueueModel(QtCore.QAbstractTableModel):
+    """
+    Files to transcribe, with their size, duration, state and remaining time.
+
+    Files are found by their resolved path in a dictionary, so adding and updating
+    a file doesn't depend on the length of the queue, and many files are inserted
+    or removed at once.
+    """
+
+    def __init__(self, fingerprints: bool = False) -> None:
+        """Initialize an empty queue, where `fingerprints` skips identical files."""
+        super().__init__()
+
+        self.fingerprints = fingerprints
+        # Transcription seconds of the selected model for a second of audio.
+        self.real_time_factor: Optional[float] = None
+
+        self.__files: list[QueuedFile] = []
+        # Resolved path -> the file with it.
+        self.__keys: dict[str, QueuedFile] = {}
+        # Path as added -> row of the file, rebuilt when rows move.
+        self.__rows: dict[str, int] = {}
+        # Size -> the files of it, to compare their fingerprints.
+        self.__sizes: dict[int, list[QueuedFile]] = {}
+
+    def rowCount(  # noqa: N802
+        self, parent: Optional[QtCore.QModelIndex] = None
+    ) -> int:
+        """Count the files, where the rows have no children."""
+        return 0 if parent is not None and parent.isValid() else len(self.__files)
+
+    def columnCount(  # noqa: N802
+        self, parent: Optional[QtCore.QModelIndex] = None
+    ) -> int:
+        """Count the columns, where the rows have no children."""
+        return 0 if parent is not None and parent.isValid() else len(COLUMN_NAMES)
+
+    def headerData(  # noqa: N802
+        self,
+        section: int,
+        orientation: QtCore.Qt.Orientation,
+        role: int = QtCore.Qt.DisplayRole,
+    ) -> Any:
+        """Names of the columns."""
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return _(COLUMN_NAMES[section])
+
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> Any:
+        """Text of a cell, formatted only when the view shows it."""
+        if not index.isValid():
+            return None
+
+        file = self.__files[index.row()]
+        column = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            if column == FILE:
+                return file.path
+            if column == SIZE:
+                return format_size(file.size)
+            if column == DURATION:
+                return format_seconds(file.duration)
+            if column == STATE:
+                return _(STATE_NAMES[file.state])
+            if column == ETA:
+                return format_seconds(file.eta(self.real_time_factor))
+        elif role == QtCore.Qt.ToolTipRole and column == FILE:
+            return file.key
+        elif role == QtCore.Qt.ToolTipRole and column == DURATION and file.codec:
+            return file.codec
+        elif role == QtCore.Qt.TextAlignmentRole and column in (SIZE, DURATION, ETA):
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+
+        return None
+
+    def sort(
+        self, column: int, order: QtCore.Qt.SortOrder = QtCore.Qt.AscendingOrder
+    ) -> None:
+        """Sort the files by a column, with unknown values last."""
+        # No column keeps the order of the rows.
+        if column < 0:
+            return
+
+        descending = order == QtCore.Qt.DescendingOrder
+
+        def key(file: QueuedFile) -> tuple[bool, Any]:
+            if column == FILE:
+                return False, file.path
+            if column == STATE:
+                return False, STATES.index(file.state)
+
+            value: Optional[float] = file.size if column == SIZE else file.duration
+            if column == ETA:
+                value = file.eta(self.real_time_factor)
+            # Unknown values are after the known ones in both orders.
+            return (value is None) != descending, value or 0
+
+        self.layoutAboutToBeChanged.emit()
+        old_files = list(self.__files)
+        self.__files.sort(key=key, reverse=descending)
+        self.__index_rows()
+
+        # Keep the selection on the same files.
+        old_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indexes,
+            [
+                self.index(self.__rows[old_files[index.row()].path], index.column())
+                for index in old_indexes
+            ],
+        )
+        self.layoutChanged.emit()
+
+    def __index_rows(self) -> None:
+        """Find the rows of the files again, after they moved."""
+        self.__rows = {file.path: row for row, file in enumerate(self.__files)}
+
+    def __is_duplicate(self, file: QueuedFile) -> bool:
+        """Whether a file with the same content is in the queue."""
+        if file.size is None:
+            return False
+
+        same_size = self.__sizes.get(file.size, [])
+        if not same_size:
+            return False
+
+        file.fingerprint = content_fingerprint(file.path, file.size)
+        for other in same_size:
+            if other.fingerprint is None:
+                other.fingerprint = content_fingerprint(other.path, file.size)
+            if file.fingerprint is None or other.fingerprint != file.fingerprint:
+                continue
+            # Files that only differ in the middle have the same fingerprint.
+            if file.digest is None:
+                file.digest = self.__digest(file)
+            if other.digest is None:
+                other.digest = self.__digest(other)
+            if file.digest is not None and other.digest == file.digest:
+                return True
+
+        return False
+
+    @staticmethod
+    def __digest(file: QueuedFile) -> Optional[str]:
+        """Digest of the whole content of a file, or `None` if unreadable."""
+        try:
+            return file_digest(file.path)
+        except OSError:
+            return None
+
+    def add_files(self, paths: Iterable[str]) -> list[str]:
+        """Add the files that are not in the queue yet, and return their paths."""
+        new_files = []
+        # Directory -> its resolved path, since most files share a few directories.
+        directories: dict[str, str] = {}
+
+        for path in paths:
+            # A path that was added before needs no resolving.
+            if path in self.__rows:
+                continue
+
+            try:
+                stat: Optional[os.stat_result] = os.lstat(path)
+            except OSError:
+                stat = None
+
+            if stat is not None and S_ISLNK(stat.st_mode):
+                key = os.path.realpath(path)
+                try:
+                    stat = os.stat(key)
+                except OSError:
+                    stat = None
+            else:
+                directory, name = os.path.split(os.path.abspath(path))
+                if directory not in directories:
+                    directories[directory] = os.path.realpath(directory)
+                key = os.path.join(directories[directory], name)
+
+            if key in self.__keys:
+                continue
+
+            size = None if stat is None else stat.st_size
+            file = QueuedFile(path, key, size)
+            if self.fingerprints and self.__is_duplicate(file):
+                continue
+
+            self.__keys[key] = file
+            if size is not None:
+                self.__sizes.setdefault(size, []).append(file)
+            new_files.append(file)
+
+        if new_files:
+            first = len(self.__files)
+            last = first + len(new_files) - 1
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+            self.__files.extend(new_files)
+            for row, file in enumerate(new_files, first):
+                self.__rows[file.path] = row
+            self.endInsertRows()
+
+        return [file.path for file in new_files]
+
+    def remove_rows(self, rows: Iterable[int]) -> list[str]:
+        """Remove the files of the rows, and return their paths."""
+        rows = sorted(set(rows))
+        if not rows:
+            return []
+
+        removed = [self.__files[row] for row in rows]
+        for file in removed:
+            del self.__keys[file.key]
+            if file.size is not None:
+                self.__sizes[file.size].remove(file)
+                if not self.__sizes[file.size]:
+                    del self.__sizes[file.size]
+
+        # Ranges of consecutive rows, from the last one.
+        ranges: list[list[int]] = []
+        for row in reversed(rows):
+            if ranges and ranges[-1][0] == row + 1:
+                ranges[-1][0] = row
+            else:
+                ranges.append([row, row])
+
+        if len(ranges) > MAX_REMOVED_RANGES:
+            self.beginResetModel()
+            removed_keys = {file.key for file in removed}
+            self.__files = [
+                file for file in self.__files if file.key not in removed_keys
+            ]
+            self.__index_rows()
+            self.endResetModel()
+        else:
+            for first, last in ranges:
+                self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+                end = last + 1
+                del self.__files[first:end]
+                self.endRemoveRows()
+            self.__index_rows()
+
+        return [file.path for file in removed]
+
+    def clear(self) -> None:
+        """Remove all the files."""
+        self.beginResetModel()
+        self.__files = []
+        self.__keys = {}
+        self.__rows = {}
+        self.__sizes = {}
+        self.endResetModel()
+
+    def files(self) -> list[str]:
+        """Paths of the files, in the order of the rows."""
+        return [file.path for file in self.__files]
+
+    def set_state(self, path: str, state: str) -> None:
+        """Change the state of a file."""
+        row = self.__rows.get(path)
+        if row is None:
+            return
+
+        file = self.__files[row]
+        file.state = state
+        if state == "running":
+            file.started_at = time.monotonic()
+            file.position = 0.0
+        self.dataChanged.emit(self.index(row, STATE), self.index(row, ETA))
+
+    def set_duration(self, path: str, duration: float) -> None:
+        """Set the duration of the audio of a file, once it's known."""
+        row = self.__rows.get(path)
+        if row is None:
+            return
+
+        self.__files[row].duration = duration
+        self.dataChanged.emit(self.index(row, DURATION), self.index(row, ETA))
+
+    def set_media_info(self, path: str, info: Optional[MediaInfo]) -> None:
+        """Set what was found in a file when it was probed."""
+        row = self.__rows.get(path)
+        if row is None or info is None:
+            return
+
+        file = self.__files[row]
+        file.duration = info.duration
+        file.codec = info.codec
+        self.dataChanged.emit(self.index(row, DURATION), self.index(row, ETA))
+
+    def duration(self, path: str) -> Optional[float]:
+        """Duration of the audio of a file, if it's known."""
+        row = self.__rows.get(path)
+        return None if row is None else self.__files[row].duration
+
+    def set_real_time_factor(self, real_time_factor: Optional[float]) -> None:
+        """Estimate the queued files with the real-time factor of another model."""
+        self.real_time_factor = real_time_factor
+        if self.__files:
+            self.dataChanged.emit(
+                self.index(0, ETA), self.index(len(self.__files) - 1, ETA)
+            )
+
+    def set_position(self, path: str, position: float) -> None:
+        """Set how much of the audio of a running file was transcribed."""
+        row = self.__rows.get(path)
+        if row is None:
+            return
+
+        self.__files[row].position = position
+        self.dataChanged.emit(self.index(row, ETA), self.index(row, ETA))
+
+    def requeue(self) -> None:
+        """Queue the running files again, like after cancelling them."""
+        for row, file in enumerate(self.__files):
+            if file.state == "running":
+                file.state = "queued"
+                self.dataChanged.emit(self.index(row, STATE), self.index(row, ETA))
@@ -1,25 +1,56 @@
 """Main window for GUI."""
 # TODO: Config and enable internationalization.
 import threading
+import time
 from gettext import gettext as _
 from pathlib import Path
+from typing import cast
 from typing import Optional
 from typing import Sequence
+from typing import Union
 from webbrowser import open as open_url
 
 from PySide6 import QtCore
 from PySide6 import QtGui
 from PySide6 import QtWidgets
 
+from . import file_queue
 from . import help_dialogs
 from . import preferences
+from . import stage_timings
 from .. import default_files
-from .. import whisper_process
+from .. import scheduler
+from .. import startup
 from ..__about__ import APP_NAME_LOCALIZABLE
 from ..__about__ import BUG_REPORT_URL
 from ..__about__ import PROJECT_HOME_PAGE_URL
+from ..affinity import allocate_cores
+from ..affinity import format_cpus
+from ..checkpoints import CheckpointIndex
 from ..config import Config
-from ..whisper import whisper
+from ..job_store import JobStore
+from ..job_store import RETRY_BACKOFF
+from ..jobs import PRECISIONS
+from ..jobs import TranscriptionJob
+from ..jobs import WorkerEvent
+from ..media import MediaInfoCache
+from ..media import MediaProber
+from ..outputs import OUTPUT_FORMATS
+from ..progress import EtaEstimator
+from ..progress import Throttle
+from ..result_cache import DEFAULT_MAX_SIZE
+from ..result_cache import ResultCache
+from ..service import service_available
+from ..service import ServiceClient
+from ..whisper_metadata import LANGUAGES
+from ..whisper_metadata import MODELS
+
+# Minimum seconds between progress updates, since workers report every segment.
+PROGRESS_UPDATE_INTERVAL = 0.2
+
+# Times a file is run before it fails, unless set in the preferences, since waiting
+# for the retries of a file that always fails only delays its error.
+GUI_MAX_ATTEMPTS = 1
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -47,9 +78,7 @@ class MainWindow(QtWidgets.QMainWindow):
         preferences_action = QtGui.QAction(
             QtGui.QIcon().fromTheme("settings"), _("&Preferences"), self
         )
-        preferences_action.triggered.connect(
-            lambda: preferences.PreferencesDialog().exec()
-        )
+        preferences_action.triggered.connect(self.__listener_open_preferences)
         config_menu.addAction(preferences_action)
 
         save_current_options = QtGui.QAction(
@@ -88,6 +117,13 @@ class MainWindow(QtWidgets.QMainWindow):
         about.triggered.connect(lambda: help_dialogs.About().exec())
         help_menu.addAction(about)
 
+    def __listener_open_preferences(self) -> None:
+        """Open the preferences, then show what they changed."""
+        preferences.PreferencesDialog().exec()
+
+        self.__config.read_config()
+        self.main_panel.update_thread_allocation()
+
     def __listener_save_current_options(self) -> None:
         """Save current selected whisper options to config file."""
         # If the user changed the config after it was loaded first time.
@@ -109,9 +145,11 @@ class MainPanel(QtWidgets.QWidget):
     set_progress_indefinite = QtCore.Signal()
     show_message = QtCore.Signal(str, str, Optional[str])
     toggle_generate_cancel_button = QtCore.Signal()
-
-    # To tell the processes thread that the task was canceled and didn't success.
-    processes_thread_stop = threading.Event()
+    show_stage_timings = QtCore.Signal(object)
+    update_queued_file_state = QtCore.Signal(str, str)
+    update_queued_file_duration = QtCore.Signal(str, float)
+    update_queued_file_position = QtCore.Signal(str, float)
+    update_queued_file_info = QtCore.Signal(str, object)
 
     def __init__(self, config: Config) -> None:
         """Initialize base components."""
@@ -119,6 +157,32 @@ class MainPanel(QtWidgets.QWidget):
 
         self.__config = config
 
+        self.scheduler: Optional[scheduler.JobScheduler] = None
+        # Client of the local service, when the last run used it.
+        self.__service_client: Optional[ServiceClient] = None
+        # Thread of the last run, which reports how it ended.
+        self.thread: Optional[threading.Thread] = None
+
+        # Jobs are stored to restore the unfinished ones after a restart or a crash.
+        self.__job_store = JobStore()
+        self.__job_store.recover()
+        # File -> store id of the jobs in the list that were restored.
+        self.__stored_jobs = {
+            job.audio_file_path: cast(int, job.store_id)
+            for job in self.__job_store.claim_unfinished("gui")
+        }
+        # File -> store id of the jobs of the current run.
+        self.__running_store_ids: dict[str, int] = {}
+        # Set when the run is cancelled, to stop waiting for the retries.
+        self.__cancelled = threading.Event()
+
+        # Added files are probed in the background for their durations, which order
+        # the jobs and estimate when they are done.
+        self.__prober = MediaProber(MediaInfoCache())
+        self.__eta_estimator = EtaEstimator.from_throughput(
+            self.__job_store.throughput()
+        )
+
         # Accept drap files to the panel.
         # Configured in self.dragEnterEvent, self.dragMoveEvent, self.dropEvent.
         self.setAcceptDrops(True)
@@ -158,12 +222,31 @@ class MainPanel(QtWidgets.QWidget):
             )
         )
 
-        # The files list.
-        self.__selected_files_list = QtWidgets.QListWidget()
-        self.__selected_files_list.setSelectionMode(
+        # The files list, where only the visible rows are drawn.
+        self.__files_queue = file_queue.FileQueueModel()
+        self.__files_view = QtWidgets.QTableView()
+        self.__files_view.setModel(self.__files_queue)
+        self.__files_view.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows
+        )
+        self.__files_view.setSelectionMode(
             QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection
         )
-        files_list_layout.addWidget(self.__selected_files_list)
+        self.__files_view.setWordWrap(False)
+        # Files stay in the order they were added until a column is clicked.
+        self.__files_view.horizontalHeader().setSortIndicator(
+            -1, QtCore.Qt.AscendingOrder
+        )
+        self.__files_view.setSortingEnabled(True)
+        self.__files_view.verticalHeader().hide()
+        # Rows of the same height don't need to be measured.
+        self.__files_view.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Fixed
+        )
+        self.__files_view.horizontalHeader().setSectionResizeMode(
+            file_queue.FILE, QtWidgets.QHeaderView.Stretch
+        )
+        files_list_layout.addWidget(self.__files_view)
 
         # A spacer
         main_layout.addItem(QtWidgets.QSpacerItem(0, 10))
@@ -190,6 +273,17 @@ class MainPanel(QtWidgets.QWidget):
             str(Path.home())
         )  # No need to be saved in config file.
 
+        # Select the formats of the outputs, which are all written at once.
+        output_formats = (
+            self.__config.get_option("whisper", "output_formats") or "srt"
+        ).split(",")
+        self.__cbx_output_formats: dict[str, QtWidgets.QCheckBox] = {}
+        for output_format in OUTPUT_FORMATS:
+            checkbox = QtWidgets.QCheckBox(output_format.upper())
+            checkbox.setChecked(output_format in output_formats)
+            output_directory_layout.addWidget(checkbox)
+            self.__cbx_output_formats[output_format] = checkbox
+
         # A spacer
         main_layout.addItem(QtWidgets.QSpacerItem(0, 15))
 
@@ -202,7 +296,7 @@ class MainPanel(QtWidgets.QWidget):
         options_layout.addWidget(QtWidgets.QLabel(_("Model")))
 
         self.__cobx_model = QtWidgets.QComboBox()
-        self.__cobx_model.addItems(whisper.available_models())
+        self.__cobx_model.addItems(MODELS)
         self.__cobx_model.setMaximumWidth(self.__cobx_model.minimumSizeHint().width())
         self.__cobx_model.setCurrentIndex(
             self.__cobx_model.findText(
@@ -218,9 +312,7 @@ class MainPanel(QtWidgets.QWidget):
 
         self.__cobx_audio_lang = QtWidgets.QComboBox()
         self.__cobx_audio_lang.addItem("Auto")
-        self.__cobx_audio_lang.addItems(
-            (x.title() for x in whisper.tokenizer.LANGUAGES.values())
-        )
+        self.__cobx_audio_lang.addItems((x.title() for x in LANGUAGES.values()))
         self.__cobx_audio_lang.setMaximumWidth(
             self.__cobx_audio_lang.minimumSizeHint().width()
         )
@@ -234,6 +326,18 @@ class MainPanel(QtWidgets.QWidget):
         self.__cobx_audio_lang.setCurrentIndex(default_index)
         options_layout.addWidget(self.__cobx_audio_lang)
 
+        self.__cbx_lock_language = QtWidgets.QCheckBox(_("Same for All"))
+        self.__cbx_lock_language.setToolTip(
+            _(
+                "With Auto, use the language that most files were detected in "
+                "for the rest of the files"
+            )
+        )
+        self.__cbx_lock_language.setChecked(
+            bool(int(self.__config.get_option("whisper", "lock_language") or 0))
+        )
+        options_layout.addWidget(self.__cbx_lock_language)
+
         options_layout.addSpacing(35)
 
         # Select task
@@ -268,12 +372,24 @@ class MainPanel(QtWidgets.QWidget):
         options_layout.addWidget(QtWidgets.QLabel(_("Threads")))
 
         self.__sp_threads = QtWidgets.QSpinBox()
+        self.__sp_threads.setSpecialValueText(_("Auto"))
+        self.__sp_threads.setToolTip(
+            _("Threads of every parallel job, Auto splits the CPU cores between them")
+        )
         self.__sp_threads.setMaximumWidth(self.__sp_threads.minimumSizeHint().width())
         self.__sp_threads.setValue(
             int(self.__config.get_option("whisper", "threads") or 0)
         )
         options_layout.addWidget(self.__sp_threads)
 
+        self.__lb_thread_allocation = QtWidgets.QLabel()
+        options_layout.addWidget(self.__lb_thread_allocation)
+        self.__sp_threads.valueChanged.connect(self.update_thread_allocation)
+        self.__cobx_model.currentTextChanged.connect(self.update_thread_allocation)
+        self.update_thread_allocation()
+        self.__cobx_model.currentTextChanged.connect(self.__update_queue_estimates)
+        self.__cobx_device.currentTextChanged.connect(self.__update_queue_estimates)
+
         options_layout.addSpacing(35)
 
         # Where you can select advanced wisper options.
@@ -333,6 +449,61 @@ class MainPanel(QtWidgets.QWidget):
         )
         advanced_options_layout.addWidget(self.__cbx_fp16)
 
+        advanced_options_layout.addSpacing(35)
+
+        # Set precision
+        advanced_options_layout.addWidget(QtWidgets.QLabel(_("CPU Precision")))
+
+        self.__cobx_precision = QtWidgets.QComboBox()
+        self.__cobx_precision.addItems(PRECISIONS)
+        self.__cobx_precision.setToolTip(
+            _("int8 is faster on the CPU, but might be less accurate")
+        )
+        self.__cobx_precision.setMaximumWidth(
+            self.__cobx_precision.minimumSizeHint().width()
+        )
+        precision = self.__cobx_precision.findText(
+            self.__config.get_option("whisper", "precision")
+        )
+        self.__cobx_precision.setCurrentIndex(max(0, precision))
+        advanced_options_layout.addWidget(self.__cobx_precision)
+
+        advanced_options_layout.addSpacing(35)
+
+        # Set VAD aggressiveness
+        advanced_options_layout.addWidget(QtWidgets.QLabel(_("Skip Silence")))
+
+        self.__sp_vad_aggressiveness = QtWidgets.QSpinBox()
+        self.__sp_vad_aggressiveness.setRange(0, 3)
+        self.__sp_vad_aggressiveness.setSpecialValueText(_("Off"))
+        self.__sp_vad_aggressiveness.setToolTip(
+            _("Only transcribe the parts with speech, higher values skip more")
+        )
+        self.__sp_vad_aggressiveness.setValue(
+            int(self.__config.get_option("whisper", "vad_aggressiveness") or 0)
+        )
+        self.__sp_vad_aggressiveness.setMaximumWidth(
+            self.__sp_vad_aggressiveness.minimumSizeHint().width()
+        )
+        advanced_options_layout.addWidget(self.__sp_vad_aggressiveness)
+
+        advanced_options_layout.addSpacing(35)
+
+        # Set parallel chunks
+        advanced_options_layout.addWidget(QtWidgets.QLabel(_("Split Long Files")))
+
+        self.__cbx_parallel_chunks = QtWidgets.QCheckBox()
+        self.__cbx_parallel_chunks.setToolTip(
+            _("Transcribe parts of a long file with several workers at the same time")
+        )
+        self.__cbx_parallel_chunks.setMaximumWidth(
+            self.__cbx_parallel_chunks.minimumSizeHint().width()
+        )
+        self.__cbx_parallel_chunks.setChecked(
+            bool(int(self.__config.get_option("whisper", "parallel_chunks") or 0))
+        )
+        advanced_options_layout.addWidget(self.__cbx_parallel_chunks)
+
         # TODO: Add patience option.
         # TODO: Add length_penalty option.
         # TODO: Add suppress_tokens option.
@@ -394,9 +565,20 @@ class MainPanel(QtWidgets.QWidget):
             self.__listener_setting_progress_indefinite
         )
         self.show_message.connect(self.__listener_show_message)
+        self.show_stage_timings.connect(
+            lambda jobs: stage_timings.StageTimingsDialog(jobs).exec()
+        )
         self.toggle_generate_cancel_button.connect(
             self.__listener_toggle_generate_cancel_button
         )
+        self.update_queued_file_state.connect(self.__files_queue.set_state)
+        self.update_queued_file_duration.connect(self.__files_queue.set_duration)
+        self.update_queued_file_position.connect(self.__files_queue.set_position)
+        self.update_queued_file_info.connect(self.__files_queue.set_media_info)
+        self.__update_queue_estimates()
+
+        if self.__stored_jobs:
+            self.__add_files_to_list(tuple(self.__stored_jobs))
 
     def save_current_options(self) -> None:
         """Add current selected whisper option in the config object."""
@@ -407,6 +589,7 @@ class MainPanel(QtWidgets.QWidget):
 
         setter("model", self.__cobx_model.currentText())
         setter("audio_lang", self.__cobx_audio_lang.currentText())
+        setter("lock_language", str(int(self.__cbx_lock_language.isChecked())))
         setter("task", str(self.__cobx_task.currentIndex()))
         setter("device", self.__cobx_device.currentText())
         setter("threads", str(self.__sp_threads.value()))
@@ -414,28 +597,75 @@ class MainPanel(QtWidgets.QWidget):
         setter("best_of", str(self.__sp_best_of.value()))
         setter("beam_size", str(self.__sp_beam_size.value()))
         setter("fp16", str(int(self.__cbx_fp16.isChecked())))
+        setter("precision", self.__cobx_precision.currentText())
+        setter("vad_aggressiveness", str(self.__sp_vad_aggressiveness.value()))
+        setter("parallel_chunks", str(int(self.__cbx_parallel_chunks.isChecked())))
+        setter("output_formats", ",".join(self.__selected_output_formats()))
+
+    def __selected_output_formats(self) -> tuple[str, ...]:
+        """Get the formats that the outputs should be written in."""
+        return tuple(
+            output_format
+            for output_format, checkbox in self.__cbx_output_formats.items()
+            if checkbox.isChecked()
+        )
+
+    def update_thread_allocation(self) -> None:
+        """Show how the CPU cores are split between the parallel jobs."""
+        workers = int(
+            self.__config.get_option("preferences", "max_workers") or 0
+        ) or scheduler.default_max_workers(self.__cobx_model.currentText())
+        pinned = bool(int(self.__config.get_option("preferences", "pin_workers") or 0))
+        allocations = allocate_cores(workers, self.__sp_threads.value())
+
+        # The cores might not be split evenly.
+        fewest = min(allocation.threads for allocation in allocations)
+        most = max(allocation.threads for allocation in allocations)
+        self.__lb_thread_allocation.setText(
+            _("{} jobs × {} threads").format(
+                workers, fewest if fewest == most else f"{fewest}-{most}"
+            )
+        )
+
+        lines = []
+        for number, allocation in enumerate(allocations, 1):
+            if pinned:
+                line = _("Job {}: {} threads on CPUs {}").format(
+                    number, allocation.threads, format_cpus(allocation.cpus)
+                )
+            else:
+                line = _("Job {}: {} threads").format(number, allocation.threads)
+            lines.append(line)
+        self.__lb_thread_allocation.setToolTip("\n".join(lines))
 
     def __add_files_to_list(self, files: tuple[str, ...]) -> None:
         """
         Add files to the files list.
 
-        Filter not video nor audio files, and files that has been selected before.
+        Directories add the media files in them, and files that has been selected
+        before are skipped, with the identical ones if it's enabled.
         """
-        current_files_list = tuple(
-            self.__selected_files_list.item(i).text()
-            for i in range(self.__selected_files_list.count())
+        self.__files_queue.fingerprints = bool(
+            int(self.__config.get_option("preferences", "skip_identical_files") or 0)
         )
-
-        # TODO: Filter files if they has a not video nor audio mime type.
-
-        for file in files:
-            if file not in current_files_list:
-                self.__selected_files_list.addItem(file)
+        added_files = self.__files_queue.add_files(file_queue.expand_directories(files))
+        self.__prober.submit(added_files, self.update_queued_file_info.emit)
 
         # Enable those buttons only if list of files is not empty.
-        # No problem if selected files were duplicates, since the list is not empty.
-        self.__b_run_generator.setEnabled(True)
-        self.__b_remove_files.setEnabled(True)
+        if self.__files_queue.rowCount():
+            self.__b_run_generator.setEnabled(True)
+            self.__b_remove_files.setEnabled(True)
+
+    def __update_queue_estimates(self) -> None:
+        """Estimate the queued files with the speed of the selected model."""
+        self.__files_queue.set_real_time_factor(
+            self.__eta_estimator.real_time_factors.get(
+                (
+                    self.__cobx_model.currentText(),
+                    self.__cobx_device.currentText().lower(),
+                )
+            )
+        )
 
     def __listener_selecting_files(self) -> None:
         """Get files list from QFileDialog, then add them to the list."""
@@ -451,10 +681,18 @@ class MainPanel(QtWidgets.QWidget):
 
     def __listener_removing_files(self) -> None:
         """Get selected files then delete them and disable buttons if list is empty."""
-        for item in self.__selected_files_list.selectedItems():
-            self.__selected_files_list.takeItem(self.__selected_files_list.row(item))
+        removed_store_ids = []
+        removed_files = self.__files_queue.remove_rows(
+            index.row() for index in self.__files_view.selectionModel().selectedRows()
+        )
+        for file in removed_files:
+            store_id = self.__stored_jobs.pop(file, None)
+            if store_id is not None:
+                removed_store_ids.append(store_id)
+
+        self.__job_store.remove(removed_store_ids)
 
-        if self.__selected_files_list.count() == 0:
+        if self.__files_queue.rowCount() == 0:
             # If no items left disables those buttons
             self.__b_remove_files.setEnabled(False)
             self.__b_run_generator.setEnabled(False)
@@ -474,7 +712,7 @@ class MainPanel(QtWidgets.QWidget):
 
     def __listener_reseting_gui_after_success(self) -> None:
         """Clear list and enable buttons after success."""
-        self.__selected_files_list.clear()
+        self.__files_queue.clear()
 
         self.__b_run_generator.setEnabled(False)
         self.__b_remove_files.setEnabled(False)
@@ -487,6 +725,8 @@ class MainPanel(QtWidgets.QWidget):
         self.__listener_toggle_generate_cancel_button()
 
         self.__reset_progressbar()
+        # The files of the run changed the speed of their model.
+        self.__update_queue_estimates()
 
         if self.__b_run_generator.isEnabled():
             self.__b_remove_files.setEnabled(True)
@@ -495,6 +735,7 @@ class MainPanel(QtWidgets.QWidget):
         self.__b_select_output.setEnabled(True)
         self.__cobx_model.setEnabled(True)
         self.__cobx_audio_lang.setEnabled(True)
+        self.__cbx_lock_language.setEnabled(True)
         self.__cobx_task.setEnabled(True)
         self.__cobx_device.setEnabled(True)
         self.__sp_threads.setEnabled(True)
@@ -502,6 +743,11 @@ class MainPanel(QtWidgets.QWidget):
         self.__sp_best_of.setEnabled(True)
         self.__sp_beam_size.setEnabled(True)
         self.__cbx_fp16.setEnabled(True)
+        for checkbox in self.__cbx_output_formats.values():
+            checkbox.setEnabled(True)
+        self.__cobx_precision.setEnabled(True)
+        self.__sp_vad_aggressiveness.setEnabled(True)
+        self.__cbx_parallel_chunks.setEnabled(True)
 
     def __listener_locking_buttons_during_operation(self) -> None:
         """Disable buttons when there is a running operation."""
@@ -510,6 +756,7 @@ class MainPanel(QtWidgets.QWidget):
         self.__b_select_output.setEnabled(False)
         self.__cobx_model.setEnabled(False)
         self.__cobx_audio_lang.setEnabled(False)
+        self.__cbx_lock_language.setEnabled(False)
         self.__cobx_task.setEnabled(False)
         self.__cobx_device.setEnabled(False)
         self.__sp_threads.setEnabled(False)
@@ -517,6 +764,11 @@ class MainPanel(QtWidgets.QWidget):
         self.__sp_best_of.setEnabled(False)
         self.__sp_beam_size.setEnabled(False)
         self.__cbx_fp16.setEnabled(False)
+        for checkbox in self.__cbx_output_formats.values():
+            checkbox.setEnabled(False)
+        self.__cobx_precision.setEnabled(False)
+        self.__sp_vad_aggressiveness.setEnabled(False)
+        self.__cbx_parallel_chunks.setEnabled(False)
 
     def __listener_updateing_progress(self, string: str, percentage: int) -> None:
         """When there is a progress update display it in the GUI."""
@@ -546,6 +798,8 @@ class MainPanel(QtWidgets.QWidget):
             message = QtWidgets.QMessageBox(
                 QtWidgets.QMessageBox.Information, title, text
             )
+        elif message_type == "warning":
+            message = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Warning, title, text)
         elif message_type == "error":
             message = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Critical, title, text)
         else:
@@ -561,24 +815,122 @@ class MainPanel(QtWidgets.QWidget):
         else:
             self.__b_run_generator.setHidden(True)
             self.__b_cancel_generator.setHidden(False)
+            self.__b_cancel_generator.setEnabled(True)
 
     def __listener_running_generator(self) -> None:
         """Actions when the task is started."""
+        # The buttons are enabled when the previous run returned, but its thread
+        # might still be reporting how it ended.
+        if self.thread is not None:
+            self.thread.join()
+
+        model_dir = self.__config.get_option("preferences", "model_directory") or str(
+            default_files.xdg_cache_dir()
+        )
+
+        output_formats = self.__selected_output_formats()
+        if not output_formats:
+            self.__listener_show_message(
+                "error", _("Select at least one output format."), _("No Outputs")
+            )
+            return
+
+        # Workers don't download models, so fail before starting any of them.
+        model = self.__cobx_model.currentText()
+        if not CheckpointIndex(model_dir).is_downloaded(model):
+            self.__listener_show_message(
+                "error",
+                _(
+                    "The {} model is not downloaded, download it from the preferences."
+                ).format(model),
+                _("Missing Model"),
+            )
+            return
+
         self.lock_buttons_during_operation.emit()
 
         # Show cancel button insted of generate button.
         self.toggle_generate_cancel_button.emit()
+        threads = self.__sp_threads.value()
+        max_workers = int(self.__config.get_option("preferences", "max_workers") or 0)
+        # Saved in MB, where 0 disables the cache.
+        result_cache_size = 1024**2 * int(
+            self.__config.get_option("preferences", "result_cache_size")
+            or DEFAULT_MAX_SIZE // 1024**2
+        )
+        map_weights = bool(
+            int(self.__config.get_option("preferences", "map_weights") or 0)
+        )
+        pin_workers = bool(
+            int(self.__config.get_option("preferences", "pin_workers") or 0)
+        )
+        trace = bool(int(self.__config.get_option("preferences", "trace") or 0))
 
-        self.processes = [
-            whisper_process.WhisperProcess(
+        job_runner: Union[scheduler.JobScheduler, ServiceClient]
+        use_service = bool(
+            int(self.__config.get_option("preferences", "use_service") or 0)
+        )
+        if use_service and service_available():
+            # The workers of the service might have the models loaded.
+            job_runner = self.__service_client = ServiceClient()
+        else:
+            # Reuse the workers of the previous run, they might have the models loaded.
+            job_scheduler = self.scheduler
+            if job_scheduler is None or (
+                job_scheduler.model_dir,
+                job_scheduler.threads,
+                job_scheduler.max_workers,
+                0
+                if job_scheduler.result_cache is None
+                else job_scheduler.result_cache.max_size,
+                job_scheduler.map_weights,
+                job_scheduler.pin_workers,
+                job_scheduler.trace,
+            ) != (
+                model_dir,
+                threads,
+                max_workers,
+                result_cache_size,
+                map_weights,
+                pin_workers,
+                trace,
+            ):
+                if job_scheduler is not None:
+                    job_scheduler.shutdown()
+
+                job_scheduler = scheduler.JobScheduler(
+                    model_dir,
+                    threads,
+                    max_workers,
+                    result_cache=ResultCache(max_size=result_cache_size)
+                    if result_cache_size
+                    else None,
+                    map_weights=map_weights,
+                    pin_workers=pin_workers,
+                    trace=trace,
+                )
+                self.scheduler = job_scheduler
+
+            # Only used when dispatching, so it can change without new workers.
+            job_scheduler.batch_size = int(
+                self.__config.get_option("preferences", "batch_size")
+                or scheduler.DEFAULT_BATCH_SIZE
+            )
+            job_scheduler.lock_language = self.__cbx_lock_language.isChecked()
+            job_scheduler.order = (
+                self.__config.get_option("preferences", "job_order") or "queued"
+            )
+            job_runner = job_scheduler
+
+        audio_files = tuple(self.__files_queue.files())
+        jobs = []
+        for audio_file in audio_files:
+            job = TranscriptionJob(
                 audio_file,
-                self.__config.get_option("prefrences", "model_directory")
-                or str(default_files.xdg_cache_dir()),
-                self.__cobx_audio_lang.currentText(),
                 self.__output_directory.text(),
                 self.__cobx_model.currentText(),
                 self.__cobx_device.currentText().lower(),
-                self.__sp_threads.value(),
+                self.__cobx_audio_lang.currentText(),
                 options={
                     "task": ("transcribe", "translate")[
                         self.__cobx_task.currentIndex()
@@ -588,54 +940,194 @@ class MainPanel(QtWidgets.QWidget):
                     "beam_size": self.__sp_beam_size.value(),
                     "fp16": self.__cbx_fp16.isChecked(),
                 },
+                vad_aggressiveness=self.__sp_vad_aggressiveness.value(),
+                parallel_chunks=self.__cbx_parallel_chunks.isChecked(),
+                precision=self.__cobx_precision.currentText(),
+                output_formats=output_formats,
             )
-            for audio_file in tuple(
-                self.__selected_files_list.item(i).text()
-                for i in range(self.__selected_files_list.count())
+            # A restored job is run with the current options.
+            job.store_id = self.__stored_jobs.pop(audio_file, None)
+            job.duration = self.__files_queue.duration(audio_file)
+            jobs.append(job)
+
+        job_store = self.__job_store
+        # A file that fails is shown as failed right away, unless retries are set.
+        job_store.max_attempts = int(
+            self.__config.get_option("preferences", "max_attempts") or GUI_MAX_ATTEMPTS
+        )
+        job_store.retry_backoff = float(
+            self.__config.get_option("preferences", "retry_backoff") or RETRY_BACKOFF
+        )
+        job_store.add(jobs, "gui")
+        self.__running_store_ids = {
+            job.audio_file_path: cast(int, job.store_id) for job in jobs
+        }
+        for job in jobs:
+            job_runner.submit(job)
+        # Store id -> the job that was submitted, to retry it if it fails.
+        stored_jobs = {cast(int, job.store_id): job for job in jobs}
+        self.__cancelled.clear()
+
+        # Long files are split when they start, so they are counted here.
+        jobs_count = len(audio_files)
+        finished_jobs: list[TranscriptionJob] = []
+        # Job id -> transcribed fraction of the running jobs.
+        running_jobs: dict[int, float] = {}
+        # Job id -> the jobs that didn't finish.
+        unfinished_jobs = {job.job_id: job for job in jobs}
+        # Job id -> when the running jobs started.
+        started_at: dict[int, float] = {}
+        eta_estimator = self.__eta_estimator
+        workers = max_workers or scheduler.default_max_workers(
+            self.__cobx_model.currentText()
+        )
+        throttle = Throttle(PROGRESS_UPDATE_INTERVAL)
+
+        def emit_progress() -> None:
+            done = len(finished_jobs) + sum(running_jobs.values())
+            text = f"{len(finished_jobs)}/{jobs_count}"
+
+            remaining = eta_estimator.remaining(
+                (
+                    (job, running_jobs.get(job_id, 0.0))
+                    for job_id, job in unfinished_jobs.items()
+                ),
+                workers,
+            )
+            if remaining is not None:
+                text += _(" (about {} left)").format(
+                    file_queue.format_seconds(remaining)
+                )
+
+            self.update_progress.emit(text, int(done * 100 / jobs_count))
+
+        def on_job_started(job: TranscriptionJob) -> None:
+            running_jobs[job.job_id] = 0.0
+            started_at[job.job_id] = time.monotonic()
+            job_store.started(job)
+            self.update_file_progress.emit(job.audio_file_path)
+            self.update_queued_file_state.emit(job.audio_file_path, "running")
+
+        def on_job_progress(job: TranscriptionJob, event: WorkerEvent) -> None:
+            if event.kind == "decoded":
+                if job.duration is None:
+                    job.duration = event.data
+                job_store.decoded(job, event.data)
+                self.update_queued_file_duration.emit(job.audio_file_path, event.data)
+            if event.kind != "segment":
+                return
+
+            _segment, position, duration = event.data
+            running_jobs[job.job_id] = min(1.0, position / duration) if duration else 0
+
+            if throttle.ready():
+                language = ""
+                if job.detected_language is not None:
+                    language = " [{}, {:.0%}]".format(
+                        LANGUAGES[job.detected_language[0]].title(),
+                        job.detected_language[1],
+                    )
+
+                self.update_queued_file_position.emit(job.audio_file_path, position)
+                self.update_file_progress.emit(
+                    "{}{} ({} / {})".format(
+                        job.audio_file_path,
+                        language,
+                        time.strftime("%H:%M:%S", time.gmtime(position)),
+                        time.strftime("%H:%M:%S", time.gmtime(duration)),
+                    )
+                )
+                emit_progress()
+
+        def on_job_finished(job: TranscriptionJob, success: bool) -> None:
+            running_jobs.pop(job.job_id, None)
+            unfinished_jobs.pop(job.job_id, None)
+            seconds = time.monotonic() - started_at.pop(job.job_id, time.monotonic())
+            if success:
+                eta_estimator.record(job, seconds)
+            # A failed job that can be retried runs again once its wait is over.
+            retry_at = job_store.finished(job, success)
+            if retry_at is None:
+                finished_jobs.append(job)
+            self.update_queued_file_state.emit(
+                job.audio_file_path,
+                "done" if success else "failed" if retry_at is None else "retrying",
             )
-        ]
+
+            # Always display when a job finishes.
+            throttle.ready(force=True)
+            emit_progress()
+
+        def run_with_retries() -> bool:
+            """Run the jobs, then the failed ones again when their wait is over."""
+            store_ids = tuple(stored_jobs)
+            if not job_runner.run(on_job_started, on_job_finished, on_job_progress):
+                return False
+
+            while (retry_at := job_store.next_retry(store_ids)) is not None:
+                if self.__cancelled.wait(max(0.0, retry_at - time.time())):
+                    return False
+                for job in job_store.due_retries(store_ids):
+                    job.duration = stored_jobs[cast(int, job.store_id)].duration
+                    unfinished_jobs[job.job_id] = job
+                    job_runner.submit(job)
+                if not job_runner.run(on_job_started, on_job_finished, on_job_progress):
+                    return False
+
+            # A cancel between two runs drops the retries without stopping a run.
+            return not self.__cancelled.is_set()
 
         def thread_run() -> None:
             """Run processes under a thread to detect when they finish without freezing the GUI."""
-            for process in self.processes:
-                # PERF: Set max processes count and don't run a lot of process at ones.
-                process.start()
-
-            # TODO: Optionaly run processes in queue.
-            # self.update_file_progress.emit(process.audio_file_path)
-
-            for process in self.processes:
-                process.join()
-
-            if not self.processes_thread_stop.isSet():
+            if run_with_retries():
                 self.reset_gui_after_sucess.emit()
-            self.processes_thread_stop.clear()
+
+                errors = [
+                    f"{job.audio_file_path}: {job.error}"
+                    for job in finished_jobs
+                    if job.error is not None
+                ]
+                if errors:
+                    self.show_message.emit("error", "\n".join(errors), _("Failed"))
+
+                warnings = [
+                    f"{job.audio_file_path}: {warning}"
+                    for job in finished_jobs
+                    for warning in job.warnings
+                ]
+                if warnings:
+                    self.show_message.emit(
+                        "warning", "\n".join(warnings), _("Warnings")
+                    )
+
+                if any(job.spans for job in finished_jobs):
+                    self.show_stage_timings.emit(finished_jobs)
+            else:
+                # Only now the workers stopped, so a new run can't overlap with it.
+                self.reset_gui_after_cancel.emit()
 
         self.thread = threading.Thread(target=thread_run)
         self.thread.start()
 
-        # TODO: Display progress bar.
-        # self.update_progress.emit()
-
-        # TODO: Display errors and warnings.
-        # self.__show_message()
-
     def __listener_cancel_generator(self) -> None:
         """Actions when the task is canceled."""
         self.update_progress.emit(_("Cancelling..."), 0)
         self.update_file_progress.emit("")
 
-        self.processes_thread_stop.set()
-
-        for process in self.processes:
-            try:
-                process.terminate()
-            except AttributeError:
-                # When process hasn't started yet or already finished.
-                pass
-
+        # Queued jobs are dropped and only the running ones are stopped.
+        self.__cancelled.set()
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+        if self.__service_client is not None:
+            self.__service_client.cancel()
+        # They are restored in the next start, or run again from the list.
+        self.__job_store.cancel(self.__running_store_ids.values())
+        self.__stored_jobs.update(self.__running_store_ids)
+        self.__files_queue.requeue()
+
+        # The GUI is reset when the run stopped.
+        self.__b_cancel_generator.setEnabled(False)
         self.set_progress_indefinite.emit()
-        self.reset_gui_after_cancel.emit()
 
     def dragEnterEvent(self, event: QtGui.QDragEnterEvent) -> None:  # noqa: N802
         """When a drag action enters the panel."""
@@ -670,4 +1162,13 @@ def ui_main(argv: Sequence[str]) -> int:
     app = QtWidgets.QApplication(argv)
     window = MainWindow()
     window.show()
+
+    if startup.measurement_requested():
+        # Report when the event loop starts, so the window is already displayed.
+        def report_and_quit() -> None:
+            startup.report_startup()
+            app.quit()
+
+        QtCore.QTimer.singleShot(0, report_and_quit)
+
     return app.exec()
@@ -1,17 +1,33 @@
 """Preferences and settings widgets and dialogs."""
+import threading
 from gettext import gettext as _
+from typing import Callable
 
 from PySide6 import QtCore
 from PySide6 import QtWidgets
 
 from .. import default_files
 from ..__about__ import APP_NAME_LOCALIZABLE
+from ..checkpoints import CheckpointError
+from ..checkpoints import CheckpointIndex
 from ..config import Config
+from ..result_cache import DEFAULT_MAX_SIZE
+from ..result_cache import ResultCache
+from ..scheduler import DEFAULT_BATCH_SIZE
+from ..scheduler import default_max_workers
+from ..scheduler import JOB_ORDERS
+from ..system import usable_cpu_count
+from ..whisper_metadata import MODELS
 
 
 class PreferencesDialog(QtWidgets.QDialog):
     """Application preferences dialog."""
 
+    # Set the status text of the selected model's checkpoint from any thread.
+    update_checkpoint_status = QtCore.Signal(str)
+    # A verification or download finished, with the status to display.
+    checkpoint_task_finished = QtCore.Signal(str)
+
     def __init__(self) -> None:
         """Initilize main componant of the dialog."""
         super().__init__()
@@ -56,6 +72,250 @@ class PreferencesDialog(QtWidgets.QDialog):
         self.__model_directory.setToolTip(_("Click to open directory"))
         model_directory_layout.addWidget(self.__model_directory)
 
+        # Where you can verify or download the checkpoint of a model.
+        checkpoint_layout = QtWidgets.QHBoxLayout()
+        main_layout.addLayout(checkpoint_layout)
+
+        self.__cobx_checkpoint_model = QtWidgets.QComboBox()
+        self.__cobx_checkpoint_model.addItems(MODELS)
+        checkpoint_layout.addWidget(self.__cobx_checkpoint_model)
+        self.__cobx_checkpoint_model.currentTextChanged.connect(
+            self.__update_checkpoint_status
+        )
+
+        self.__checkpoint_status = QtWidgets.QLabel()
+        checkpoint_layout.addWidget(self.__checkpoint_status)
+        self.update_checkpoint_status.connect(self.__checkpoint_status.setText)
+        self.checkpoint_task_finished.connect(self.__listener_checkpoint_task_finished)
+
+        self.__b_verify_checkpoint = QtWidgets.QPushButton(_("Verify Now"))
+        self.__b_verify_checkpoint.setToolTip(
+            _("Check the model file again, even if it was already verified")
+        )
+        checkpoint_layout.addWidget(self.__b_verify_checkpoint)
+        self.__b_verify_checkpoint.clicked.connect(self.__listener_verifying_checkpoint)
+
+        self.__b_download_checkpoint = QtWidgets.QPushButton(_("Download"))
+        checkpoint_layout.addWidget(self.__b_download_checkpoint)
+        self.__b_download_checkpoint.clicked.connect(
+            self.__listener_downloading_checkpoint
+        )
+
+        self.__update_checkpoint_status()
+
+        main_layout.addWidget(
+            QtWidgets.QLabel(_("<h2>Performance</h2>")),
+            alignment=QtCore.Qt.AlignmentFlag.AlignCenter
+            | QtCore.Qt.AlignmentFlag.AlignTop,
+        )
+
+        # Where you can limit how many files are transcribed at the same time.
+        max_workers_layout = QtWidgets.QHBoxLayout()
+        main_layout.addLayout(max_workers_layout)
+
+        max_workers_layout.addWidget(QtWidgets.QLabel(_("Parallel Jobs")))
+
+        self.__sp_max_workers = QtWidgets.QSpinBox()
+        self.__sp_max_workers.setMaximum(usable_cpu_count())
+        self.__sp_max_workers.setSpecialValueText(
+            _("Automatic ({})").format(default_max_workers())
+        )
+        self.__sp_max_workers.setValue(
+            int(self.__config.get_option("preferences", "max_workers") or 0)
+        )
+        self.__sp_max_workers.setToolTip(
+            _("How many files to transcribe at once, each one uses its own model")
+        )
+        max_workers_layout.addWidget(self.__sp_max_workers)
+        self.__sp_max_workers.valueChanged.connect(
+            lambda value: self.__config.set_option(
+                "preferences", "max_workers", str(value)
+            )
+        )
+
+        # Where you can keep every parallel job on its own CPU cores.
+        self.__cbx_pin_workers = QtWidgets.QCheckBox(_("Pin Jobs to CPU Cores"))
+        self.__cbx_pin_workers.setToolTip(
+            _(
+                "Every parallel job runs only on its own share of the CPU cores, "
+                "in the same NUMA node when possible"
+            )
+        )
+        self.__cbx_pin_workers.setChecked(
+            bool(int(self.__config.get_option("preferences", "pin_workers") or 0))
+        )
+        main_layout.addWidget(self.__cbx_pin_workers)
+        self.__cbx_pin_workers.toggled.connect(
+            lambda checked: self.__config.set_option(
+                "preferences", "pin_workers", str(int(checked))
+            )
+        )
+
+        # Where you can set how many CPU jobs a worker transcribes together.
+        batch_size_layout = QtWidgets.QHBoxLayout()
+        main_layout.addLayout(batch_size_layout)
+
+        batch_size_layout.addWidget(QtWidgets.QLabel(_("CPU Batch Size")))
+
+        self.__sp_batch_size = QtWidgets.QSpinBox()
+        self.__sp_batch_size.setRange(1, 64)
+        self.__sp_batch_size.setValue(
+            int(
+                self.__config.get_option("preferences", "batch_size")
+                or DEFAULT_BATCH_SIZE
+            )
+        )
+        self.__sp_batch_size.setToolTip(
+            _("How many files a job on the CPU transcribes together with one model")
+        )
+        batch_size_layout.addWidget(self.__sp_batch_size)
+        self.__sp_batch_size.valueChanged.connect(
+            lambda value: self.__config.set_option(
+                "preferences", "batch_size", str(value)
+            )
+        )
+
+        # Where you can set which queued files start first.
+        job_order_layout = QtWidgets.QHBoxLayout()
+        main_layout.addLayout(job_order_layout)
+
+        job_order_layout.addWidget(QtWidgets.QLabel(_("Job Order")))
+
+        self.__cobx_job_order = QtWidgets.QComboBox()
+        # In the order of `JOB_ORDERS`.
+        self.__cobx_job_order.addItems(
+            (_("As Added"), _("Longest First"), _("Shortest First"))
+        )
+        self.__cobx_job_order.setCurrentIndex(
+            JOB_ORDERS.index(
+                self.__config.get_option("preferences", "job_order") or "queued"
+            )
+        )
+        self.__cobx_job_order.setToolTip(
+            _(
+                "Longest first finishes all the files sooner, and shortest first "
+                "gives the first results sooner"
+            )
+        )
+        job_order_layout.addWidget(self.__cobx_job_order)
+        self.__cobx_job_order.currentIndexChanged.connect(
+            lambda index: self.__config.set_option(
+                "preferences", "job_order", JOB_ORDERS[index]
+            )
+        )
+
+        # Where you can make the workers share the weights of CPU models.
+        self.__cbx_map_weights = QtWidgets.QCheckBox(_("Share Model Weights"))
+        self.__cbx_map_weights.setToolTip(
+            _(
+                "Parallel jobs on the CPU use one copy of the model in memory, "
+                "which is converted once and stored in the cache"
+            )
+        )
+        self.__cbx_map_weights.setChecked(
+            bool(int(self.__config.get_option("preferences", "map_weights") or 0))
+        )
+        main_layout.addWidget(self.__cbx_map_weights)
+        self.__cbx_map_weights.toggled.connect(
+            lambda checked: self.__config.set_option(
+                "preferences", "map_weights", str(int(checked))
+            )
+        )
+
+        # Where you can see where the time of a run goes.
+        self.__cbx_trace = QtWidgets.QCheckBox(_("Time Stages"))
+        self.__cbx_trace.setToolTip(
+            _(
+                "Show how long every stage of the transcription took after a run, "
+                "and export it as a trace"
+            )
+        )
+        self.__cbx_trace.setChecked(
+            bool(int(self.__config.get_option("preferences", "trace") or 0))
+        )
+        main_layout.addWidget(self.__cbx_trace)
+        self.__cbx_trace.toggled.connect(
+            lambda checked: self.__config.set_option(
+                "preferences", "trace", str(int(checked))
+            )
+        )
+
+        # Where you can skip files that are copies of queued files.
+        self.__cbx_skip_identical = QtWidgets.QCheckBox(_("Skip Identical Files"))
+        self.__cbx_skip_identical.setToolTip(
+            _(
+                "Don't add files with the same content as a file in the list, "
+                "comparing the start and the end of files of the same size"
+            )
+        )
+        self.__cbx_skip_identical.setChecked(
+            bool(
+                int(
+                    self.__config.get_option("preferences", "skip_identical_files") or 0
+                )
+            )
+        )
+        main_layout.addWidget(self.__cbx_skip_identical)
+        self.__cbx_skip_identical.toggled.connect(
+            lambda checked: self.__config.set_option(
+                "preferences", "skip_identical_files", str(int(checked))
+            )
+        )
+
+        # Where you can run the transcriptions in the service, with its loaded models.
+        self.__cbx_use_service = QtWidgets.QCheckBox(_("Use Local Service"))
+        self.__cbx_use_service.setToolTip(
+            _(
+                "Transcribe in the service started with `whisper-qt serve` when it's "
+                "running, which keeps the models loaded between the runs"
+            )
+        )
+        self.__cbx_use_service.setChecked(
+            bool(int(self.__config.get_option("preferences", "use_service") or 0))
+        )
+        main_layout.addWidget(self.__cbx_use_service)
+        self.__cbx_use_service.toggled.connect(
+            lambda checked: self.__config.set_option(
+                "preferences", "use_service", str(int(checked))
+            )
+        )
+
+        # Where you can limit or purge the cache of transcription results.
+        result_cache_layout = QtWidgets.QHBoxLayout()
+        main_layout.addLayout(result_cache_layout)
+
+        result_cache_layout.addWidget(QtWidgets.QLabel(_("Result Cache Size")))
+
+        self.__sp_result_cache_size = QtWidgets.QSpinBox()
+        self.__sp_result_cache_size.setMaximum(100 * 1024)
+        self.__sp_result_cache_size.setSuffix(_(" MB"))
+        self.__sp_result_cache_size.setSpecialValueText(_("Disabled"))
+        self.__sp_result_cache_size.setValue(
+            int(
+                self.__config.get_option("preferences", "result_cache_size")
+                or DEFAULT_MAX_SIZE // 1024**2
+            )
+        )
+        self.__sp_result_cache_size.setToolTip(
+            _("Reuse the results of files that were transcribed with the same options")
+        )
+        result_cache_layout.addWidget(self.__sp_result_cache_size)
+        self.__sp_result_cache_size.valueChanged.connect(
+            lambda value: self.__config.set_option(
+                "preferences", "result_cache_size", str(value)
+            )
+        )
+
+        self.__result_cache_usage = QtWidgets.QLabel()
+        result_cache_layout.addWidget(self.__result_cache_usage)
+        self.__update_result_cache_usage()
+
+        self.__b_purge_result_cache = QtWidgets.QPushButton(_("Purge"))
+        result_cache_layout.addWidget(self.__b_purge_result_cache)
+        self.__b_purge_result_cache.clicked.connect(
+            self.__listener_purging_result_cache
+        )
+
         main_layout.addStretch()
 
         # Dialog footer
@@ -86,6 +346,93 @@ class PreferencesDialog(QtWidgets.QDialog):
             self.__config.set_option(
                 "preferences", "model_directory", selected_directory
             )
+            self.__update_checkpoint_status()
+
+    def __checkpoint_index(self) -> CheckpointIndex:
+        """Index of the verified checkpoints in the selected model directory."""
+        return CheckpointIndex(self.__model_directory.text())
+
+    def __update_checkpoint_status(self) -> None:
+        """Display whether the selected model is downloaded and verified."""
+        model = self.__cobx_checkpoint_model.currentText()
+        checkpoint_index = self.__checkpoint_index()
+
+        if not checkpoint_index.is_downloaded(model):
+            self.__checkpoint_status.setText(_("Not downloaded"))
+        elif checkpoint_index.is_verified(model):
+            self.__checkpoint_status.setText(_("Verified"))
+        else:
+            self.__checkpoint_status.setText(_("Not verified"))
+
+    def __run_checkpoint_task(self, task: Callable[[], str]) -> None:
+        """Run a slow task in a thread, then display the status that it returns."""
+        self.__b_verify_checkpoint.setEnabled(False)
+        self.__b_download_checkpoint.setEnabled(False)
+        self.__cobx_checkpoint_model.setEnabled(False)
+
+        def thread_run() -> None:
+            try:
+                status = task()
+            except (CheckpointError, OSError) as error:
+                status = str(error)
+
+            self.checkpoint_task_finished.emit(status)
+
+        threading.Thread(target=thread_run, daemon=True).start()
+
+    def __listener_checkpoint_task_finished(self, status: str) -> None:
+        """Display the result of a verification or download, and allow another."""
+        self.__checkpoint_status.setText(status)
+        self.__b_verify_checkpoint.setEnabled(True)
+        self.__b_download_checkpoint.setEnabled(True)
+        self.__cobx_checkpoint_model.setEnabled(True)
+
+    def __listener_verifying_checkpoint(self) -> None:
+        """Hash the selected model's checkpoint again."""
+        model = self.__cobx_checkpoint_model.currentText()
+        checkpoint_index = self.__checkpoint_index()
+        self.__checkpoint_status.setText(_("Verifying..."))
+
+        def verify() -> str:
+            if not checkpoint_index.is_downloaded(model):
+                return _("Not downloaded")
+            if checkpoint_index.verify(model):
+                return _("Verified")
+            return _("Corrupted, download it again")
+
+        self.__run_checkpoint_task(verify)
+
+    def __listener_downloading_checkpoint(self) -> None:
+        """Download the selected model's checkpoint."""
+        model = self.__cobx_checkpoint_model.currentText()
+        checkpoint_index = self.__checkpoint_index()
+        self.__checkpoint_status.setText(_("Downloading..."))
+
+        def on_progress(done: int, total: int) -> None:
+            if total:
+                self.update_checkpoint_status.emit(
+                    _("Downloading... {}%").format(done * 100 // total)
+                )
+
+        def download() -> str:
+            checkpoint_index.download(model, on_progress)
+            return _("Verified")
+
+        self.__run_checkpoint_task(download)
+
+    def __update_result_cache_usage(self) -> None:
+        """Display how much the result cache is currently using."""
+        result_cache = ResultCache()
+        self.__result_cache_usage.setText(
+            _("{} results, {:.1f} MB").format(
+                len(result_cache), result_cache.size() / 1024**2
+            )
+        )
+
+    def __listener_purging_result_cache(self) -> None:
+        """Remove all the cached transcription results."""
+        ResultCache().purge()
+        self.__update_result_cache_usage()
 
     def __listener_apply_changes(self) -> None:
         """Save proferences to config file."""
@@ -0,0 +1,78 @@
+"""Dialog that shows where the time of a run went."""
+import json
+from gettext import gettext as _
+from typing import Sequence
+
+from PySide6 import QtWidgets
+
+from ..jobs import TranscriptionJob
+from ..tracing import chrome_trace
+from ..tracing import stage_times
+
+# Display names of the traced stages.
+STAGE_NAMES = {
+    "decode_audio": "Audio Decoding",
+    "skip_silence": "Silence Detection",
+    "load_model": "Model Loading",
+    "detect_language": "Language Detection",
+    "mel": "Mel Spectrogram",
+    "encoder": "Encoder",
+    "decoder": "Decoder",
+    "write_output": "Output Writing",
+}
+
+
+class StageTimingsDialog(QtWidgets.QDialog):
+    """Time of every stage summed over the files of a run, and the trace export."""
+
+    def __init__(self, jobs: Sequence[TranscriptionJob]) -> None:
+        """Initialize main components of the dialog."""
+        super().__init__()
+
+        self.setWindowTitle(_("Stage Timings"))
+
+        self.__jobs = jobs
+
+        main_layout = QtWidgets.QVBoxLayout()
+        self.setLayout(main_layout)
+
+        times = stage_times(span for job in jobs for span in job.spans)
+        total = sum(times.values()) or 1
+
+        table = QtWidgets.QTableWidget(len(times), 3)
+        table.setHorizontalHeaderLabels((_("Stage"), _("Seconds"), _("Share")))
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().hide()
+        for row, (stage, seconds) in enumerate(times.items()):
+            table.setItem(
+                row, 0, QtWidgets.QTableWidgetItem(_(STAGE_NAMES.get(stage, stage)))
+            )
+            table.setItem(row, 1, QtWidgets.QTableWidgetItem(f"{seconds:.2f}"))
+            table.setItem(row, 2, QtWidgets.QTableWidgetItem(f"{seconds / total:.0%}"))
+        table.resizeColumnsToContents()
+        main_layout.addWidget(table)
+
+        main_layout.addWidget(
+            QtWidgets.QLabel(_("Summed over {} files.").format(len(jobs)))
+        )
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        main_layout.addWidget(buttons)
+        buttons.rejected.connect(self.reject)
+
+        export_button = buttons.addButton(
+            _("Export Trace"), QtWidgets.QDialogButtonBox.ActionRole
+        )
+        export_button.setToolTip(_("Save the stages of every file for Perfetto"))
+        export_button.clicked.connect(self.__listener_exporting_trace)
+
+    def __listener_exporting_trace(self) -> None:
+        """Save the stages as a Chrome trace to the selected file."""
+        path, _selected_filter = QtWidgets.QFileDialog.getSaveFileName(
+            self, caption=_("Export Trace"), dir="trace.json", filter="JSON (*.json)"
+        )
+        if not path:
+            return
+
+        with open(path, "w") as file:
+            json.dump(chrome_trace(self.__jobs), file)
@@ -0,0 +1,391 @@
+"""
+Store the transcription jobs on disk with their states, so they survive restarts.
+
+Failed jobs are retried a few times, with a longer wait before every attempt, and
+finished jobs are kept to report the throughput of past runs.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Optional
+
+from .default_files import xdg_data_dir
+from .jobs import TranscriptionJob
+
+# States of a stored job.
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+# Default number of times a job is run before it fails for good.
+DEFAULT_MAX_ATTEMPTS = 3
+# Seconds to wait before the first retry of a failed job, doubled for every next one.
+RETRY_BACKOFF = 30.0
+# Longest wait before a retry in seconds.
+MAX_RETRY_BACKOFF = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    -- Which interface added the job, like "gui" or "batch".
+    source TEXT NOT NULL,
+    file TEXT NOT NULL,
+    model TEXT NOT NULL,
+    device TEXT NOT NULL,
+    -- JSON of the other settings of the job.
+    settings TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    -- When a failed job is retried, NULL when it's not.
+    retry_at REAL,
+    error TEXT,
+    -- Duration of the audio in seconds, once it was decoded.
+    audio_seconds REAL,
+    -- Process that runs the job or will run it, NULL when none does.
+    pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, retry_at);
+"""
+
+
+def process_exists(pid: int) -> bool:
+    """Whether a process with the given id is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # It's a process of another user.
+        return True
+
+    return True
+
+
+def job_settings(job: TranscriptionJob) -> str:
+    """JSON of the settings of a job other than its file, model and device."""
+    return json.dumps(
+        {
+            "output_directory": job.output_directory,
+            "audio_language": job.audio_language,
+            "options": job.options,
+            "vad_aggressiveness": job.vad_aggressiveness,
+            "parallel_chunks": job.parallel_chunks,
+            "precision": job.precision,
+            "output_formats": job.output_formats,
+        }
+    )
+
+
+class JobStore:
+    """
+    SQLite database of transcription jobs, shared by the GUI and the batch modes.
+
+    A job is "queued" until it starts "running", then it's "done" or "failed", or
+    "cancelled" when it was stopped. A failed job with attempts left has a `retry_at`
+    time. It's safe to use from several threads and processes.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_backoff: float = RETRY_BACKOFF,
+    ) -> None:
+        """Open the database, creating it when it doesn't exist."""
+        self.path = path or xdg_data_dir() / "jobs.sqlite3"
+        self.max_attempts = max_attempts
+        # Seconds before the first retry, doubled for every next one.
+        self.retry_backoff = retry_backoff
+
+        Path.mkdir(self.path.parent, parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        self.__connection.row_factory = sqlite3.Row
+        self.__lock = threading.Lock()
+
+        with self.__lock, self.__connection:
+            # Readers don't block the writer, and a commit doesn't wait for fsync.
+            self.__connection.execute("PRAGMA journal_mode = WAL")
+            self.__connection.execute("PRAGMA synchronous = NORMAL")
+            self.__connection.executescript(SCHEMA)
+
+    def __execute(self, sql: str, parameters: Iterable[Any] = ()) -> sqlite3.Cursor:
+        """Run a statement in its own transaction."""
+        with self.__lock, self.__connection:
+            return self.__connection.execute(sql, tuple(parameters))
+
+    def add(self, jobs: Iterable[TranscriptionJob], source: str) -> None:
+        """
+        Queue jobs for this process in a single transaction, and set their `store_id`.
+
+        The `source` is the interface that adds them, which claims them again.
+        A job that already has a `store_id` is queued again with its new settings.
+        """
+        now = time.time()
+        pid = os.getpid()
+
+        with self.__lock, self.__connection:
+            for job in jobs:
+                if job.store_id is None:
+                    job.store_id = self.__connection.execute(
+                        "INSERT INTO jobs (source, file, model, device, settings, "
+                        "state, created_at, pid) "
+                        "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                        (
+                            source,
+                            job.audio_file_path,
+                            job.model,
+                            job.device,
+                            job_settings(job),
+                            now,
+                            pid,
+                        ),
+                    ).lastrowid
+                else:
+                    self.__connection.execute(
+                        "UPDATE jobs SET model = ?, device = ?, settings = ?, "
+                        "state = 'queued', retry_at = NULL, pid = ? WHERE id = ?",
+                        (
+                            job.model,
+                            job.device,
+                            job_settings(job),
+                            pid,
+                            job.store_id,
+                        ),
+                    )
+
+    @staticmethod
+    def __job(row: sqlite3.Row) -> TranscriptionJob:
+        """Create the job of a row."""
+        settings = json.loads(row["settings"])
+
+        job = TranscriptionJob(
+            row["file"],
+            settings["output_directory"],
+            row["model"],
+            row["device"],
+            settings["audio_language"],
+            settings["options"],
+            settings["vad_aggressiveness"],
+            settings["parallel_chunks"],
+            settings["precision"],
+            settings["output_formats"],
+        )
+        job.store_id = row["id"]
+
+        return job
+
+    def recover(self) -> int:
+        """
+        Release the jobs of processes that stopped, like when they crashed.
+
+        Their running jobs are queued again. Return how many jobs were released.
+        """
+        rows = self.__execute(
+            "SELECT id, pid FROM jobs WHERE pid IS NOT NULL "
+            "AND state IN ('queued', 'running', 'failed')"
+        ).fetchall()
+        stopped = [(row["id"],) for row in rows if not process_exists(row["pid"])]
+
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "UPDATE jobs SET state = CASE state WHEN 'running' THEN 'queued' "
+                "ELSE state END, pid = NULL WHERE id = ?",
+                stopped,
+            )
+
+        return len(stopped)
+
+    def claim_unfinished(self, source: str) -> list[TranscriptionJob]:
+        """
+        Take the jobs of a source that are queued, cancelled or retried, and not run.
+
+        They are in the order they were added.
+        """
+        with self.__lock, self.__connection:
+            rows = self.__connection.execute(
+                "SELECT * FROM jobs WHERE source = ? AND pid IS NULL "
+                "AND (state IN ('queued', 'cancelled') "
+                "OR (state = 'failed' AND retry_at IS NOT NULL)) ORDER BY id",
+                (source,),
+            ).fetchall()
+            self.__connection.executemany(
+                "UPDATE jobs SET pid = ? WHERE id = ?",
+                ((os.getpid(), row["id"]) for row in rows),
+            )
+
+        return [self.__job(row) for row in rows]
+
+    def started(self, job: TranscriptionJob) -> None:
+        """Record that a job started running in this process."""
+        self.__execute(
+            "UPDATE jobs SET state = 'running', attempts = attempts + 1, "
+            "started_at = ?, finished_at = NULL, retry_at = NULL, pid = ? "
+            "WHERE id = ?",
+            (time.time(), os.getpid(), job.store_id),
+        )
+
+    def decoded(self, job: TranscriptionJob, audio_seconds: float) -> None:
+        """Record the duration of a job's audio."""
+        self.__execute(
+            "UPDATE jobs SET audio_seconds = ? WHERE id = ?",
+            (audio_seconds, job.store_id),
+        )
+
+    def finished(self, job: TranscriptionJob, success: bool) -> Optional[float]:
+        """
+        Record that a job is done or failed with its `error`.
+
+        Return when a failed job is retried, or `None` when it's not.
+        """
+        now = time.time()
+
+        if success:
+            self.__execute(
+                "UPDATE jobs SET state = 'done', finished_at = ?, error = NULL, "
+                "pid = NULL WHERE id = ?",
+                (now, job.store_id),
+            )
+            return None
+
+        with self.__lock, self.__connection:
+            attempts = self.__connection.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job.store_id,)
+            ).fetchone()["attempts"]
+
+            retry_at = None
+            if attempts < self.max_attempts:
+                retry_at = now + min(
+                    MAX_RETRY_BACKOFF, self.retry_backoff * 2 ** (attempts - 1)
+                )
+
+            # This process keeps the jobs that it retries.
+            self.__connection.execute(
+                "UPDATE jobs SET state = 'failed', finished_at = ?, retry_at = ?, "
+                "error = ?, pid = CASE WHEN ? IS NULL THEN NULL ELSE pid END "
+                "WHERE id = ?",
+                (now, retry_at, job.error, retry_at, job.store_id),
+            )
+
+        return retry_at
+
+    def cancel(self, store_ids: Iterable[int]) -> None:
+        """Record that jobs were stopped, unless they already finished for good."""
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "UPDATE jobs SET state = 'cancelled', retry_at = NULL, pid = NULL "
+                "WHERE id = ? AND (state IN ('queued', 'running') "
+                "OR (state = 'failed' AND retry_at IS NOT NULL))",
+                ((store_id,) for store_id in store_ids),
+            )
+
+    def remove(self, store_ids: Iterable[int]) -> None:
+        """Forget jobs that were not run, like when they are removed from the queue."""
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "DELETE FROM jobs WHERE id = ? AND state != 'running'",
+                ((store_id,) for store_id in store_ids),
+            )
+
+    def next_retry(self, store_ids: Iterable[int]) -> Optional[float]:
+        """When the first of the given jobs is retried, `None` if none of them is."""
+        retry_times = [
+            row["retry_at"]
+            for row in self.__rows(store_ids)
+            if row["state"] == "failed" and row["retry_at"] is not None
+        ]
+
+        return min(retry_times, default=None)
+
+    def due_retries(self, store_ids: Iterable[int]) -> list[TranscriptionJob]:
+        """Get the given jobs that failed and should be retried by now."""
+        now = time.time()
+
+        return [
+            self.__job(row)
+            for row in self.__rows(store_ids)
+            if row["state"] == "failed"
+            and row["retry_at"] is not None
+            and row["retry_at"] <= now
+        ]
+
+    def __rows(self, store_ids: Iterable[int]) -> list[sqlite3.Row]:
+        """Rows of the given jobs."""
+        with self.__lock:
+            self.__connection.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS selected (id INTEGER PRIMARY KEY)"
+            )
+            with self.__connection:
+                self.__connection.execute("DELETE FROM selected")
+                self.__connection.executemany(
+                    "INSERT OR IGNORE INTO selected VALUES (?)",
+                    ((store_id,) for store_id in store_ids),
+                )
+
+            return self.__connection.execute(
+                "SELECT jobs.* FROM jobs JOIN selected USING (id) ORDER BY id"
+            ).fetchall()
+
+    def counts(self) -> dict[str, int]:
+        """Count the jobs in every state."""
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for row in self.__execute(
+            "SELECT state, COUNT(*) AS jobs FROM jobs GROUP BY state"
+        ):
+            counts[row["state"]] = row["jobs"]
+
+        return counts
+
+    def failures(self, limit: int = 100) -> list[dict[str, Any]]:
+        """Get the last jobs that failed for good, with their errors."""
+        rows = self.__execute(
+            "SELECT file, attempts, finished_at, error FROM jobs "
+            "WHERE state = 'failed' AND retry_at IS NULL "
+            "ORDER BY finished_at DESC LIMIT ?",
+            (limit,),
+        )
+
+        return [dict(row) for row in rows]
+
+    def throughput(self, since: float = 0) -> list[dict[str, Any]]:
+        """
+        Files, audio and transcription time of the jobs done since a time, by model.
+
+        The real-time factor is the transcription time divided by the audio duration.
+        """
+        rows = self.__execute(
+            "SELECT model, device, COUNT(*) AS files, "
+            "SUM(audio_seconds) AS audio_seconds, "
+            "SUM(finished_at - started_at) AS seconds, "
+            # Of the jobs whose audio duration is known.
+            "SUM(CASE WHEN audio_seconds IS NOT NULL "
+            "THEN finished_at - started_at END) AS timed_seconds FROM jobs "
+            "WHERE state = 'done' AND finished_at >= ? GROUP BY model, device "
+            "ORDER BY files DESC",
+            (since,),
+        )
+
+        throughput = []
+        for row in rows:
+            report = dict(row)
+            timed_seconds = report.pop("timed_seconds")
+            report["real_time_factor"] = (
+                timed_seconds / report["audio_seconds"]
+                if report["audio_seconds"]
+                else None
+            )
+            throughput.append(report)
+
+        return throughput
+
+    def close(self) -> None:
+        """Close the database."""
+        with self.__lock:
+            self.__connection.close()
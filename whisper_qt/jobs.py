@@ -0,0 +1,164 @@
+"""Description of the transcription work to be done."""
+import itertools
+from typing import Any
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .tracing import Span
+
+# Jobs of the same (model, device, precision) can use the same loaded model.
+JobGroup = tuple[str, str, str]
+
+# Precisions of the model weights on the CPU.
+PRECISIONS = ("fp32", "int8")
+
+
+class SharedAudio(NamedTuple):
+    """16 kHz mono float32 PCM audio in a `multiprocessing.shared_memory` block."""
+
+    name: str
+    samples: int
+
+
+class TranscriptionJob:
+    """All the information needed to transcribe a single file."""
+
+    # To give every job a unique id in the current process.
+    __ids = itertools.count()
+
+    def __init__(
+        self,
+        audio_file_path: str,
+        output_directory: str,
+        model: str,
+        device: str,
+        audio_language: str,
+        options: dict,
+        vad_aggressiveness: int = 0,
+        parallel_chunks: bool = False,
+        precision: str = "fp32",
+        output_formats: Sequence[str] = ("srt",),
+    ) -> None:
+        """
+        Store the job information.
+
+        `options` are passed to whisper's `transcribe`, and `vad_aggressiveness` from 1
+        to 3 skips the silence before transcribing, where 0 doesn't skip it.
+        With `parallel_chunks` a long file is split to chunks that are transcribed by
+        several workers at the same time, without the context between the chunks.
+        A `precision` of "int8" quantizes the linear layers of a model on the CPU.
+        The result is written in every one of the `output_formats`.
+        """
+        self.job_id = next(self.__ids)
+        self.audio_file_path = audio_file_path
+        self.output_directory = output_directory
+        self.model = model
+        self.device = device
+        self.audio_language = audio_language
+        self.options = options
+        self.vad_aggressiveness = vad_aggressiveness
+        self.parallel_chunks = parallel_chunks
+        self.precision = precision
+        self.output_formats = tuple(output_formats)
+
+        # (start, end) seconds of the audio when the job is only a chunk of a file.
+        self.chunk: Optional[tuple[float, float]] = None
+
+        # Why the job failed, if it did.
+        self.error: Optional[str] = None
+        # Possible problems with the result, like a wrong language.
+        self.warnings: list[str] = []
+
+        # (language code, probability) that the worker detected for the audio.
+        self.detected_language: Optional[tuple[str, float]] = None
+        # Language of the whole batch for an `Auto` job, so it's not detected again.
+        self.locked_language: Optional[str] = None
+
+        # Decoded audio in shared memory, when it was decoded before the job started.
+        self.audio: Optional[SharedAudio] = None
+
+        # Stages of the job in the workers, when they are traced.
+        self.spans: list["Span"] = []
+
+        # Id of the job in the job store, when it's stored.
+        self.store_id: Optional[int] = None
+
+        # Seconds of the audio, when the file was probed before the job started.
+        self.duration: Optional[float] = None
+
+        # Key of the result in the result cache, once it was computed from the audio.
+        self.result_key: Optional[str] = None
+
+    @property
+    def decoding_options(self) -> dict:
+        """All the options that change how the audio is decoded to text."""
+        options = dict(self.options)
+        if self.vad_aggressiveness:
+            options["vad_aggressiveness"] = self.vad_aggressiveness
+        if self.precision != "fp32":
+            options["precision"] = self.precision
+
+        return options
+
+    @property
+    def cache_options(self) -> dict:
+        """All the options that change the result of the job."""
+        options = self.decoding_options
+        if self.locked_language:
+            options["locked_language"] = self.locked_language
+
+        return options
+
+    @property
+    def group(self) -> JobGroup:
+        """Jobs in the same group can use the same loaded model."""
+        return (self.model, self.device, self.precision)
+
+    def split(self, chunks: list[tuple[float, float]]) -> list["TranscriptionJob"]:
+        """Create a job for every (start, end) chunk of this job's audio."""
+        jobs = []
+
+        for chunk in chunks:
+            job = TranscriptionJob(
+                self.audio_file_path,
+                self.output_directory,
+                self.model,
+                self.device,
+                self.audio_language,
+                self.options,
+                self.vad_aggressiveness,
+                precision=self.precision,
+                output_formats=self.output_formats,
+            )
+            job.chunk = chunk
+            jobs.append(job)
+
+        return jobs
+
+
+class WorkerEvent(NamedTuple):
+    """A message sent from a worker process to the main process."""
+
+    # Index of the worker that sent the event.
+    worker: int
+    # One of "started", "model_loaded", "decoded", "language", "warning", "segment",
+    # "text", "trace", "transcribed", "finished" or "failed".
+    kind: str
+    job_id: int
+    # Extra data depending on the kind:
+    # "model_loaded": (model, whether its weights are mapped, seconds it took, resident
+    # and proportional memory of the worker in bytes).
+    # "decoded": duration of the audio in seconds.
+    # "language": (language code, probability) detected from the first speech.
+    # "warning": a message about a possible problem with the result.
+    # "segment": (segment number, end of the segment in seconds, audio duration).
+    # "text": (start, end, text) of the new segments of a whole file.
+    # "trace": spans of the job's stages, sent before it finishes when tracing.
+    # "transcribed": the outputs of a whole file are being written, and the worker
+    # can already run other jobs.
+    # "finished": (segments, language) for a chunk of a file, else `None`.
+    # "failed": the error message.
+    data: Any = None
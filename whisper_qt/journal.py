@@ -0,0 +1,107 @@
+"""Journal of transcribed segments, to resume a job after it was interrupted."""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+from typing import NamedTuple
+from typing import Optional
+
+from .default_files import xdg_cache_dir
+
+
+class JournalState(NamedTuple):
+    """What was committed to a journal before the job was interrupted."""
+
+    segments: list[dict[str, Any]]
+    # Seconds of the audio that were transcribed.
+    end: float
+    # Language that was detected or selected for the audio.
+    language: Optional[str]
+
+
+class SegmentJournal:
+    """
+    Append only file of segments, where every line is a committed part of the audio.
+
+    A line that was not completely written, e.g. when the process was killed, is
+    ignored with everything after it.
+    """
+
+    @staticmethod
+    def key(audio_file_path: str, model: str, language: str, options: dict) -> str:
+        """
+        Get a key that changes when the file or anything affecting the result does.
+
+        The file is identified by its resolved path, size and modification time, so
+        its content is not read.
+        """
+        stat = os.stat(audio_file_path)
+        description = json.dumps(
+            {
+                "path": os.path.realpath(audio_file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "model": model,
+                "language": language,
+                "options": options,
+            },
+            sort_keys=True,
+        )
+
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def __init__(self, key: str, directory: Optional[Path] = None) -> None:
+        """Initialize the journal of a job, `key` identifies the audio and options."""
+        self.path = (directory or xdg_cache_dir() / "journals") / (key + ".jsonl")
+
+    def read(self) -> JournalState:
+        """
+        Read what was committed, or an empty state if nothing was.
+
+        An incomplete line at the end is removed, so the next commits can be read.
+        """
+        segments: list[dict[str, Any]] = []
+        end = 0.0
+        language = None
+        committed_size = 0
+
+        try:
+            with open(self.path, "rb") as file:
+                for line in file:
+                    try:
+                        commit = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+
+                    segments.extend(commit["segments"])
+                    end = commit["end"]
+                    language = commit["language"]
+                    committed_size += len(line)
+
+            os.truncate(self.path, committed_size)
+        except FileNotFoundError:
+            pass
+
+        return JournalState(segments, end, language)
+
+    def append(
+        self, segments: list[dict[str, Any]], end: float, language: Optional[str]
+    ) -> None:
+        """Commit the segments that were transcribed until `end` seconds."""
+        Path.mkdir(self.path.parent, parents=True, exist_ok=True)
+
+        line = json.dumps({"segments": segments, "end": end, "language": language})
+        with open(self.path, "a") as file:
+            file.write(line + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def remove(self) -> None:
+        """Remove the journal after the job was finished."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,63 @@
+"""Map the weights of a model from a file, so the workers share them in memory."""
+import dataclasses
+import inspect
+import os
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+from typing import Optional
+
+import torch
+
+from .default_files import xdg_cache_dir
+
+
+def mapping_supported() -> bool:
+    """Whether torch can load a checkpoint by mapping its file, since torch 2.1."""
+    return "mmap" in inspect.signature(torch.load).parameters
+
+
+def mapped_checkpoint_path(digest: str, directory: Optional[Path] = None) -> Path:
+    """Path of the converted checkpoint, named by the original one's digest."""
+    return (directory or xdg_cache_dir() / "mapped") / (digest + ".pt")
+
+
+def convert(model: Any, path: Path) -> None:
+    """
+    Save a loaded model in the layout that it's used in, so it can be mapped.
+
+    Whisper's checkpoints are in float16, but the CPU runs the model in float32, so
+    they can't be used without copying them.
+    """
+    Path.mkdir(path.parent, parents=True, exist_ok=True)
+
+    temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    torch.save(
+        {
+            "dims": dataclasses.asdict(model.dims),
+            "model_state_dict": model.state_dict(),
+        },
+        temporary_path,
+    )
+    os.replace(temporary_path, path)
+
+
+def load_mapped(whisper: ModuleType, checkpoint_path: Path, digest: str) -> Any:
+    """
+    Load a model on the CPU with its weights mapped read only from the cache.
+
+    The pages of the file are in the page cache once for all the workers, instead of
+    a private copy in every worker. The checkpoint is converted the first time.
+    """
+    path = mapped_checkpoint_path(digest)
+
+    if not path.is_file():
+        convert(whisper.load_model(str(checkpoint_path), "cpu"), path)
+
+    checkpoint = torch.load(path, map_location="cpu", mmap=True)
+
+    model = whisper.model.Whisper(whisper.model.ModelDimensions(**checkpoint["dims"]))
+    # Use the mapped tensors instead of copying them to the model's own.
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+
+    return model
@@ -0,0 +1,242 @@
+"""Information about media files, without decoding them."""
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from typing import Iterable
+from typing import NamedTuple
+from typing import Optional
+
+from .default_files import xdg_cache_dir
+
+# Extensions of the media files that are transcribed from watched directories.
+MEDIA_EXTENSIONS = frozenset(
+    (
+        ".aac",
+        ".flac",
+        ".m4a",
+        ".mkv",
+        ".mov",
+        ".mp3",
+        ".mp4",
+        ".ogg",
+        ".opus",
+        ".wav",
+        ".webm",
+        ".wma",
+    )
+)
+
+# Number of ffprobe processes at the same time, which mostly wait for the disk.
+PROBE_THREADS = 8
+
+
+def probe_duration(audio_file_path: str) -> float:
+    """Duration of a media file in seconds, using ffprobe."""
+    output = subprocess.run(
+        (
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            audio_file_path,
+        ),
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+
+    return float(output.strip())
+
+
+class MediaInfo(NamedTuple):
+    """What ffprobe found in a media file."""
+
+    # Seconds, or `None` for a stream without a known duration.
+    duration: Optional[float]
+    audio_streams: int
+    video_streams: int
+    # Codec of the first audio stream.
+    codec: Optional[str]
+
+
+def probe_media(audio_file_path: str) -> MediaInfo:
+    """Duration, streams and audio codec of a media file, using ffprobe."""
+    output = subprocess.run(
+        (
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration:stream=codec_type,codec_name",
+            "-of",
+            "json",
+            audio_file_path,
+        ),
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+
+    probe = json.loads(output)
+    streams = probe.get("streams", [])
+    audio_codecs = [
+        stream.get("codec_name")
+        for stream in streams
+        if stream.get("codec_type") == "audio"
+    ]
+    duration = probe.get("format", {}).get("duration")
+
+    return MediaInfo(
+        None if duration is None else float(duration),
+        len(audio_codecs),
+        sum(stream.get("codec_type") == "video" for stream in streams),
+        audio_codecs[0] if audio_codecs else None,
+    )
+
+
+class MediaInfoCache:
+    """
+    Probed media files, so they are probed again only when they change.
+
+    It's an append only file with a line for every probed file, like the ledger of
+    the watched directories, and it's rewritten without the old lines when they are
+    most of it.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """Read the cache, the file is created with the first probed file."""
+        self.path = path or xdg_cache_dir() / "media_info.jsonl"
+
+        # Path -> (size, modification time in ns, what was found in it).
+        self.__files: dict[str, tuple[int, int, MediaInfo]] = {}
+        self.__lock = threading.Lock()
+        self.__read()
+
+    def __read(self) -> None:
+        """Read the probed files, and compact the file when it's worth it."""
+        lines = 0
+        complete = True
+
+        try:
+            with open(self.path, "rb") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        complete = False
+                        break
+                    if not line.endswith(b"\n"):
+                        complete = False
+                        break
+
+                    self.__files[entry["path"]] = (
+                        entry["size"],
+                        entry["mtime_ns"],
+                        MediaInfo(*entry["info"]),
+                    )
+                    lines += 1
+        except FileNotFoundError:
+            return
+
+        # A line that was not completely written is removed with the old lines.
+        if not complete or lines > 2 * len(self.__files):
+            self.__compact()
+
+    def __compact(self) -> None:
+        """Write only the last line of every file."""
+        temporary_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as file:
+            for path, (size, mtime_ns, info) in self.__files.items():
+                file.write(self.__line(path, size, mtime_ns, info))
+        os.replace(temporary_path, self.path)
+
+    @staticmethod
+    def __line(path: str, size: int, mtime_ns: int, info: MediaInfo) -> str:
+        """Line of a probed file."""
+        return (
+            json.dumps({"path": path, "size": size, "mtime_ns": mtime_ns, "info": info})
+            + "\n"
+        )
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[MediaInfo]:
+        """Get what was found in a file, if it didn't change since it was probed."""
+        with self.__lock:
+            entry = self.__files.get(path)
+
+        if entry is None or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+            return None
+
+        return entry[2]
+
+    def add(self, path: str, stat: os.stat_result, info: MediaInfo) -> None:
+        """Record what was found in a file."""
+        with self.__lock:
+            self.__files[path] = (stat.st_size, stat.st_mtime_ns, info)
+
+            Path.mkdir(self.path.parent, parents=True, exist_ok=True)
+            with open(self.path, "a") as file:
+                file.write(self.__line(path, stat.st_size, stat.st_mtime_ns, info))
+
+
+class MediaProber:
+    """Probe media files in background threads, reusing the cached results."""
+
+    def __init__(
+        self, cache: Optional[MediaInfoCache] = None, threads: int = PROBE_THREADS
+    ) -> None:
+        """Initialize the probing threads, without a `cache` every file is probed."""
+        self.cache = cache
+
+        self.__executor = ThreadPoolExecutor(threads, thread_name_prefix="probe")
+
+    def probe(self, audio_file_path: str) -> Optional[MediaInfo]:
+        """Find what is in a file, or `None` if it can't be read."""
+        try:
+            stat = os.stat(audio_file_path)
+            if self.cache is not None:
+                info = self.cache.get(audio_file_path, stat)
+                if info is not None:
+                    return info
+
+            info = probe_media(audio_file_path)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            # The worker will report why the file can't be read.
+            return None
+
+        if self.cache is not None:
+            try:
+                self.cache.add(audio_file_path, stat, info)
+            except OSError:
+                pass
+
+        return info
+
+    def submit(
+        self,
+        paths: Iterable[str],
+        on_probed: Callable[[str, Optional[MediaInfo]], None],
+    ) -> list["Future[None]"]:
+        """Probe files in the background, calling `on_probed` from its threads."""
+
+        def probe(path: str) -> None:
+            on_probed(path, self.probe(path))
+
+        return [self.__executor.submit(probe, path) for path in paths]
+
+    def probe_all(self, paths: Iterable[str]) -> dict[str, Optional[MediaInfo]]:
+        """Probe files in parallel, and wait for all of them."""
+        paths = list(paths)
+
+        return dict(zip(paths, self.__executor.map(self.probe, paths)))
+
+    def shutdown(self) -> None:
+        """Stop the probes that didn't start."""
+        self.__executor.shutdown(wait=False, cancel_futures=True)
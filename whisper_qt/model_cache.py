@@ -0,0 +1,108 @@
+"""Keep loaded models in memory to reuse them between jobs."""
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+
+class ModelCache:
+    """
+    Least recently used cache of loaded models.
+
+    Models are evicted when the memory budget is exceeded or when they were not used
+    for `idle_timeout` seconds. A model that alone exceeds the budget is still kept.
+    Room for a new model is made before it's loaded, so the loaded models don't
+    exceed the budget even while it loads.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[..., Any],
+        sizeof: Callable[[Any], int],
+        memory_budget: int,
+        idle_timeout: float,
+        estimate: Optional[Callable[..., int]] = None,
+        release: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """
+        Initialize an empty cache, a `memory_budget` of 0 means no limit.
+
+        `estimate` gives the size in bytes of a model by its key before it's loaded,
+        for the models that were not loaded before. `release` is called with the
+        number of models evicted to make room for a new one, before it's loaded.
+        """
+        self.loader = loader
+        self.sizeof = sizeof
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.estimate = estimate
+        self.release = release
+
+        # Key of the model -> [model object, size in bytes, last time it was used]
+        self.__models: OrderedDict[tuple[str, ...], list] = OrderedDict()
+        # Key of the model -> its size in bytes when it was last loaded.
+        self.__sizes: dict[tuple[str, ...], int] = {}
+
+    @property
+    def used_memory(self) -> int:
+        """Memory in bytes used by all the cached models."""
+        return sum(size for _, size, _ in self.__models.values())
+
+    def get(self, *key: str) -> Any:
+        """Return a loaded model, loading it by its key if it's not in the cache."""
+        if key in self.__models:
+            self.__models.move_to_end(key)
+            entry = self.__models[key]
+            entry[2] = time.monotonic()
+            return entry[0]
+
+        size = self.__sizes.get(key)
+        if size is None and self.estimate is not None:
+            size = self.estimate(*key)
+        evicted = self.evict_for(size or 0)
+        if evicted and self.release is not None:
+            self.release(evicted)
+
+        loaded = self.loader(*key)
+        self.__sizes[key] = self.sizeof(loaded)
+        self.__models[key] = [loaded, self.__sizes[key], time.monotonic()]
+        self.evict_over_budget()
+
+        return loaded
+
+    def evict_for(self, size: int) -> int:
+        """Evict least recently used models until a model of `size` bytes fits."""
+        evicted = 0
+
+        if self.memory_budget > 0:
+            while self.__models and self.used_memory + size > self.memory_budget:
+                self.__models.popitem(last=False)
+                evicted += 1
+
+        return evicted
+
+    def evict_over_budget(self) -> int:
+        """Evict least recently used models until the budget is respected."""
+        evicted = 0
+
+        if self.memory_budget > 0:
+            while len(self.__models) > 1 and self.used_memory > self.memory_budget:
+                self.__models.popitem(last=False)
+                evicted += 1
+
+        return evicted
+
+    def evict_idle(self) -> int:
+        """Evict models that were not used for a long time."""
+        deadline = time.monotonic() - self.idle_timeout
+
+        idle = [key for key, (_, _, used) in self.__models.items() if used < deadline]
+        for key in idle:
+            del self.__models[key]
+
+        return len(idle)
+
+    def clear(self) -> None:
+        """Evict all the models."""
+        self.__models.clear()
@@ -0,0 +1,137 @@
+"""Write the results of transcription jobs to the output files."""
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import TextIO
+
+from .jobs import TranscriptionJob
+
+# Formats that the outputs can be written in, by their file extension.
+OUTPUT_FORMATS = ("srt", "vtt", "txt", "tsv", "json")
+
+
+def format_timestamp(seconds: float, decimal_marker: str = ",") -> str:
+    """Format a time like `01:02:03,456` as in SRT files."""
+    milliseconds = round(seconds * 1000)
+
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def write_srt(result: dict[str, Any], file: TextIO) -> None:
+    """Write segments as SRT, the same way as `whisper.utils.write_srt`."""
+    for number, segment in enumerate(result["segments"], start=1):
+        file.write(
+            f"{number}\n"
+            f"{format_timestamp(segment['start'])} --> "
+            f"{format_timestamp(segment['end'])}\n"
+            f"{segment['text'].strip().replace('-->', '->')}\n\n"
+        )
+
+
+def write_vtt(result: dict[str, Any], file: TextIO) -> None:
+    """Write segments as WebVTT subtitles."""
+    file.write("WEBVTT\n\n")
+    for segment in result["segments"]:
+        file.write(
+            f"{format_timestamp(segment['start'], '.')} --> "
+            f"{format_timestamp(segment['end'], '.')}\n"
+            f"{segment['text'].strip().replace('-->', '->')}\n\n"
+        )
+
+
+def write_txt(result: dict[str, Any], file: TextIO) -> None:
+    """Write the text of every segment in its own line."""
+    for segment in result["segments"]:
+        file.write(segment["text"].strip() + "\n")
+
+
+def write_tsv(result: dict[str, Any], file: TextIO) -> None:
+    """Write segments with their times in milliseconds, like whisper does."""
+    file.write("start\tend\ttext\n")
+    for segment in result["segments"]:
+        start = round(segment["start"] * 1000)
+        end = round(segment["end"] * 1000)
+        text = segment["text"].strip().replace("\t", " ")
+        file.write(f"{start}\t{end}\t{text}\n")
+
+
+def write_json(result: dict[str, Any], file: TextIO) -> None:
+    """Write the whole result, with the probabilities of every segment."""
+    json.dump(result, file, ensure_ascii=False)
+
+
+# Format -> the function that writes a result in it.
+WRITERS: dict[str, Callable[[dict[str, Any], TextIO], None]] = {
+    "srt": write_srt,
+    "vtt": write_vtt,
+    "txt": write_txt,
+    "tsv": write_tsv,
+    "json": write_json,
+}
+
+
+def write_outputs(result: dict[str, Any], job: TranscriptionJob) -> None:
+    """Write the result of a job to the output directory, in all its formats."""
+    for output_format in job.output_formats:
+        path = Path(job.output_directory) / (
+            Path(job.audio_file_path).name + "." + output_format
+        )
+
+        # Write to a temporary file first, so there is never a half written output.
+        temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                WRITERS[output_format](result, file)
+            os.replace(temporary_path, path)
+        except BaseException:
+            # Don't leave the partial output in the output directory.
+            try:
+                os.remove(temporary_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+class OutputWriter:
+    """
+    Thread that writes the outputs of finished jobs, in the order they were given.
+
+    A worker gives its results to the writer, so it can start transcribing the next
+    job while the outputs are written.
+    """
+
+    def __init__(self) -> None:
+        """Start the thread."""
+        self.__tasks: queue.Queue[Optional[tuple[Callable[..., None], tuple]]]
+        self.__tasks = queue.Queue()
+
+        self.__thread = threading.Thread(target=self.__run, name="output-writer")
+        self.__thread.start()
+
+    def __run(self) -> None:
+        """Run the tasks until it's closed."""
+        while True:
+            task = self.__tasks.get()
+            if task is None:
+                break
+
+            function, arguments = task
+            function(*arguments)
+
+    def submit(self, function: Callable[..., None], *arguments: Any) -> None:
+        """Run a function after the ones that were given before it."""
+        self.__tasks.put((function, arguments))
+
+    def close(self) -> None:
+        """Wait until all the given functions were run, and stop the thread."""
+        self.__tasks.put(None)
+        self.__thread.join()
@@ -0,0 +1,251 @@
+"""Decode the audio of queued jobs while the workers are busy with other jobs."""
+import io
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import cast
+from typing import Iterable
+from typing import Optional
+
+from .jobs import SharedAudio
+from .jobs import TranscriptionJob
+from .media import probe_duration
+
+# Same as `whisper.audio.SAMPLE_RATE`.
+SAMPLE_RATE = 16000
+# Bytes of a float32 sample.
+SAMPLE_SIZE = 4
+
+# Default maximum size in bytes of the decoded audio waiting for a worker.
+PREFETCH_MEMORY = 1024**3
+
+# Bytes a block grows by when the decoded audio is longer than expected, one minute.
+GROW_SIZE = 60 * SAMPLE_RATE * SAMPLE_SIZE
+
+
+class AudioBlock(shared_memory.SharedMemory):
+    """A new shared memory block with the length of the audio decoded into it."""
+
+    def __init__(self, size: int) -> None:
+        """Create a block of at least `size` bytes, with no audio in it yet."""
+        # A block can't be empty.
+        super().__init__(create=True, size=max(1, size))
+        # Bytes of audio at the start of the block, the rest is unused.
+        self.length = 0
+
+
+def decode_command(
+    audio_file_path: str, start: float = 0, duration: Optional[float] = None
+) -> tuple[str, ...]:
+    """Build the ffmpeg command that writes 16 kHz mono float32 PCM to stdout."""
+    # Seek before the input, which is much faster than decoding until `start`.
+    part: tuple[str, ...] = ("-ss", str(start)) if start else ()
+    if duration is not None:
+        part += ("-t", str(duration))
+
+    # Like `whisper.load_audio`, but without converting from 16 bit afterwards.
+    return (
+        "ffmpeg",
+        "-nostdin",
+        "-threads",
+        "0",
+        *part,
+        "-i",
+        audio_file_path,
+        "-f",
+        "f32le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_f32le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-",
+    )
+
+
+def decode_audio(
+    audio_file_path: str, start: float = 0, duration: Optional[float] = None
+) -> bytes:
+    """
+    Decode any media file to 16 kHz mono float32 PCM, as whisper expects it.
+
+    Only `duration` seconds from `start` are decoded when it's given.
+    """
+    command = decode_command(audio_file_path, start, duration)
+
+    return subprocess.run(command, capture_output=True, check=True).stdout
+
+
+def decode_to_shared_memory(
+    audio_file_path: str, duration: Optional[float] = None
+) -> AudioBlock:
+    """
+    Decode a media file straight into a new shared memory block.
+
+    The block is sized from the `duration` of the file, which is probed if it's not
+    given, and only moved to a bigger block if the decoded audio doesn't fit.
+    """
+    if duration is None:
+        try:
+            duration = probe_duration(audio_file_path)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            # ffmpeg will fail with a proper error message if the file can't be read.
+            duration = 0
+
+    # A second more for the rounding of the duration, the pages that are never
+    # written to don't take any memory.
+    block = AudioBlock(int((duration + 1) * SAMPLE_RATE) * SAMPLE_SIZE)
+
+    command = decode_command(audio_file_path)
+    # ffmpeg logs to a file, a pipe that nobody reads while decoding could fill up.
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        with process:
+            # A pipe that is opened with the default buffering.
+            stdout = cast(io.BufferedReader, process.stdout)
+            try:
+                while True:
+                    if block.length == block.size:
+                        block = grow(block, block.size + GROW_SIZE)
+                    length = block.length
+                    read = stdout.readinto(block.buf[length:])
+                    if not read:
+                        break
+                    block.length += read
+            except BaseException:
+                release(block)
+                process.kill()
+                raise
+
+        if process.returncode:
+            release(block)
+            errors.seek(0)
+            raise subprocess.CalledProcessError(
+                process.returncode, command, stderr=errors.read()
+            )
+
+    return block
+
+
+def grow(block: AudioBlock, size: int) -> AudioBlock:
+    """Move the audio of a block to a new, bigger block, and free the old one."""
+    bigger = AudioBlock(size)
+    bigger.buf[: block.length] = block.buf[: block.length]
+    bigger.length = block.length
+    release(block)
+
+    return bigger
+
+
+def release(block: shared_memory.SharedMemory) -> None:
+    """Free a shared memory block that is not used by any worker anymore."""
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def release_result(future: "Future[AudioBlock]") -> None:
+    """Free the block of a decoding that is not needed anymore, when it's done."""
+    if not future.cancelled() and not future.exception():
+        release(future.result())
+
+
+def shared_audio(block: AudioBlock) -> SharedAudio:
+    """Describe a block to a worker, which can attach to it with the description."""
+    # The block is bigger than the audio, which is at its start.
+    return SharedAudio(block.name, block.length // SAMPLE_SIZE)
+
+
+class AudioPrefetcher:
+    """
+    Decode the audio of the next jobs in background threads into shared memory.
+
+    No more decoding is started while the decoded audio exceeds `memory_budget`, so
+    it can be exceeded by at most the files that are being decoded at that time.
+    """
+
+    def __init__(self, memory_budget: int = PREFETCH_MEMORY, threads: int = 2) -> None:
+        """Initialize the decoding threads, a `memory_budget` of 0 disables it."""
+        self.memory_budget = memory_budget
+        self.threads = threads
+
+        self.__executor = ThreadPoolExecutor(threads, thread_name_prefix="decode")
+        # Job id -> decoded audio.
+        self.__decoded: dict[int, Future[AudioBlock]] = {}
+        self.__lock = threading.Lock()
+
+    def used_memory(self) -> int:
+        """Size in bytes of the decoded audio that was not taken yet."""
+        with self.__lock:
+            futures = tuple(self.__decoded.values())
+
+        return sum(
+            future.result().length
+            for future in futures
+            if future.done() and not future.cancelled() and not future.exception()
+        )
+
+    def prefetch(self, jobs: Iterable[TranscriptionJob]) -> None:
+        """Start decoding the given upcoming jobs, in order, as the budget allows."""
+        if self.memory_budget <= 0:
+            return
+
+        for job in jobs:
+            with self.__lock:
+                decoding = sum(not future.done() for future in self.__decoded.values())
+                if decoding >= self.threads:
+                    break
+                # A chunk decodes only its part of the file.
+                if job.job_id in self.__decoded or job.chunk is not None:
+                    continue
+
+            if self.used_memory() >= self.memory_budget:
+                break
+
+            with self.__lock:
+                self.__decoded[job.job_id] = self.__executor.submit(
+                    decode_to_shared_memory, job.audio_file_path, job.duration
+                )
+
+    def take(self, job: TranscriptionJob) -> Optional[AudioBlock]:
+        """
+        Get the decoded audio of a job if it's ready, the caller should release it.
+
+        If it's not ready, the worker is left to decode it instead of waiting.
+        """
+        with self.__lock:
+            future = self.__decoded.pop(job.job_id, None)
+
+        if future is None:
+            return None
+
+        if not future.done():
+            self.__discard(future)
+            return None
+
+        if future.cancelled() or future.exception():
+            # The worker will fail with a proper error message.
+            return None
+
+        return future.result()
+
+    @staticmethod
+    def __discard(future: "Future[AudioBlock]") -> None:
+        """Stop a decoding or free its result when it finishes."""
+        if not future.cancel():
+            future.add_done_callback(release_result)
+
+    def clear(self) -> None:
+        """Drop all the decoded audio, and what is being decoded."""
+        with self.__lock:
+            futures = tuple(self.__decoded.values())
+            self.__decoded.clear()
+
+        for future in futures:
+            self.__discard(future)
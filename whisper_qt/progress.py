@@ -0,0 +1,106 @@
+"""Limit how often progress updates are displayed, and estimate what is left."""
+import math
+import time
+from typing import Any
+from typing import Iterable
+from typing import Optional
+
+from .jobs import TranscriptionJob
+
+# Weight of a finished file in the real-time factor of its model, over the factor
+# of the previous files.
+REAL_TIME_FACTOR_SMOOTHING = 0.2
+
+
+class Throttle:
+    """Allow something to happen at most once every `interval` seconds."""
+
+    def __init__(self, interval: float) -> None:
+        """Initialize it, so the first time is always allowed."""
+        self.interval = interval
+        self.__last = -math.inf
+
+    def ready(self, force: bool = False) -> bool:
+        """Whether it's allowed now, `force` allows it anyway, e.g. for the last time."""
+        now = time.monotonic()
+
+        if force or now - self.__last >= self.interval:
+            self.__last = now
+            return True
+
+        return False
+
+
+class EtaEstimator:
+    """
+    Estimate how long files take to transcribe from their duration.
+
+    The real-time factor of a model on a device is the time it took to transcribe
+    files divided by their duration, starting from the jobs of previous runs and
+    following the files of this run as they finish.
+    """
+
+    def __init__(
+        self, real_time_factors: Optional[dict[tuple[str, str], float]] = None
+    ) -> None:
+        """Initialize it with the real-time factor of every (model, device)."""
+        self.real_time_factors = dict(real_time_factors or {})
+
+    @classmethod
+    def from_throughput(cls, throughput: Iterable[dict[str, Any]]) -> "EtaEstimator":
+        """Initialize it with the throughput of past runs from the job store."""
+        return cls(
+            {
+                (report["model"], report["device"]): report["real_time_factor"]
+                for report in throughput
+                if report["real_time_factor"]
+            }
+        )
+
+    def record(self, job: TranscriptionJob, seconds: float) -> None:
+        """Follow the real-time factor of a file that took `seconds` to transcribe."""
+        if not job.duration:
+            return
+
+        key = (job.model, job.device)
+        factor = seconds / job.duration
+        previous = self.real_time_factors.get(key)
+        if previous is not None:
+            factor = previous + REAL_TIME_FACTOR_SMOOTHING * (factor - previous)
+
+        self.real_time_factors[key] = factor
+
+    def estimate(self, job: TranscriptionJob) -> Optional[float]:
+        """Seconds to transcribe a file, if its duration and model's speed are known."""
+        factor = self.real_time_factors.get((job.model, job.device))
+        if factor is None or job.duration is None:
+            return None
+
+        return job.duration * factor
+
+    def remaining(
+        self, jobs: Iterable[tuple[TranscriptionJob, float]], workers: int
+    ) -> Optional[float]:
+        """
+        Seconds until the (job, transcribed fraction) are done by parallel workers.
+
+        The files that are not estimated are taken as long as the average of the
+        others, and it's `None` if none of them is.
+        """
+        estimates = []
+        unknown = 0
+
+        for job, fraction in jobs:
+            estimate = self.estimate(job)
+            if estimate is None:
+                unknown += 1
+            else:
+                estimates.append(estimate * (1 - fraction))
+
+        if not estimates:
+            return None
+
+        total = sum(estimates)
+        total += unknown * total / len(estimates)
+
+        return total / max(1, workers)
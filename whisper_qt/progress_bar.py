@@ -0,0 +1,57 @@
+"""Report the progress of whisper from inside the worker processes."""
+import importlib
+from types import ModuleType
+from types import SimpleNamespace
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+import tqdm
+
+# Whisper's progress bar counts mel frames, which are 10 ms each.
+FRAMES_PER_SECOND = 100
+
+
+class ProgressBar(tqdm.tqdm):
+    """
+    Progress bar that whisper uses in `transcribe`, which also reports its progress.
+
+    Whisper creates it after the audio was decoded, then updates it after every
+    decoded window of segments.
+    """
+
+    # Set by the worker before every job, it receives the event kind and data. It's
+    # a plain function, so it's read from the class to not be bound to the bar.
+    report: Optional[Callable[[str, Any], None]] = None
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Report that the audio was decoded, with its duration."""
+        super().__init__(*args, **kwargs)
+
+        self.__duration = (kwargs.get("total") or 0) / FRAMES_PER_SECOND
+        self.__position = 0.0
+        self.__segment = 0
+
+        report = type(self).report
+        if report is not None:
+            report("decoded", self.__duration)
+
+    def update(self, n: float = 1) -> Optional[bool]:
+        """Report the position of the last decoded segment."""
+        self.__position += n / FRAMES_PER_SECOND
+        self.__segment += 1
+
+        report = type(self).report
+        if report is not None:
+            report("segment", (self.__segment, self.__position, self.__duration))
+
+        return super().update(n)
+
+
+def install_progress_bar(whisper: ModuleType) -> None:
+    """Make whisper's `transcribe` use `ProgressBar`, only in the calling process."""
+    # `whisper.transcribe` is the function that shadows its module.
+    transcribe_module = importlib.import_module(whisper.__name__ + ".transcribe")
+    transcribe_module.tqdm = SimpleNamespace(  # type: ignore[attr-defined]
+        tqdm=ProgressBar
+    )
@@ -0,0 +1,157 @@
+"""
+Quantize the linear layers of a model to int8, for faster inference on the CPU.
+
+Run this module to compare the speed and the transcript of both precisions.
+"""
+import argparse
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+from typing import Optional
+
+import torch
+
+from .default_files import xdg_cache_dir
+
+# Arguments to load a whole pickled model, since torch 2.6 loads only weights.
+LOAD_MODEL_ARGUMENTS = (
+    {"weights_only": False}
+    if "weights_only" in inspect.signature(torch.load).parameters
+    else {}
+)
+
+
+def quantized_model_path(digest: str, directory: Optional[Path] = None) -> Path:
+    """Path of a quantized model, named by its original checkpoint's digest."""
+    return (directory or xdg_cache_dir() / "quantized") / (digest + "-int8.pt")
+
+
+def quantize(whisper: ModuleType, model: Any) -> Any:
+    """Quantize the linear layers of a model on the CPU dynamically to int8."""
+    # Quantization only replaces torch's own linear layers, and whisper's layers are
+    # the same in float32.
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, whisper.model.Linear):
+                linear = torch.nn.Linear(
+                    child.in_features, child.out_features, bias=child.bias is not None
+                )
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(module, name, linear)
+
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def load_quantized(
+    whisper: ModuleType, checkpoint_path: Path, digest: Optional[str] = None
+) -> Any:
+    """
+    Load a quantized model on the CPU, quantizing it the first time.
+
+    The quantized model is stored in the cache when the checkpoint's `digest` is
+    known, so it's not quantized again.
+    """
+    path = quantized_model_path(digest) if digest else None
+    if path is not None and path.is_file():
+        return torch.load(path, map_location="cpu", **LOAD_MODEL_ARGUMENTS)
+
+    model = quantize(whisper, whisper.load_model(str(checkpoint_path), "cpu"))
+
+    if path is not None:
+        Path.mkdir(path.parent, parents=True, exist_ok=True)
+        temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        torch.save(model, temporary_path)
+        os.replace(temporary_path, path)
+
+    return model
+
+
+def compare(
+    model_name: str, clip: str, model_dir: str, reference: Optional[str] = None
+) -> dict[str, Any]:
+    """
+    Transcribe a clip in float32 and int8, and compare their speed and transcripts.
+
+    The drift is the word error rate of the int8 transcript against the float32 one,
+    and with a `reference` transcript the error rate of both is measured too.
+    """
+    from .checkpoints import CheckpointIndex
+    from .evaluation import word_error_rate
+    from .whisper_metadata import CHECKPOINTS
+    from .whisper_process import import_whisper
+
+    whisper = import_whisper()
+    checkpoint_path = CheckpointIndex(model_dir).ensure_verified(model_name)
+    audio = whisper.load_audio(clip)
+
+    report: dict[str, Any] = {"model": model_name, "clip": clip}
+    texts = {}
+    for precision in ("fp32", "int8"):
+        started_at = time.monotonic()
+        if precision == "int8":
+            model = load_quantized(whisper, checkpoint_path, CHECKPOINTS[model_name][0])
+        else:
+            model = whisper.load_model(str(checkpoint_path), "cpu")
+        loaded_at = time.monotonic()
+
+        result = model.transcribe(audio, fp16=False, temperature=0.0)
+        texts[precision] = result["text"]
+        report[precision] = {
+            "load_seconds": loaded_at - started_at,
+            "transcribe_seconds": time.monotonic() - loaded_at,
+        }
+        if reference is not None:
+            report[precision]["wer"] = word_error_rate(reference, texts[precision])
+
+        del model
+
+    report["speedup"] = (
+        report["fp32"]["transcribe_seconds"] / report["int8"]["transcribe_seconds"]
+    )
+    report["wer_drift"] = word_error_rate(texts["fp32"], texts["int8"])
+
+    return report
+
+
+if __name__ == "__main__":
+    from .config import Config
+
+    config = Config()
+    config.read_config()
+
+    parser = argparse.ArgumentParser(
+        description="Compare float32 and int8 inference of a model on the CPU."
+    )
+    parser.add_argument("model")
+    parser.add_argument("clip", help="audio file to transcribe")
+    parser.add_argument(
+        "--model-dir",
+        default=config.get_option("preferences", "model_directory")
+        or str(xdg_cache_dir()),
+    )
+    parser.add_argument("--reference", help="file with the correct transcript")
+    parser.add_argument("--threads", type=int, default=0)
+    arguments = parser.parse_args()
+
+    if arguments.threads > 0:
+        torch.set_num_threads(arguments.threads)
+
+    reference_text = None
+    if arguments.reference:
+        reference_text = Path(arguments.reference).read_text()
+
+    print(
+        json.dumps(
+            compare(
+                arguments.model, arguments.clip, arguments.model_dir, reference_text
+            ),
+            indent=2,
+        )
+    )
@@ -0,0 +1,145 @@
+"""Store transcription results on disk to not transcribe the same audio twice."""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+from .default_files import xdg_cache_dir
+
+# Default maximum size of all the cached results in bytes.
+DEFAULT_MAX_SIZE = 100 * 1024**2
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        while chunk := file.read(1024**2):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Transcription results addressed by the audio content, the model and the options.
+
+    Results are stored as JSON files, and the least recently used ones are removed
+    when the cache grows over `max_size` bytes.
+    """
+
+    def __init__(
+        self, directory: Optional[Path] = None, max_size: int = DEFAULT_MAX_SIZE
+    ) -> None:
+        """Initilize the cache, the directory is created with the first result."""
+        self.directory = directory or xdg_cache_dir() / "results"
+        self.max_size = max_size
+
+    @staticmethod
+    def key(audio_file_path: str, model: str, language: str, options: dict) -> str:
+        """Get a key that changes when anything affecting the result changes."""
+        description = json.dumps(
+            {
+                "audio": file_digest(audio_file_path),
+                "model": model,
+                "language": language,
+                "options": options,
+            },
+            sort_keys=True,
+        )
+
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def __path(self, key: str) -> Path:
+        """Path of the file that stores a result."""
+        return self.directory / (key + ".json")
+
+    def __entries(self) -> list[tuple[str, os.stat_result]]:
+        """Path and stat of every cached result."""
+        entries = []
+
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    try:
+                        entries.append((entry.path, entry.stat()))
+                    except FileNotFoundError:
+                        # Removed by another process.
+                        pass
+        except FileNotFoundError:
+            pass
+
+        return entries
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """Return a cached result or `None` if it's not cached."""
+        path = self.__path(key)
+
+        try:
+            with open(path) as file:
+                result = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        # Mark it as recently used.
+        try:
+            path.touch()
+        except OSError:
+            pass
+
+        return result
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        """Add a result to the cache, then evict old results if it's too big."""
+        Path.mkdir(self.directory, parents=True, exist_ok=True)
+
+        # Write to a temporary file first so other processes never read half a file.
+        path = self.__path(key)
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as file:
+            json.dump(result, file)
+        os.replace(temporary_path, path)
+
+        self.evict()
+
+    def size(self) -> int:
+        """Size in bytes of all the cached results."""
+        return sum(stat.st_size for _, stat in self.__entries())
+
+    def __len__(self) -> int:
+        """Count the cached results."""
+        return len(self.__entries())
+
+    def evict(self) -> int:
+        """Remove the least recently used results until the size limit is respected."""
+        entries = self.__entries()
+        size = sum(stat.st_size for _, stat in entries)
+        evicted = 0
+
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+            evicted += 1
+
+        return evicted
+
+    def purge(self) -> None:
+        """Remove all the cached results."""
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith((".json", ".tmp")):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+        except FileNotFoundError:
+            pass
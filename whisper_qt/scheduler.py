@@ -0,0 +1,715 @@
+"""Schedule transcription jobs on a bounded number of worker processes."""
+import copy
+import itertools
+import multiprocessing
+import queue
+import subprocess
+import threading
+from collections import Counter
+from collections import deque
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Collection
+from typing import Optional
+
+from .affinity import allocate_cores
+from .chunking import ChunkedTranscription
+from .jobs import JobGroup
+from .jobs import TranscriptionJob
+from .jobs import WorkerEvent
+from .media import probe_duration
+from .outputs import write_outputs
+from .prefetch import AudioBlock
+from .prefetch import AudioPrefetcher
+from .prefetch import PREFETCH_MEMORY
+from .prefetch import release
+from .prefetch import shared_audio
+from .result_cache import ResultCache
+from .system import available_memory
+from .system import usable_cpu_count
+from .whisper_process import CANCEL_SIGNAL
+from .whisper_process import WhisperProcess
+
+# Approximate memory needed by a single worker for every model in MB.
+# Taken from the whisper README, so it is only an estimation.
+MODEL_MEMORY = {
+    "tiny": 1024,
+    "base": 1024,
+    "small": 2048,
+    "medium": 5120,
+    "large": 10240,
+}
+
+# Seconds a worker keeps a model loaded while it is not used.
+MODEL_IDLE_TIMEOUT = 300
+
+# How far to look in the queue for jobs to decode their audio in advance.
+PREFETCH_LOOKAHEAD = 32
+
+# Default maximum number of CPU jobs that a worker transcribes together.
+DEFAULT_BATCH_SIZE = 1
+
+# Events of a chunk that are reported for the whole job, other than its progress.
+CHUNK_REPORTED_EVENTS = ("model_loaded", "language", "warning")
+
+# Orders of the queued jobs of a group: as they were submitted, or by the duration
+# of their audio, where the jobs of unknown durations are last.
+JOB_ORDERS = ("queued", "longest", "shortest")
+
+# Detections at least this probable count for locking the language of a batch.
+LANGUAGE_LOCK_PROBABILITY = 0.9
+# Confident detections of the majority language needed to lock it.
+LANGUAGE_LOCK_MIN_FILES = 3
+
+
+def model_memory(model: str) -> int:
+    """Estimated memory in bytes needed to run a model."""
+    # English only models has the same size as the multilingual ones.
+    return MODEL_MEMORY.get(model.split(".")[0].split("-")[0], 10240) * 1024**2
+
+
+def default_max_workers(model: Optional[str] = None) -> int:
+    """Guess how many workers can run at the same time without overloading the system."""
+    # Every worker should get at least two cores for its own torch threads.
+    workers = max(1, usable_cpu_count() // 2)
+
+    memory = available_memory()
+    if memory:
+        workers = min(workers, max(1, memory // model_memory(model or "large")))
+
+    return workers
+
+
+def queue_position(job: TranscriptionJob, order: str) -> tuple[bool, bool, float]:
+    """Sort key of a queued job, which keeps the chunks of a split job first."""
+    if job.duration is None:
+        return job.chunk is None, True, 0.0
+
+    return (
+        job.chunk is None,
+        False,
+        -job.duration if order == "longest" else job.duration,
+    )
+
+
+def pop_job(
+    jobs: dict[int, dict[int, TranscriptionJob]], worker: int, job_id: int
+) -> Optional[TranscriptionJob]:
+    """Remove a job of a worker, and the worker when it has no jobs left."""
+    worker_jobs = jobs.get(worker, {})
+    job = worker_jobs.pop(job_id, None)
+    if not worker_jobs:
+        jobs.pop(worker, None)
+
+    return job
+
+
+class JobScheduler:
+    """
+    Queue of jobs that runs only a limited number of them at once.
+
+    Jobs are sent to long lived workers that keep their loaded models between jobs,
+    so a worker is given jobs from the group of its previous job when possible.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        threads: int,
+        max_workers: int = 0,
+        idle_timeout: float = MODEL_IDLE_TIMEOUT,
+        result_cache: Optional[ResultCache] = None,
+        verbose: bool = True,
+        prefetch_memory: int = PREFETCH_MEMORY,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        lock_language: bool = False,
+        map_weights: bool = False,
+        pin_workers: bool = False,
+        trace: bool = False,
+        order: str = "queued",
+    ) -> None:
+        """
+        Initialize an empty queue, `max_workers` of 0 means to guess it.
+
+        With `threads` of 0 the CPU cores are split between the workers, otherwise
+        every worker uses that many torch threads. With `pin_workers` every worker
+        runs only on its own cores.
+        With `trace` the workers time the stages of every job, into its `spans`.
+
+        Without a `result_cache` every job is transcribed even if it was done before.
+        When not `verbose` the workers don't print the transcribed text.
+        The audio of the next jobs is decoded in advance up to `prefetch_memory` bytes.
+        Up to `batch_size` CPU jobs of the same model are given to a worker at once,
+        which runs their windows through the encoder together.
+        With `lock_language` the next `Auto` jobs of a run use the majority language
+        once it was detected confidently in enough files, without detecting it again.
+        With `map_weights` the workers share the weights of CPU models in memory.
+        The jobs of a group run in the `order` they were submitted, or with the
+        longest or the shortest audio first when their `duration` is known.
+        """
+        self.model_dir = model_dir
+        self.threads = threads
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.result_cache = result_cache
+        self.verbose = verbose
+        self.batch_size = batch_size
+        self.lock_language = lock_language
+        self.map_weights = map_weights
+        self.pin_workers = pin_workers
+        self.trace = trace
+        self.order = order
+
+        # Jobs are grouped by their model in the order groups were first seen.
+        self.__groups: OrderedDict[JobGroup, deque[TranscriptionJob]]
+        self.__groups = OrderedDict()
+        # Groups with jobs that were submitted since they were sorted.
+        self.__unsorted: set[JobGroup] = set()
+        self.__lock = threading.Lock()
+
+        self.__worker_ids = itertools.count()
+        self.__workers: dict[int, WhisperProcess] = {}
+        # Worker index -> its share of the CPU cores.
+        self.__worker_slots: dict[int, int] = {}
+        # Worker index -> job id -> the jobs it is running now.
+        self.__running: dict[int, dict[int, TranscriptionJob]] = {}
+        # Worker index -> job id -> the jobs whose outputs it is writing, while it can
+        # already run other jobs.
+        self.__writing: dict[int, dict[int, TranscriptionJob]] = {}
+        # Worker index -> group of the last job it ran, so its model is loaded.
+        self.__worker_groups: dict[int, JobGroup] = {}
+        self.__events: multiprocessing.Queue[WorkerEvent] = multiprocessing.Queue()
+        self.__prefetcher = AudioPrefetcher(prefetch_memory)
+        # Job id -> shared memory of the decoded audio that a worker is using.
+        self.__audio_blocks: dict[int, AudioBlock] = {}
+        # Chunk job id -> the job that was split to chunks.
+        self.__chunked: dict[int, ChunkedTranscription] = {}
+        # Languages detected in the current run, with their probabilities.
+        self.__detections: list[tuple[str, float]] = []
+        self.__locked_language: Optional[str] = None
+        self.__cancelled = threading.Event()
+        # Held by the loop of `run`, so a new run waits for the previous one to end.
+        self.__run_lock = threading.Lock()
+
+    def submit(self, job: TranscriptionJob) -> None:
+        """Add a job to its group's queue, at the end or by its `order`."""
+        with self.__lock:
+            self.__groups.setdefault(job.group, deque()).append(job)
+            if self.order != "queued":
+                self.__unsorted.add(job.group)
+
+    def __sort_groups(self) -> None:
+        """Sort the queues of the groups with new jobs, with the lock held."""
+        for group in self.__unsorted:
+            jobs = self.__groups.get(group)
+            if jobs is not None:
+                self.__groups[group] = deque(
+                    sorted(jobs, key=lambda job: queue_position(job, self.order))
+                )
+        self.__unsorted.clear()
+
+    def pending_count(self) -> int:
+        """Count the jobs that are waiting to start."""
+        with self.__lock:
+            return sum(len(jobs) for jobs in self.__groups.values())
+
+    def remove(self, job_ids: Collection[int]) -> int:
+        """Drop the given jobs if they didn't start, and return how many were."""
+        removed: list[TranscriptionJob] = []
+
+        with self.__lock:
+            for group, jobs in list(self.__groups.items()):
+                remaining = deque(job for job in jobs if job.job_id not in job_ids)
+                removed.extend(job for job in jobs if job.job_id in job_ids)
+                if remaining:
+                    self.__groups[group] = remaining
+                else:
+                    del self.__groups[group]
+
+        for job in removed:
+            audio_block = self.__prefetcher.take(job)
+            if audio_block is not None:
+                release(audio_block)
+
+        return len(removed)
+
+    def __upcoming_jobs(self) -> list[TranscriptionJob]:
+        """Get the first jobs in the queue, in about the order they will start."""
+        with self.__lock:
+            self.__sort_groups()
+            return list(
+                itertools.islice(
+                    itertools.chain.from_iterable(self.__groups.values()),
+                    PREFETCH_LOOKAHEAD,
+                )
+            )
+
+    def __next_job(
+        self, preferred_group: Optional[JobGroup]
+    ) -> Optional[TranscriptionJob]:
+        """Get the next job, preferring the given group to reuse its loaded model."""
+        with self.__lock:
+            if not self.__groups:
+                return None
+
+            self.__sort_groups()
+
+            if preferred_group in self.__groups:
+                group = cast(JobGroup, preferred_group)
+            else:
+                group = next(iter(self.__groups))
+
+            jobs = self.__groups[group]
+            job = jobs.popleft()
+            if not jobs:
+                del self.__groups[group]
+            return job
+
+    def __next_batch(self, job: TranscriptionJob) -> list[TranscriptionJob]:
+        """Take more jobs of the same group to run with the given one."""
+        if self.batch_size <= 1 or job.device != "cpu":
+            return [job]
+
+        with self.__lock:
+            jobs = self.__groups.get(job.group)
+            if jobs is None:
+                return [job]
+
+            batch = [job]
+            while jobs and len(batch) < self.batch_size:
+                batch.append(jobs.popleft())
+            if not jobs:
+                del self.__groups[job.group]
+
+        return batch
+
+    def __split(self, job: TranscriptionJob, max_workers: int) -> TranscriptionJob:
+        """
+        Split a long job to chunks and queue them first, then return the first one.
+
+        The job is returned as it is if it's too short or its duration is unknown.
+        """
+        if job.duration is not None:
+            duration = job.duration
+        else:
+            try:
+                duration = probe_duration(job.audio_file_path)
+            except (OSError, subprocess.CalledProcessError, ValueError):
+                # The worker will report why the file can't be read.
+                return job
+
+        chunked = ChunkedTranscription(job, duration, max_workers)
+        if len(chunked.chunks) < 2:
+            return job
+
+        for chunk in chunked.chunks:
+            self.__chunked[chunk.job_id] = chunked
+
+        with self.__lock:
+            jobs = self.__groups.setdefault(job.group, deque())
+            jobs.extendleft(reversed(chunked.chunks[1:]))
+            # Keep the other chunks next, so all the workers can get one.
+            self.__groups.move_to_end(job.group, last=False)
+
+        return chunked.chunks[0]
+
+    def __drop_chunks(self, chunked: ChunkedTranscription) -> None:
+        """Forget the chunks of a job, and remove the ones that didn't start."""
+        chunk_ids = {chunk.job_id for chunk in chunked.chunks}
+
+        for chunk_id in chunk_ids:
+            self.__chunked.pop(chunk_id, None)
+
+        with self.__lock:
+            jobs = self.__groups.get(chunked.job.group)
+            if jobs is not None:
+                remaining = [job for job in jobs if job.job_id not in chunk_ids]
+                if remaining:
+                    self.__groups[chunked.job.group] = deque(remaining)
+                else:
+                    del self.__groups[chunked.job.group]
+
+    def __worker_count(self) -> int:
+        """Maximum number of workers to run for the current queue."""
+        if self.max_workers > 0:
+            return self.max_workers
+
+        with self.__lock:
+            models = [model for model, *_ in self.__groups]
+
+        # Use the biggest queued model for the estimation to stay on the safe side.
+        return default_max_workers(max(models, key=model_memory) if models else None)
+
+    def __spawn_worker(self, max_workers: int) -> WhisperProcess:
+        """Start a new worker that shares the free memory with the next ones."""
+        memory = available_memory()
+        memory_budget = memory // max(1, max_workers - len(self.__workers))
+
+        # The first share of the cores that no running worker has.
+        used_slots = set(self.__worker_slots.values())
+        slot = next(slot for slot in itertools.count() if slot not in used_slots)
+        allocations = allocate_cores(max_workers, self.threads)
+        allocation = allocations[slot % len(allocations)]
+
+        worker = WhisperProcess(
+            next(self.__worker_ids),
+            self.model_dir,
+            allocation.threads,
+            self.__events,
+            memory_budget,
+            self.idle_timeout,
+            self.result_cache,
+            self.verbose,
+            self.map_weights,
+            allocation.cpus if self.pin_workers else (),
+            self.trace,
+        )
+        worker.start()
+        self.__workers[worker.index] = worker
+        self.__worker_slots[worker.index] = slot
+
+        return worker
+
+    def __idle_worker(self, max_workers: int) -> Optional[WhisperProcess]:
+        """Get a worker for the next job, starting a new one only when needed."""
+        idle = [
+            worker
+            for index, worker in self.__workers.items()
+            if index not in self.__running
+        ]
+
+        with self.__lock:
+            queued_groups = set(self.__groups)
+
+        for worker in idle:
+            if self.__worker_groups.get(worker.index) in queued_groups:
+                return worker
+
+        if idle:
+            return idle[0]
+
+        if len(self.__workers) < max_workers:
+            return self.__spawn_worker(max_workers)
+
+        return None
+
+    def __dispatch(
+        self,
+        max_workers: int,
+        on_job_started: Optional[Callable[[TranscriptionJob], None]],
+    ) -> None:
+        """Fill the free slots with jobs from the queue."""
+        while len(self.__running) < max_workers and self.pending_count():
+            worker = self.__idle_worker(max_workers)
+            if worker is None:
+                break
+
+            job = self.__next_job(self.__worker_groups.get(worker.index))
+            if job is None:
+                break
+
+            if job.parallel_chunks:
+                job = self.__split(job, max_workers)
+
+            batch = self.__next_batch(job)
+
+            # Only the worker's copies have the audio, which is freed when they finish.
+            worker_jobs = []
+            for job in batch:
+                worker_job = copy.copy(job)
+                if self.__locked_language and job.audio_language == "Auto":
+                    worker_job.locked_language = self.__locked_language
+                audio_block = self.__prefetcher.take(job)
+                if audio_block is not None:
+                    self.__audio_blocks[job.job_id] = audio_block
+                    worker_job.audio = shared_audio(audio_block)
+                worker_jobs.append(worker_job)
+
+            worker.send(worker_jobs)
+            self.__running[worker.index] = {job.job_id: job for job in batch}
+            self.__worker_groups[worker.index] = job.group
+
+            for job in batch:
+                self.__job_started(job, on_job_started)
+
+    def __job_started(
+        self,
+        job: TranscriptionJob,
+        on_job_started: Optional[Callable[[TranscriptionJob], None]],
+    ) -> None:
+        """Report a started job, or the whole job when its first chunk starts."""
+        chunked = self.__chunked.get(job.job_id)
+        if chunked is not None:
+            if not chunked.started and on_job_started:
+                on_job_started(chunked.job)
+            chunked.started = True
+        elif on_job_started:
+            on_job_started(job)
+
+    def __release_audio(self, job: TranscriptionJob) -> None:
+        """Free the shared memory of a job's audio after its worker finished."""
+        audio_block = self.__audio_blocks.pop(job.job_id, None)
+        if audio_block is not None:
+            release(audio_block)
+
+    def __collect_crashed(
+        self, on_job_finished: Optional[Callable[[TranscriptionJob, bool], None]]
+    ) -> None:
+        """Fail the jobs of workers that died without reporting back."""
+        for index in set(self.__running) | set(self.__writing):
+            worker = self.__workers[index]
+            if worker.is_alive():
+                continue
+
+            worker.join()
+            del self.__workers[index]
+            del self.__worker_slots[index]
+            self.__worker_groups.pop(index, None)
+            jobs = {**self.__running.pop(index, {}), **self.__writing.pop(index, {})}
+            for job in jobs.values():
+                job.error = f"The worker stopped unexpectedly ({worker.exitcode})."
+                self.__job_finished(job, False, None, on_job_finished)
+
+    def __job_finished(
+        self,
+        job: TranscriptionJob,
+        success: bool,
+        data: Any,
+        on_job_finished: Optional[Callable[[TranscriptionJob, bool], None]],
+    ) -> None:
+        """Free the job's resources, and stitch its file when it's the last chunk."""
+        self.__release_audio(job)
+
+        chunked = self.__chunked.pop(job.job_id, None)
+        if chunked is None:
+            # A chunk of a job that already failed is not reported.
+            if job.chunk is None and on_job_finished:
+                on_job_finished(job, success)
+            return
+
+        if not success:
+            # The whole job failed, so its other chunks are not needed.
+            self.__drop_chunks(chunked)
+            chunked.job.error = job.error
+            if on_job_finished:
+                on_job_finished(chunked.job, False)
+            return
+
+        chunked.add_result(job, *data)
+        if not chunked.finished:
+            return
+
+        try:
+            write_outputs(chunked.stitch(), chunked.job)
+        except OSError as error:
+            chunked.job.error = str(error)
+            success = False
+
+        if on_job_finished:
+            on_job_finished(chunked.job, success)
+
+    def __record_language(self, language: str, probability: float) -> None:
+        """Count a detected language, and lock it when it's clearly the majority."""
+        self.__detections.append((language, probability))
+        if not self.lock_language or self.__locked_language:
+            return
+
+        majority, count = Counter(
+            language for language, _ in self.__detections
+        ).most_common(1)[0]
+        confident = sum(
+            language == majority and probability >= LANGUAGE_LOCK_PROBABILITY
+            for language, probability in self.__detections
+        )
+
+        if confident >= LANGUAGE_LOCK_MIN_FILES and count * 2 > len(self.__detections):
+            self.__locked_language = majority
+
+    def __job_progress(
+        self,
+        job: TranscriptionJob,
+        event: WorkerEvent,
+        on_job_progress: Optional[Callable[[TranscriptionJob, WorkerEvent], None]],
+    ) -> None:
+        """Report the progress of a job, or of the whole job for a chunk."""
+        chunked = self.__chunked.get(job.job_id)
+        if event.kind == "trace":
+            # The stages of every chunk are a part of the whole job.
+            (job if chunked is None else chunked.job).spans.extend(event.data)
+            return
+
+        if chunked is not None and event.kind in CHUNK_REPORTED_EVENTS:
+            # The result of the first chunk decides the language of the whole job.
+            if event.kind != "model_loaded" and chunked.index(job) != 0:
+                return
+            job = chunked.job
+            event = event._replace(job_id=job.job_id)
+            chunked = None
+
+        if event.kind == "language":
+            job.detected_language = event.data
+            self.__record_language(*event.data)
+        elif event.kind == "warning":
+            job.warnings.append(event.data)
+
+        if chunked is None:
+            if job.chunk is None and on_job_progress:
+                on_job_progress(job, event)
+            return
+
+        # Only the segments are reported, as the position in the whole audio.
+        if event.kind == "segment" and on_job_progress:
+            number, position, _duration = event.data
+            on_job_progress(
+                chunked.job,
+                event._replace(
+                    job_id=chunked.job.job_id,
+                    data=(
+                        number,
+                        chunked.update_position(job, position),
+                        chunked.duration,
+                    ),
+                ),
+            )
+
+    def run(
+        self,
+        on_job_started: Optional[Callable[[TranscriptionJob], None]] = None,
+        on_job_finished: Optional[Callable[[TranscriptionJob, bool], None]] = None,
+        on_job_progress: Optional[
+            Callable[[TranscriptionJob, WorkerEvent], None]
+        ] = None,
+        keep_alive: bool = False,
+    ) -> bool:
+        """
+        Run queued jobs until the queue is empty or the scheduler is cancelled.
+
+        `on_job_progress` receives every event of a running job other than finishing,
+        and other than its trace, which is added to the job's `spans`.
+        With `keep_alive` it waits for jobs that other threads submit when the queue
+        is empty, until it's cancelled.
+        A run that starts while another one is stopping waits for it first, so a
+        cancellation is always handled by the run that it was meant for.
+        Return `False` if it was cancelled.
+        """
+        with self.__run_lock:
+            return self.__run(
+                on_job_started, on_job_finished, on_job_progress, keep_alive
+            )
+
+    def __run(
+        self,
+        on_job_started: Optional[Callable[[TranscriptionJob], None]],
+        on_job_finished: Optional[Callable[[TranscriptionJob, bool], None]],
+        on_job_progress: Optional[Callable[[TranscriptionJob, WorkerEvent], None]],
+        keep_alive: bool,
+    ) -> bool:
+        """Run the loop of `run`, with the lock held."""
+        self.__cancelled.clear()
+        self.__detections.clear()
+        self.__locked_language = None
+        max_workers = self.__worker_count()
+
+        while not self.__cancelled.is_set():
+            self.__dispatch(max_workers, on_job_started)
+            self.__prefetcher.prefetch(self.__upcoming_jobs())
+
+            if not self.__running and not self.__writing and not keep_alive:
+                break
+
+            # Wait for any worker to report, with a timeout to check for cancellation.
+            try:
+                event = self.__events.get(timeout=0.5)
+            except queue.Empty:
+                self.__collect_crashed(on_job_finished)
+                continue
+
+            # Events from workers that were already collected as crashed are ignored.
+            if event.kind == "transcribed":
+                job = pop_job(self.__running, event.worker, event.job_id)
+                if job is not None:
+                    # The worker can run the next job while it writes the outputs.
+                    self.__writing.setdefault(event.worker, {})[job.job_id] = job
+                    self.__release_audio(job)
+            elif event.kind in ("finished", "failed"):
+                job = pop_job(self.__running, event.worker, event.job_id)
+                if job is None:
+                    job = pop_job(self.__writing, event.worker, event.job_id)
+                if job is not None:
+                    if event.kind == "failed":
+                        job.error = event.data
+
+                    self.__job_finished(
+                        job, event.kind == "finished", event.data, on_job_finished
+                    )
+            else:
+                job = self.__running.get(event.worker, {}).get(event.job_id)
+                if job is None:
+                    job = self.__writing.get(event.worker, {}).get(event.job_id)
+                if job is not None:
+                    self.__job_progress(job, event, on_job_progress)
+
+            self.__collect_crashed(on_job_finished)
+
+        if self.__cancelled.is_set():
+            self.__stop_running()
+            return False
+
+        return True
+
+    def __stop_running(self) -> None:
+        """
+        Stop the jobs of a cancelled run, keeping the workers and their models.
+
+        The events that the workers still send about the stopped jobs are ignored by
+        the next run. The workers that are writing outputs finish writing them.
+        """
+        if CANCEL_SIGNAL is None:
+            # Without the signal, the workers can only be terminated.
+            self.shutdown()
+            return
+
+        for index, jobs in self.__running.items():
+            self.__workers[index].cancel()
+            for job in jobs.values():
+                self.__release_audio(job)
+
+        self.__running.clear()
+        self.__writing.clear()
+        self.__chunked.clear()
+
+    def cancel(self) -> None:
+        """Drop all the queued jobs and stop the running ones."""
+        with self.__lock:
+            self.__groups.clear()
+
+        self.__prefetcher.clear()
+        self.__cancelled.set()
+
+    def shutdown(self) -> None:
+        """Stop all the workers, the running jobs are not completed."""
+        for index, worker in self.__workers.items():
+            if index in self.__running:
+                worker.terminate()
+            else:
+                # It finishes writing the outputs of its last jobs first.
+                worker.send(None)
+
+        for worker in self.__workers.values():
+            worker.join()
+
+        for jobs in self.__running.values():
+            for job in jobs.values():
+                self.__release_audio(job)
+
+        self.__workers.clear()
+        self.__worker_slots.clear()
+        self.__running.clear()
+        self.__writing.clear()
+        self.__worker_groups.clear()
+        self.__chunked.clear()
+
+        # A terminated worker might have left the queue in a broken state.
+        self.__events = multiprocessing.Queue()
@@ -0,0 +1,475 @@
+"""
+Local service that keeps the workers and their loaded models between clients.
+
+Clients connect to a Unix socket and exchange lines of JSON. A client sends a single
+request, and the service answers with events until the request is done. With
+`{"request": "transcribe", "jobs": [...]}` the events are of the given jobs, and
+end with a `done` event when all of them finished. Several clients can transcribe
+at the same time, sharing the workers.
+"""
+import json
+import os
+import queue
+import select
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+
+from .__about__ import APP_NAME
+from .default_files import xdg_cache_dir
+from .jobs import TranscriptionJob
+from .jobs import WorkerEvent
+from .scheduler import JobScheduler
+
+# Events of a running job that are sent to its client, other than finishing.
+FORWARDED_EVENTS = ("model_loaded", "decoded", "language", "warning", "segment", "text")
+
+# Seconds between two checks of whether a waiting client disconnected.
+CLIENT_CHECK_INTERVAL = 1.0
+
+
+class ServiceError(Exception):
+    """The service refused a request or stopped before answering it."""
+
+
+def default_socket_path() -> Path:
+    """Socket in the runtime directory of the user, or in the cache without one."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    directory = Path(runtime_dir) if runtime_dir else xdg_cache_dir()
+
+    return directory / f"{APP_NAME}.sock"
+
+
+def describe_job(job: TranscriptionJob) -> dict[str, Any]:
+    """Describe a job by the arguments that create it, to send it to the service."""
+    return {
+        "audio_file_path": job.audio_file_path,
+        "output_directory": job.output_directory,
+        "model": job.model,
+        "device": job.device,
+        "audio_language": job.audio_language,
+        "options": job.options,
+        "vad_aggressiveness": job.vad_aggressiveness,
+        "parallel_chunks": job.parallel_chunks,
+        "precision": job.precision,
+        "output_formats": job.output_formats,
+    }
+
+
+def service_available(socket_path: Optional[Path] = None) -> bool:
+    """Whether a service accepts clients at the socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(str(socket_path or default_socket_path()))
+        except OSError:
+            return False
+
+    return True
+
+
+def request(
+    message: dict[str, Any], socket_path: Optional[Path] = None
+) -> Iterator[dict[str, Any]]:
+    """Send a request to the service, and get its events until it's done."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(str(socket_path or default_socket_path()))
+        except OSError as error:
+            raise ServiceError(f"The service is not running ({error}).") from error
+
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        with connection.makefile("rb") as file:
+            for line in file:
+                event = json.loads(line)
+                if event["event"] == "error":
+                    raise ServiceError(event["message"])
+
+                yield event
+
+
+class Subscription:
+    """The events of the jobs of a client, until all of them finished."""
+
+    def __init__(self, refs: dict[int, Any]) -> None:
+        """Initialize it with the job id -> the client's reference of every job."""
+        self.refs = refs
+        # The events to send, where `None` ends them.
+        self.events: queue.Queue[Optional[dict[str, Any]]] = queue.Queue()
+
+    def send(self, job: TranscriptionJob, event: str, **data: Any) -> None:
+        """Send an event of a job, and end the events after its last job."""
+        self.events.put({"event": event, "ref": self.refs[job.job_id], **data})
+
+        if event == "finished":
+            del self.refs[job.job_id]
+            if not self.refs:
+                self.events.put(None)
+
+
+class ServiceHandler(socketserver.StreamRequestHandler):
+    """Answer the request of a client."""
+
+    server: "ServiceServer"
+
+    def handle(self) -> None:
+        """Read the request and send its events."""
+        try:
+            self.__handle()
+        except OSError:
+            # The client disconnected.
+            pass
+
+    def __handle(self) -> None:
+        """Answer the request, where a connection without one only checks for it."""
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            message = json.loads(line)
+            kind = message["request"]
+        except (ValueError, KeyError, TypeError):
+            self.__send({"event": "error", "message": "Invalid request."})
+            return
+
+        service = self.server.service
+        if kind == "transcribe":
+            self.__transcribe(service, message.get("jobs", []))
+        elif kind == "status":
+            self.__send({"event": "status", **service.status()})
+        elif kind == "shutdown":
+            self.__send({"event": "done"})
+            service.stop()
+        else:
+            self.__send({"event": "error", "message": f"Unknown request {kind}."})
+
+    def __send(self, event: dict[str, Any]) -> None:
+        """Send a line of JSON."""
+        self.wfile.write(json.dumps(event).encode() + b"\n")
+        self.wfile.flush()
+
+    def __disconnected(self) -> bool:
+        """Whether the client closed its side of the connection."""
+        readable, _, _ = select.select((self.connection,), (), (), 0)
+        return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+
+    def __transcribe(
+        self, service: "TranscriptionService", descriptions: list[dict[str, Any]]
+    ) -> None:
+        """Run the jobs of the client, and send their events until they finished."""
+        try:
+            refs = [description.pop("ref", None) for description in descriptions]
+            jobs = [TranscriptionJob(**description) for description in descriptions]
+        except (AttributeError, TypeError) as error:
+            self.__send({"event": "error", "message": f"Invalid job: {error}"})
+            return
+
+        if not jobs:
+            self.__send({"event": "done"})
+            return
+
+        subscription = Subscription({job.job_id: ref for job, ref in zip(jobs, refs)})
+        service.submit(jobs, subscription)
+        for job, ref in zip(jobs, refs):
+            self.__send({"event": "queued", "ref": ref, "file": job.audio_file_path})
+
+        try:
+            while True:
+                try:
+                    event = subscription.events.get(timeout=CLIENT_CHECK_INTERVAL)
+                except queue.Empty:
+                    if self.__disconnected():
+                        return
+                    continue
+
+                if event is None:
+                    self.__send({"event": "done"})
+                    return
+
+                self.__send(event)
+        finally:
+            # The jobs of a client that disconnected are not started.
+            service.unsubscribe(subscription)
+
+
+class ServiceServer(socketserver.ThreadingUnixStreamServer):
+    """Server of a Unix socket, with a thread for every client."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, service: "TranscriptionService") -> None:
+        """Listen at the socket, which only the user can connect to."""
+        self.service = service
+        # The socket gets its permissions when it's bound, so nobody else can
+        # connect to it before they are set.
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(socket_path), ServiceHandler)
+        finally:
+            os.umask(umask)
+
+
+class TranscriptionService:
+    """
+    Run the jobs of the clients of a socket on long lived workers.
+
+    The workers keep the models loaded between the jobs of all the clients, so a
+    job of a model that was used recently starts right away.
+    """
+
+    def __init__(self, scheduler: JobScheduler, socket_path: Path) -> None:
+        """Initialize it, the socket is created when it's served."""
+        self.scheduler = scheduler
+        self.socket_path = socket_path
+
+        # Job id -> the subscription of the client that submitted it.
+        self.__subscriptions: dict[int, Subscription] = {}
+        self.__lock = threading.Lock()
+        self.__served_jobs = 0
+
+    def submit(self, jobs: list[TranscriptionJob], subscription: Subscription) -> None:
+        """Queue the jobs of a client."""
+        with self.__lock:
+            for job in jobs:
+                self.__subscriptions[job.job_id] = subscription
+
+        for job in jobs:
+            self.scheduler.submit(job)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Drop the jobs of a client that didn't start, the others finish unseen."""
+        with self.__lock:
+            job_ids = [
+                job_id
+                for job_id, job_subscription in self.__subscriptions.items()
+                if job_subscription is subscription
+            ]
+            for job_id in job_ids:
+                del self.__subscriptions[job_id]
+
+        self.scheduler.remove(job_ids)
+
+    def status(self) -> dict[str, Any]:
+        """Numbers of the jobs of the service."""
+        with self.__lock:
+            return {
+                "unfinished": len(self.__subscriptions),
+                "pending": self.scheduler.pending_count(),
+                "served": self.__served_jobs,
+            }
+
+    def __send(self, job: TranscriptionJob, event: str, **data: Any) -> None:
+        """Send an event of a job to its client."""
+        with self.__lock:
+            if event == "finished":
+                subscription = self.__subscriptions.pop(job.job_id, None)
+                self.__served_jobs += 1
+            else:
+                subscription = self.__subscriptions.get(job.job_id)
+
+        if subscription is not None:
+            subscription.send(job, event, **data)
+
+    def __on_job_started(self, job: TranscriptionJob) -> None:
+        """Tell the client that its job started."""
+        self.__send(job, "started", file=job.audio_file_path)
+
+    def __on_job_progress(self, job: TranscriptionJob, event: WorkerEvent) -> None:
+        """Forward the progress of a job to its client."""
+        if event.kind in FORWARDED_EVENTS:
+            self.__send(job, event.kind, data=event.data)
+
+    def __on_job_finished(self, job: TranscriptionJob, success: bool) -> None:
+        """Tell the client how its job finished."""
+        self.__send(
+            job,
+            "finished",
+            success=success,
+            error=job.error,
+            warnings=job.warnings,
+            detected_language=job.detected_language,
+        )
+
+    def serve(self) -> None:
+        """Accept clients and run their jobs until it's stopped."""
+        prepare_socket(self.socket_path)
+        server = ServiceServer(self.socket_path, self)
+        thread = threading.Thread(target=server.serve_forever, name="service")
+        thread.start()
+
+        try:
+            self.scheduler.run(
+                self.__on_job_started,
+                self.__on_job_finished,
+                self.__on_job_progress,
+                keep_alive=True,
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            # A cancelled run keeps the workers, which a stopped service doesn't need.
+            self.scheduler.shutdown()
+            try:
+                os.remove(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+            # The clients of the jobs that didn't finish don't wait for them.
+            with self.__lock:
+                subscriptions = set(self.__subscriptions.values())
+                self.__subscriptions.clear()
+            for subscription in subscriptions:
+                subscription.events.put(None)
+
+    def stop(self) -> None:
+        """Stop serving, the running jobs are not completed."""
+        self.scheduler.cancel()
+
+
+def prepare_socket(socket_path: Path) -> None:
+    """
+    Remove the socket of a service that stopped without removing it.
+
+    Raise `ServiceError` if another service is using it.
+    """
+    if service_available(socket_path):
+        raise ServiceError(f"Another service is running at {socket_path}.")
+
+    try:
+        os.remove(socket_path)
+    except FileNotFoundError:
+        pass
+
+    Path.mkdir(socket_path.parent, parents=True, exist_ok=True)
+
+
+class ServiceClient:
+    """
+    Run jobs in the service, like a `JobScheduler` but without its own workers.
+
+    Jobs are sent to the service when it runs, and their events are reported to the
+    same callbacks. The job objects get the results that the scheduler would give
+    them, other than the spans of their stages.
+    """
+
+    def __init__(self, socket_path: Optional[Path] = None) -> None:
+        """Initialize an empty queue."""
+        self.socket_path = socket_path or default_socket_path()
+
+        self.__jobs: list[TranscriptionJob] = []
+        self.__connection: Optional[socket.socket] = None
+        self.__cancelled = threading.Event()
+
+    def submit(self, job: TranscriptionJob) -> None:
+        """Add a job to the queue."""
+        self.__jobs.append(job)
+
+    def pending_count(self) -> int:
+        """Count the jobs that were not sent to the service yet."""
+        return len(self.__jobs)
+
+    def run(
+        self,
+        on_job_started: Optional[Callable[[TranscriptionJob], None]] = None,
+        on_job_finished: Optional[Callable[[TranscriptionJob, bool], None]] = None,
+        on_job_progress: Optional[
+            Callable[[TranscriptionJob, WorkerEvent], None]
+        ] = None,
+    ) -> bool:
+        """
+        Send the queued jobs to the service and report them until they finished.
+
+        The jobs that didn't finish fail if the service stops or can't be reached.
+        Return `False` if it was cancelled.
+        """
+        self.__cancelled.clear()
+        jobs = {job.job_id: job for job in self.__jobs}
+        self.__jobs = []
+        message = {
+            "request": "transcribe",
+            "jobs": [{**describe_job(job), "ref": job.job_id} for job in jobs.values()],
+        }
+
+        error = "The service stopped."
+        try:
+            for event in self.__request(message):
+                kind = event["event"]
+                if kind == "done":
+                    break
+
+                # Events that are not about a job have no reference.
+                job = jobs.get(event.get("ref", -1))
+                if job is None:
+                    continue
+
+                if kind == "started":
+                    if on_job_started:
+                        on_job_started(job)
+                elif kind == "finished":
+                    del jobs[job.job_id]
+                    job.error = event["error"]
+                    job.warnings = event["warnings"]
+                    if event["detected_language"] is not None:
+                        language, probability = event["detected_language"]
+                        job.detected_language = (language, probability)
+                    if on_job_finished:
+                        on_job_finished(job, event["success"])
+                elif kind in FORWARDED_EVENTS:
+                    data = event["data"]
+                    if kind == "language":
+                        language, probability = data
+                        job.detected_language = (language, probability)
+                    elif kind == "warning":
+                        job.warnings.append(data)
+                    if on_job_progress:
+                        on_job_progress(job, WorkerEvent(-1, kind, job.job_id, data))
+        except (OSError, ValueError, ServiceError) as service_error:
+            error = str(service_error)
+
+        if self.__cancelled.is_set():
+            return False
+
+        for job in jobs.values():
+            job.error = error
+            if on_job_finished:
+                on_job_finished(job, False)
+
+        return True
+
+    def __request(self, message: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        """Send a request on a connection that `cancel` can close."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(str(self.socket_path))
+            self.__connection = connection
+            try:
+                connection.sendall(json.dumps(message).encode() + b"\n")
+                with connection.makefile("rb") as file:
+                    for line in file:
+                        event = json.loads(line)
+                        if event["event"] == "error":
+                            raise ServiceError(event["message"])
+
+                        yield event
+            finally:
+                self.__connection = None
+
+    def cancel(self) -> None:
+        """Drop the queued jobs, and disconnect so the service drops the others."""
+        self.__jobs = []
+        self.__cancelled.set()
+
+        connection = self.__connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        """Nothing to stop, the workers belong to the service."""
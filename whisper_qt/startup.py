@@ -0,0 +1,32 @@
+"""Measure how long the application takes to start, to catch slow imports."""
+import json
+import sys
+import time
+from os import environ
+
+# This module is imported first by the launcher, so it's close to the real start.
+STARTED_AT = time.perf_counter()
+
+# Modules that are too heavy to be imported before the window appears.
+HEAVY_MODULES = ("torch", "numpy", "whisper_qt.whisper")
+
+
+def measurement_requested() -> bool:
+    """Whether the startup time should be reported, then the application closed."""
+    return bool(environ.get("WHISPER_QT_MEASURE_STARTUP"))
+
+
+def report_startup() -> None:
+    """Print the startup time and the heavy modules that were imported as JSON."""
+    print(
+        json.dumps(
+            {
+                "startup_seconds": time.perf_counter() - STARTED_AT,
+                "heavy_modules": [
+                    module for module in HEAVY_MODULES if module in sys.modules
+                ],
+            }
+        ),
+        file=sys.stderr,
+        flush=True,
+    )
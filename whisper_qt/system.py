@@ -0,0 +1,122 @@
+"""Information about the resources of the running system."""
+import os
+from pathlib import Path
+
+# Where Linux describes the CPUs and the NUMA nodes.
+CPU_SYSFS_DIR = Path("/sys/devices/system/cpu")
+NODE_SYSFS_DIR = Path("/sys/devices/system/node")
+
+
+def usable_cpus() -> list[int]:
+    """List the CPUs that this process is allowed to run on, in order."""
+    try:
+        # Respect CPU affinity masks, e.g. inside containers or `taskset`.
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        # `sched_getaffinity` is not available on every platform.
+        return list(range(os.cpu_count() or 1))
+
+
+def usable_cpu_count() -> int:
+    """Count the CPU cores that this process is allowed to run on."""
+    return len(usable_cpus())
+
+
+def parse_cpu_list(text: str) -> list[int]:
+    """Parse a list of CPUs like `0-3,8-11` from sysfs."""
+    cpus: list[int] = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+
+    return cpus
+
+
+def read_cpu_list(path: Path) -> list[int]:
+    """Read a list of CPUs from sysfs, empty when it's not available."""
+    try:
+        return parse_cpu_list(path.read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def cpu_topology() -> list[list[tuple[int, ...]]]:
+    """
+    Usable CPUs grouped by NUMA node, then by physical core.
+
+    Hyper-threads of the same core are grouped together. Every CPU is its own core
+    in a single node when the topology is unknown.
+    """
+    cpus = usable_cpus()
+    usable = set(cpus)
+
+    node_dirs = sorted(
+        NODE_SYSFS_DIR.glob("node[0-9]*"), key=lambda path: int(path.name[4:])
+    )
+    node_cpus = [read_cpu_list(node_dir / "cpulist") for node_dir in node_dirs]
+    nodes = [[cpu for cpu in node if cpu in usable] for node in node_cpus]
+    nodes = [node for node in nodes if node]
+
+    # CPUs that are not in any known node.
+    grouped = {cpu for node in nodes for cpu in node}
+    remaining = [cpu for cpu in cpus if cpu not in grouped]
+    if remaining:
+        nodes.append(remaining)
+
+    topology = []
+    for node in nodes:
+        cores: dict[tuple[int, ...], list[int]] = {}
+        for cpu in node:
+            siblings = read_cpu_list(
+                CPU_SYSFS_DIR / f"cpu{cpu}" / "topology" / "thread_siblings_list"
+            )
+            cores.setdefault(tuple(siblings) or (cpu,), []).append(cpu)
+        topology.append([tuple(core) for core in cores.values()])
+
+    return topology
+
+
+def available_memory() -> int:
+    """Memory in bytes that can be used without swapping, or 0 when unknown."""
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    # The value is in kB.
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+
+def process_memory() -> tuple[int, int]:
+    """
+    Resident and proportional set sizes in bytes of the current process.
+
+    The proportional size divides shared pages, like mapped files, between the
+    processes that use them, so it's the resident size when it's unknown.
+    """
+    sizes = {}
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    # The values are in kB.
+                    sizes[name] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+
+    if "Rss" not in sizes:
+        import resource
+
+        # The peak resident size, in kB on Linux.
+        sizes["Rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return sizes["Rss"], sizes.get("Pss", sizes["Rss"])
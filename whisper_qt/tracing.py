@@ -0,0 +1,227 @@
+"""
+Record how long every stage of a job takes in the workers, and export it as a trace.
+
+Nothing is recorded until a worker enables its tracer, and then a stage costs only
+two clock reads.
+"""
+import importlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .jobs import TranscriptionJob
+
+
+class Span(NamedTuple):
+    """A stage of a job in a worker, between two `time.monotonic` times."""
+
+    name: str
+    job_id: int
+    worker: int
+    start: float
+    end: float
+
+
+class Tracer:
+    """
+    Spans of the stages of the jobs that a worker is running.
+
+    A stage belongs to all the current jobs, which are more than one only while a
+    batch of them goes through the encoder together. Every thread has its own
+    current jobs, like the worker and its output writer.
+    """
+
+    def __init__(self) -> None:
+        """Initialize a disabled tracer."""
+        self.enabled = False
+        self.worker = 0
+
+        # Of the current thread: `job_ids`, and `started` with the stage name -> start
+        # of the stages that didn't end yet.
+        self.__local = threading.local()
+        self.__spans: list[Span] = []
+        self.__lock = threading.Lock()
+
+    def enable(self, worker: int) -> None:
+        """Start recording the spans of the given worker."""
+        self.enabled = True
+        self.worker = worker
+
+    @contextmanager
+    def jobs(self, *jobs: "TranscriptionJob") -> Iterator[None]:
+        """Make the stages inside the block belong to the given jobs."""
+        previous = getattr(self.__local, "job_ids", ())
+        self.__local.job_ids = tuple(job.job_id for job in jobs)
+        try:
+            yield
+        finally:
+            self.__local.job_ids = previous
+
+    def begin(self, name: str) -> None:
+        """Start a stage of the current jobs."""
+        if not self.enabled:
+            return
+
+        if not hasattr(self.__local, "started"):
+            self.__local.started = {}
+        self.__local.started[name] = time.monotonic()
+
+    def end(self, name: str) -> None:
+        """End a stage of the current jobs."""
+        if not self.enabled:
+            return
+
+        start = getattr(self.__local, "started", {}).pop(name, None)
+        if start is None:
+            return
+
+        end = time.monotonic()
+        job_ids = getattr(self.__local, "job_ids", ())
+        with self.__lock:
+            self.__spans.extend(
+                Span(name, job_id, self.worker, start, end) for job_id in job_ids
+            )
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Record the block as a stage of the current jobs."""
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def take(self, job_id: int) -> list[Span]:
+        """Remove and get the spans of a job."""
+        with self.__lock:
+            taken = [span for span in self.__spans if span.job_id == job_id]
+            self.__spans = [span for span in self.__spans if span.job_id != job_id]
+
+        return taken
+
+
+# The tracer of the current process, which is enabled only in tracing workers.
+tracer = Tracer()
+
+
+def install_tracing(whisper: ModuleType) -> None:
+    """Record the mel spectrogram that whisper's `transcribe` computes."""
+    # `whisper.transcribe` is the function that shadows its module.
+    transcribe_module = importlib.import_module(whisper.__name__ + ".transcribe")
+    log_mel_spectrogram = transcribe_module.log_mel_spectrogram
+
+    def traced_log_mel_spectrogram(*args: Any, **kwargs: Any) -> Any:
+        with tracer.span("mel"):
+            return log_mel_spectrogram(*args, **kwargs)
+
+    transcribe_module.log_mel_spectrogram = (  # type: ignore[attr-defined]
+        traced_log_mel_spectrogram
+    )
+
+
+def trace_model(model: Any) -> None:
+    """Record every encoder pass and every decoded window of a loaded model."""
+    model.encoder.register_forward_pre_hook(
+        lambda _module, _inputs: tracer.begin("encoder")
+    )
+    model.encoder.register_forward_hook(
+        lambda _module, _inputs, _output: tracer.end("encoder")
+    )
+
+    decode = model.decode
+
+    def traced_decode(*args: Any, **kwargs: Any) -> Any:
+        with tracer.span("decoder"):
+            return decode(*args, **kwargs)
+
+    model.decode = traced_decode
+
+
+def stage_times(spans: Iterable[Span]) -> dict[str, float]:
+    """
+    Seconds spent in every stage, without the stages that ran inside it.
+
+    For example, the decoder's time doesn't include the encoder when the decoder
+    runs the encoder first. The slowest stages are first.
+    """
+    tracks: defaultdict[tuple[int, int], list[Span]] = defaultdict(list)
+    for span in spans:
+        tracks[span.worker, span.job_id].append(span)
+
+    times: defaultdict[str, float] = defaultdict(float)
+    for track in tracks.values():
+        track.sort(key=lambda span: (span.start, -span.end))
+
+        # The spans that the current span is inside of.
+        parents: list[Span] = []
+        for span in track:
+            while parents and parents[-1].end <= span.start:
+                parents.pop()
+
+            duration = span.end - span.start
+            times[span.name] += duration
+            if parents:
+                times[parents[-1].name] -= duration
+            parents.append(span)
+
+    return dict(sorted(times.items(), key=lambda item: item[1], reverse=True))
+
+
+def chrome_trace(jobs: Iterable["TranscriptionJob"]) -> dict[str, Any]:
+    """
+    Convert the spans of jobs to the Chrome trace format, which Perfetto opens too.
+
+    Every worker is a process, and every file it transcribed is a thread in it.
+    """
+    jobs = [job for job in jobs if job.spans]
+    origin = min((span.start for job in jobs for span in job.spans), default=0)
+
+    events: list[dict[str, Any]] = []
+    tracks: set[tuple[int, int]] = set()
+    for job in jobs:
+        for span in job.spans:
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": "stage",
+                    "ph": "X",
+                    # In microseconds.
+                    "ts": (span.start - origin) * 1e6,
+                    "dur": (span.end - span.start) * 1e6,
+                    "pid": span.worker,
+                    "tid": job.job_id,
+                    "args": {"file": job.audio_file_path},
+                }
+            )
+
+            if (span.worker, job.job_id) not in tracks:
+                tracks.add((span.worker, job.job_id))
+                events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": span.worker,
+                        "tid": job.job_id,
+                        "args": {"name": job.audio_file_path},
+                    }
+                )
+
+    for worker in {track_worker for track_worker, _job_id in tracks}:
+        events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": worker,
+                "args": {"name": f"Worker {worker}"},
+            }
+        )
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
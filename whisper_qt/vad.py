@@ -0,0 +1,96 @@
+"""Find the parts of the audio with speech, to not transcribe long silences."""
+from bisect import bisect_left
+from bisect import bisect_right
+
+import numpy
+
+# Length of the frames that the energy is measured for.
+FRAME_SECONDS = 0.03
+# How loud, in dB over the noise floor, a frame should be to count as speech for
+# every aggressiveness level.
+AGGRESSIVENESS_MARGINS = {1: 6.0, 2: 10.0, 3: 15.0}
+# Frames louder than this, in dB relative to full scale, are always speech, so
+# recordings without silence don't lose their quiet parts.
+SPEECH_LEVEL = -30.0
+# Seconds of audio kept around every speech region.
+PADDING_SECONDS = 0.3
+# Silences shorter than this in seconds are kept inside the speech.
+MIN_SILENCE_SECONDS = 1.0
+
+
+def speech_regions(
+    audio: numpy.ndarray, sample_rate: int, aggressiveness: int
+) -> list[tuple[int, int]]:
+    """Return the (start, end) samples of the parts with speech, with padding."""
+    frame_length = int(sample_rate * FRAME_SECONDS)
+    frames_count = len(audio) // frame_length
+    if frames_count == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[: frames_count * frame_length].reshape(frames_count, frame_length)
+    energy = 10 * numpy.log10(numpy.mean(frames**2, axis=1) + 1e-10)
+
+    # Most recordings have some silence, so the quietest frames are the noise.
+    noise_floor = numpy.percentile(energy, 10)
+    threshold = min(noise_floor + AGGRESSIVENESS_MARGINS[aggressiveness], SPEECH_LEVEL)
+    speech = energy > threshold
+
+    # Where speech starts and ends, as frame indexes.
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], speech, [0]))))
+    starts, ends = edges[::2], edges[1::2]
+
+    padding = int(PADDING_SECONDS / FRAME_SECONDS)
+    min_silence = int(MIN_SILENCE_SECONDS / FRAME_SECONDS)
+
+    regions: list[tuple[int, int]] = []
+    for start, end in zip(starts - padding, ends + padding):
+        start = max(0, start)
+        if regions and start - regions[-1][1] < min_silence:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    # The last frame also covers the samples that didn't fill a whole frame.
+    return [
+        (
+            int(start) * frame_length,
+            len(audio) if end >= frames_count else int(end) * frame_length,
+        )
+        for start, end in regions
+    ]
+
+
+def condense(audio: numpy.ndarray, regions: list[tuple[int, int]]) -> numpy.ndarray:
+    """Join the given regions of the audio, without what is between them."""
+    if not regions:
+        return audio[:0]
+
+    return numpy.concatenate([audio[start:end] for start, end in regions])
+
+
+class TimeMap:
+    """Convert times in the condensed audio back to times in the original audio."""
+
+    def __init__(self, regions: list[tuple[int, int]], sample_rate: int) -> None:
+        """Initialize it with the regions that the audio was condensed to."""
+        self.__original_starts = [start / sample_rate for start, _ in regions]
+
+        self.__condensed_starts = []
+        condensed = 0.0
+        for start, end in regions:
+            self.__condensed_starts.append(condensed)
+            condensed += (end - start) / sample_rate
+
+    def original(self, time: float, end: bool = False) -> float:
+        """
+        Original time in seconds of a time in the condensed audio.
+
+        An `end` time exactly between two regions belongs to the first one.
+        """
+        if not self.__condensed_starts:
+            return time
+
+        find = bisect_left if end else bisect_right
+        index = max(0, find(self.__condensed_starts, time) - 1)
+
+        return self.__original_starts[index] + time - self.__condensed_starts[index]
@@ -0,0 +1,477 @@
+"""
+Find the media files that are added to directories, once they stopped growing.
+
+Directories are watched with inotify on Linux. Elsewhere, or on network shares where
+inotify doesn't see the changes of other machines, they are polled, and only the
+directories that changed are scanned again.
+"""
+import ctypes.util
+import errno
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+from .default_files import xdg_cache_dir
+from .media import MEDIA_EXTENSIONS
+
+# Default seconds that a file must not change before it's transcribed.
+DEFAULT_SETTLE_SECONDS = 10.0
+# Default seconds between two polls of the directories.
+DEFAULT_POLL_INTERVAL = 5.0
+
+# Seconds between two checks of the files that didn't settle yet.
+SETTLE_CHECK_INTERVAL = 1.0
+
+# Flags of `inotify_init1` and events of `inotify_add_watch`, from <sys/inotify.h>.
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+WATCHED_EVENTS = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# `struct inotify_event` before its name: wd, mask, cookie and the name's length.
+INOTIFY_EVENT = struct.Struct("iIII")
+# Enough for many events, every one is at most the header and a file name.
+INOTIFY_BUFFER_SIZE = 64 * 1024
+
+
+class FileVersion(NamedTuple):
+    """Size and modification time of a file, which change when it's written."""
+
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def of(cls, path: str) -> "FileVersion":
+        """Get the current version of a file."""
+        stat = os.stat(path)
+        return cls(stat.st_size, stat.st_mtime_ns)
+
+
+class SettledFile(NamedTuple):
+    """A media file that stopped changing, in one of the watched directories."""
+
+    path: str
+    # The watched directory that it's in.
+    root: str
+    version: FileVersion
+
+
+def is_media_file(name: str) -> bool:
+    """Whether a file name is of media, and not of a hidden or partial file."""
+    return (
+        not name.startswith(".")
+        and os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+    )
+
+
+def scan_directory(directory: str) -> tuple[list[str], list[str]]:
+    """Media files and subdirectories of a directory, without following links."""
+    files = []
+    subdirectories = []
+
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif is_media_file(entry.name) and entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    # Removed while it was scanned.
+                    pass
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+
+    return files, subdirectories
+
+
+class ProcessedLedger:
+    """
+    Files that were transcribed, so they are not queued again after a restart.
+
+    It's an append only file with a line for every transcribed file, which is
+    rewritten without the old lines of files that were transcribed again.
+    A file is queued again only when its size or modification time changes.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """Read the ledger, the file is created with the first transcribed file."""
+        self.path = path or xdg_cache_dir() / "watch" / "processed.jsonl"
+
+        self.__files: dict[str, FileVersion] = {}
+        self.__lock = threading.Lock()
+        self.__read()
+
+    def __read(self) -> None:
+        """Read the transcribed files, and compact the file when it's worth it."""
+        lines = 0
+        complete = True
+
+        try:
+            with open(self.path, "rb") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        complete = False
+                        break
+                    if not line.endswith(b"\n"):
+                        complete = False
+                        break
+
+                    self.__files[entry["path"]] = FileVersion(
+                        entry["size"], entry["mtime_ns"]
+                    )
+                    lines += 1
+        except FileNotFoundError:
+            return
+
+        # A line that was not completely written is removed with the old lines.
+        if not complete or lines > 2 * len(self.__files):
+            self.__compact()
+
+    def __compact(self) -> None:
+        """Write only the last line of every file."""
+        temporary_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as file:
+            for path, version in self.__files.items():
+                file.write(self.__line(path, version))
+        os.replace(temporary_path, self.path)
+
+    @staticmethod
+    def __line(path: str, version: FileVersion) -> str:
+        """Line of a transcribed file."""
+        return (
+            json.dumps(
+                {"path": path, "size": version.size, "mtime_ns": version.mtime_ns}
+            )
+            + "\n"
+        )
+
+    def is_processed(self, path: str, version: FileVersion) -> bool:
+        """Whether this version of the file was already transcribed."""
+        with self.__lock:
+            return self.__files.get(path) == version
+
+    def add(self, path: str, version: FileVersion) -> None:
+        """Record a transcribed file."""
+        with self.__lock:
+            self.__files[path] = version
+
+            Path.mkdir(self.path.parent, parents=True, exist_ok=True)
+            with open(self.path, "a") as file:
+                file.write(self.__line(path, version))
+
+    def __len__(self) -> int:
+        """Count the transcribed files."""
+        with self.__lock:
+            return len(self.__files)
+
+
+class DirectoryPoller:
+    """
+    Scan the directories again only when their modification time changed.
+
+    Adding, removing or renaming a file changes the time of its directory, so a poll
+    costs a `stat` of every directory instead of every file.
+    """
+
+    def __init__(self, interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        """Initialize it without directories."""
+        self.interval = interval
+
+        # Directory -> its modification time when it was last scanned.
+        self.__directories: dict[str, int] = {}
+        self.__next_poll = time.monotonic() + interval
+
+    def add_tree(self, directory: str) -> list[str]:
+        """Start polling a directory with its subdirectories, and get their files."""
+        try:
+            # Before scanning, so a file that is added meanwhile is found next time.
+            self.__directories[directory] = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+
+        files, subdirectories = scan_directory(directory)
+        for subdirectory in subdirectories:
+            if subdirectory not in self.__directories:
+                files.extend(self.add_tree(subdirectory))
+
+        return files
+
+    def wait(self, timeout: float) -> list[str]:
+        """Wait up to `timeout` seconds, and get the files of changed directories."""
+        now = time.monotonic()
+        if now + timeout < self.__next_poll:
+            time.sleep(timeout)
+            return []
+
+        time.sleep(max(0.0, self.__next_poll - now))
+        self.__next_poll = time.monotonic() + self.interval
+
+        files = []
+        for directory, mtime_ns in list(self.__directories.items()):
+            try:
+                changed = os.stat(directory).st_mtime_ns != mtime_ns
+            except OSError:
+                # The directory was removed.
+                del self.__directories[directory]
+                continue
+
+            if changed:
+                files.extend(self.add_tree(directory))
+
+        return files
+
+    def close(self) -> None:
+        """Stop polling."""
+        self.__directories.clear()
+
+
+class InotifyWatcher:
+    """Directories watched with inotify, with a watch for every subdirectory."""
+
+    def __init__(self) -> None:
+        """Initialize an inotify instance, or raise `OSError` if it's not available."""
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+
+        self.__libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.__fd = self.__libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.__fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        self.__roots: list[str] = []
+        # Watch descriptor -> the watched directory.
+        self.__directories: dict[int, str] = {}
+
+    def add_tree(self, directory: str, root: bool = True) -> list[str]:
+        """
+        Watch a directory with its subdirectories, and get their files.
+
+        Raise `OSError` when no more directories can be watched.
+        """
+        if root:
+            self.__roots.append(directory)
+
+        # Watch before scanning, so a file that is added meanwhile is not missed.
+        descriptor = self.__libc.inotify_add_watch(
+            self.__fd, os.fsencode(directory), WATCHED_EVENTS
+        )
+        if descriptor < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return []
+            # Like `ENOSPC` for the limit of watches of the user.
+            raise OSError(error, os.strerror(error), directory)
+
+        self.__directories[descriptor] = directory
+
+        files, subdirectories = scan_directory(directory)
+        for subdirectory in subdirectories:
+            files.extend(self.add_tree(subdirectory, root=False))
+
+        return files
+
+    def wait(self, timeout: float) -> list[str]:
+        """Wait up to `timeout` seconds for events, and get the changed files."""
+        readable, _, _ = select.select((self.__fd,), (), (), timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.__fd, INOTIFY_BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        files = []
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            end = offset + length
+            name = os.fsdecode(data[offset:end].rstrip(b"\0"))
+            offset = end
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so everything is scanned again.
+                for root in self.__roots:
+                    files.extend(self.add_tree(root, root=False))
+                continue
+
+            if mask & IN_IGNORED:
+                # The directory was removed.
+                self.__directories.pop(descriptor, None)
+                continue
+
+            directory = self.__directories.get(descriptor)
+            if directory is None or not name:
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    files.extend(self.add_tree(path, root=False))
+            elif is_media_file(name):
+                files.append(path)
+
+        return files
+
+    def close(self) -> None:
+        """Stop watching, which removes all the watches."""
+        os.close(self.__fd)
+
+
+class FolderWatcher:
+    """
+    Media files in directories that are new or changed, once they stopped changing.
+
+    A file is settled when its size and modification time didn't change for
+    `settle_seconds`. Every version of a file is reported once, and not at all when
+    it's in the `ledger`.
+    """
+
+    def __init__(
+        self,
+        directories: Sequence[str],
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+        ledger: Optional[ProcessedLedger] = None,
+        poll: bool = False,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        """Initialize it, the directories are watched with inotify unless `poll`."""
+        self.roots = [os.path.abspath(directory) for directory in directories]
+        self.settle_seconds = settle_seconds
+        self.ledger = ledger
+        self.poll = poll
+        self.poll_interval = poll_interval
+
+        # Why inotify is not used, when it was not available.
+        self.fallback_reason: Optional[str] = None
+
+        self.__source: Optional[Union[InotifyWatcher, DirectoryPoller]] = None
+        # Path -> its version and when it was first seen with it.
+        self.__pending: dict[str, tuple[FileVersion, float]] = {}
+        # Path -> its last reported version.
+        self.__reported: dict[str, FileVersion] = {}
+        self.__next_check = 0.0
+
+    @property
+    def method(self) -> str:
+        """How the directories are watched, "inotify" or "poll"."""
+        return "inotify" if isinstance(self.__source, InotifyWatcher) else "poll"
+
+    def start(self) -> None:
+        """Watch the directories, with the files already in them as changed."""
+        if not self.poll:
+            try:
+                self.__start(InotifyWatcher())
+                return
+            except OSError as error:
+                self.fallback_reason = str(error)
+
+        self.__start(DirectoryPoller(self.poll_interval))
+
+    def __start(self, source: Union[InotifyWatcher, DirectoryPoller]) -> None:
+        """Watch the directories with the given source."""
+        if self.__source is not None:
+            self.__source.close()
+        self.__source = source
+
+        try:
+            for root in self.roots:
+                self.__track(source.add_tree(root))
+        except OSError:
+            source.close()
+            self.__source = None
+            raise
+
+    def __track(self, paths: list[str]) -> None:
+        """Remember the current versions of changed files until they settle."""
+        now = time.monotonic()
+
+        for path in paths:
+            try:
+                version = FileVersion.of(path)
+            except OSError:
+                self.__pending.pop(path, None)
+                continue
+
+            if self.__reported.get(path) == version or (
+                self.ledger is not None and self.ledger.is_processed(path, version)
+            ):
+                self.__pending.pop(path, None)
+                continue
+
+            pending = self.__pending.get(path)
+            if pending is None or pending[0] != version:
+                self.__pending[path] = (version, now)
+
+    def __root(self, path: str) -> str:
+        """Find the watched directory that a file is in."""
+        return max(
+            (root for root in self.roots if path.startswith(os.path.join(root, ""))),
+            key=len,
+        )
+
+    def wait(self, timeout: float) -> list[SettledFile]:
+        """Wait up to `timeout` seconds, and get the files that settled."""
+        if self.__source is None:
+            raise RuntimeError("The watcher was not started.")
+
+        try:
+            self.__track(self.__source.wait(timeout))
+        except OSError as error:
+            # Too many directories to watch them all with inotify.
+            self.fallback_reason = str(error)
+            self.__start(DirectoryPoller(self.poll_interval))
+
+        now = time.monotonic()
+        if now < self.__next_check:
+            return []
+        self.__next_check = now + SETTLE_CHECK_INTERVAL
+
+        settled = []
+        for path, (version, since) in list(self.__pending.items()):
+            try:
+                current = FileVersion.of(path)
+            except OSError:
+                del self.__pending[path]
+                continue
+
+            if current != version:
+                # It's still being written.
+                self.__pending[path] = (current, now)
+            elif now - since >= self.settle_seconds:
+                del self.__pending[path]
+                self.__reported[path] = version
+                settled.append(SettledFile(path, self.__root(path), version))
+
+        return settled
+
+    def pending_count(self) -> int:
+        """Count the changed files that didn't settle yet."""
+        return len(self.__pending)
+
+    def close(self) -> None:
+        """Stop watching the directories."""
+        if self.__source is not None:
+            self.__source.close()
+            self.__source = None
@@ -0,0 +1,204 @@
+"""
+Static information about whisper, to not import torch just to display it.
+
+Run this module to check that it still matches the whisper submodule.
+"""
+# Same order as `whisper.available_models()`.
+MODELS = (
+    "tiny.en",
+    "tiny",
+    "base.en",
+    "base",
+    "small.en",
+    "small",
+    "medium.en",
+    "medium",
+    "large-v1",
+    "large-v2",
+    "large",
+)
+
+# Where whisper downloads the checkpoints from, with their SHA-256 digest and name.
+CHECKPOINT_URL = "https://openaipublic.azureedge.net/main/whisper/models/{}/{}"
+
+# Same as `whisper._MODELS`, model -> (SHA-256 digest, file name) of its checkpoint.
+CHECKPOINTS = {
+    "tiny.en": (
+        "d3dd57d32accea0b295c96e26691aa14d8822fac7d9d27d5dc00b4ca2826dd03",
+        "tiny.en.pt",
+    ),
+    "tiny": (
+        "65147644a518d12f04e32d6f3b26facc3f8dd46e5390956a9424a650c0ce22b9",
+        "tiny.pt",
+    ),
+    "base.en": (
+        "25a8566e1d0c1e2231d1c762132cd20e0f96a85d16145c3a00adf5d1ac670ead",
+        "base.en.pt",
+    ),
+    "base": (
+        "ed3a0b6b1c0edf879ad9b11b1af5a0e6ab5db9205f891f668f8b0e6c6326e34e",
+        "base.pt",
+    ),
+    "small.en": (
+        "f953ad0fd29cacd07d5a9eda5624af0f6bcf2258be67c92b79389873d91e0872",
+        "small.en.pt",
+    ),
+    "small": (
+        "9ecf779972d90ba49c06d968637d720dd632c55bbf19d441fb42bf17a411e794",
+        "small.pt",
+    ),
+    "medium.en": (
+        "d7440d1dc186f76616474e0ff0b3b6b879abc9d1a4926b7adfa41db2d497ab4f",
+        "medium.en.pt",
+    ),
+    "medium": (
+        "345ae4da62f9b3d59415adc60127b97c714f32e89e936602e85993674d08dcb1",
+        "medium.pt",
+    ),
+    "large-v1": (
+        "e4b87e7e0bf463eb8e6956e646f1e277e901512310def2c24bf0e11bd3c28e9a",
+        "large-v1.pt",
+    ),
+    "large-v2": (
+        "81f7c96c852ee8fc832187b0132e569d6c3065a3252ed18e56effd0b6a73e524",
+        "large-v2.pt",
+    ),
+    "large": (
+        "81f7c96c852ee8fc832187b0132e569d6c3065a3252ed18e56effd0b6a73e524",
+        "large-v2.pt",
+    ),
+}
+
+# Same as `whisper.tokenizer.LANGUAGES`, language code -> language name.
+LANGUAGES = {
+    "en": "english",
+    "zh": "chinese",
+    "de": "german",
+    "es": "spanish",
+    "ru": "russian",
+    "ko": "korean",
+    "fr": "french",
+    "ja": "japanese",
+    "pt": "portuguese",
+    "tr": "turkish",
+    "pl": "polish",
+    "ca": "catalan",
+    "nl": "dutch",
+    "ar": "arabic",
+    "sv": "swedish",
+    "it": "italian",
+    "id": "indonesian",
+    "hi": "hindi",
+    "fi": "finnish",
+    "vi": "vietnamese",
+    "he": "hebrew",
+    "uk": "ukrainian",
+    "el": "greek",
+    "ms": "malay",
+    "cs": "czech",
+    "ro": "romanian",
+    "da": "danish",
+    "hu": "hungarian",
+    "ta": "tamil",
+    "no": "norwegian",
+    "th": "thai",
+    "ur": "urdu",
+    "hr": "croatian",
+    "bg": "bulgarian",
+    "lt": "lithuanian",
+    "la": "latin",
+    "mi": "maori",
+    "ml": "malayalam",
+    "cy": "welsh",
+    "sk": "slovak",
+    "te": "telugu",
+    "fa": "persian",
+    "lv": "latvian",
+    "bn": "bengali",
+    "sr": "serbian",
+    "az": "azerbaijani",
+    "sl": "slovenian",
+    "kn": "kannada",
+    "et": "estonian",
+    "mk": "macedonian",
+    "br": "breton",
+    "eu": "basque",
+    "is": "icelandic",
+    "hy": "armenian",
+    "ne": "nepali",
+    "mn": "mongolian",
+    "bs": "bosnian",
+    "kk": "kazakh",
+    "sq": "albanian",
+    "sw": "swahili",
+    "gl": "galician",
+    "mr": "marathi",
+    "pa": "punjabi",
+    "si": "sinhala",
+    "km": "khmer",
+    "sn": "shona",
+    "yo": "yoruba",
+    "so": "somali",
+    "af": "afrikaans",
+    "oc": "occitan",
+    "ka": "georgian",
+    "be": "belarusian",
+    "tg": "tajik",
+    "sd": "sindhi",
+    "gu": "gujarati",
+    "am": "amharic",
+    "yi": "yiddish",
+    "lo": "lao",
+    "uz": "uzbek",
+    "fo": "faroese",
+    "ht": "haitian creole",
+    "ps": "pashto",
+    "tk": "turkmen",
+    "nn": "nynorsk",
+    "mt": "maltese",
+    "sa": "sanskrit",
+    "lb": "luxembourgish",
+    "my": "myanmar",
+    "bo": "tibetan",
+    "tl": "tagalog",
+    "mg": "malagasy",
+    "as": "assamese",
+    "tt": "tatar",
+    "haw": "hawaiian",
+    "ln": "lingala",
+    "ha": "hausa",
+    "ba": "bashkir",
+    "jw": "javanese",
+    "su": "sundanese",
+}
+
+
+def check_metadata() -> list[str]:
+    """Compare the static information with whisper, and return the differences."""
+    from .whisper import whisper
+
+    problems = []
+
+    if tuple(whisper.available_models()) != MODELS:
+        problems.append(f"MODELS should be {tuple(whisper.available_models())}")
+
+    checkpoint_urls = {
+        model: CHECKPOINT_URL.format(*checkpoint)
+        for model, checkpoint in CHECKPOINTS.items()
+    }
+    if whisper._MODELS != checkpoint_urls:
+        problems.append(f"CHECKPOINTS should match {whisper._MODELS}")
+
+    if whisper.tokenizer.LANGUAGES != LANGUAGES:
+        problems.append(f"LANGUAGES should be {whisper.tokenizer.LANGUAGES}")
+
+    return problems
+
+
+if __name__ == "__main__":
+    metadata_problems = check_metadata()
+
+    for problem in metadata_problems:
+        print(problem)
+
+    raise SystemExit(1 if metadata_problems else 0)
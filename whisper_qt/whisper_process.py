@@ -1,61 +1,797 @@
 """Processes to run whisper in them."""
+import gc
 import multiprocessing
+import os
+import queue
+import signal
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
 from pathlib import Path
+from types import FrameType
+from types import ModuleType
+from typing import Any
+from typing import Iterator
+from typing import Optional
+from typing import TYPE_CHECKING
 
-from .whisper import whisper
+from .affinity import pin_process
+from .checkpoints import CheckpointIndex
+from .jobs import TranscriptionJob
+from .jobs import WorkerEvent
+from .journal import SegmentJournal
+from .model_cache import ModelCache
+from .outputs import format_timestamp
+from .outputs import OutputWriter
+from .outputs import write_outputs
+from .prefetch import decode_audio
+from .result_cache import ResultCache
+from .system import process_memory
+from .tracing import install_tracing
+from .tracing import trace_model
+from .tracing import tracer
+from .whisper_metadata import CHECKPOINTS
+
+if TYPE_CHECKING:
+    # Import numpy and torch, which are only imported in the worker processes.
+    import numpy
+
+    from .batching import BatchItem
+    from .vad import TimeMap
+
+# Seconds of audio transcribed between commits to the journal.
+JOURNAL_CHUNK_SECONDS = 300
+# Number of segments from the previous chunk that are given as a prompt to the next.
+PROMPT_SEGMENTS = 5
+# A detected language other than the selected one is warned about from this
+# probability.
+LANGUAGE_WARNING_PROBABILITY = 0.8
+# Signal that makes a worker abandon its current jobs, where it's available.
+CANCEL_SIGNAL: Optional[signal.Signals] = getattr(signal, "SIGUSR1", None)
+
+
+class JobCancelled(BaseException):
+    """The jobs of a worker were cancelled, not caught with the errors of jobs."""
+
+
+def import_whisper() -> ModuleType:
+    """
+    Import whisper only when it's needed, since importing torch takes seconds.
+
+    It should only be called in the worker processes.
+    """
+    from .whisper import whisper
+
+    return whisper
+
+
+def offset_segment(segment: dict[str, Any], offset: float) -> dict[str, Any]:
+    """Move a segment that was transcribed from a part of the audio to its real time."""
+    return {
+        **segment,
+        "start": segment["start"] + offset,
+        "end": segment["end"] + offset,
+        # Whisper's seek is in mel frames, which are 10 ms each.
+        "seek": segment["seek"] + int(offset * 100),
+    }
+
+
+def restore_segment_times(
+    segment: dict[str, Any], time_map: "TimeMap"
+) -> dict[str, Any]:
+    """Move a segment from the audio without silence to its time in the original."""
+    return {
+        **segment,
+        "start": time_map.original(segment["start"]),
+        "end": time_map.original(segment["end"], end=True),
+        "seek": int(time_map.original(segment["seek"] / 100) * 100),
+    }
+
+
+def segment_texts(segments: list[dict[str, Any]]) -> list[tuple[float, float, str]]:
+    """Get the (start, end, text) of segments, which is all that is reported."""
+    return [(segment["start"], segment["end"], segment["text"]) for segment in segments]
+
+
+def result_key(job: TranscriptionJob) -> str:
+    """
+    Key of a job's result in the result cache.
+
+    The file is hashed only once for the job, and kept in its `result_key`.
+    """
+    if job.result_key is None:
+        job.result_key = ResultCache.key(
+            job.audio_file_path, job.model, job.audio_language, job.cache_options
+        )
+
+    return job.result_key
+
+
+def journal_key(job: TranscriptionJob) -> str:
+    """
+    Get the key of a job's journal, which doesn't read its file.
+
+    A locked language is left out, so a resumed job finds its journal even when its
+    language is locked differently, since the journal keeps the language it started
+    with.
+    """
+    return SegmentJournal.key(
+        job.audio_file_path, job.model, job.audio_language, job.decoding_options
+    )
+
+
+@contextmanager
+def attached_audio(
+    job: TranscriptionJob,
+) -> Iterator[Optional[shared_memory.SharedMemory]]:
+    """
+    Attach to the shared memory of a job's audio, if it was decoded by the scheduler.
+
+    The views of the block should be gone when the context exits.
+    """
+    audio_block = None
+    if job.audio is not None:
+        audio_block = shared_memory.SharedMemory(job.audio.name)
+
+    try:
+        yield audio_block
+    finally:
+        if audio_block is not None:
+            gc.collect()
+            try:
+                audio_block.close()
+            except BufferError:
+                # Still used by a traceback, it's closed when it's collected.
+                pass
+
+
+def model_size(model: Any) -> int:
+    """Memory in bytes used by the weights of a loaded model."""
+    size = 0
+
+    # Quantized layers keep their weights packed in tuples, not as parameters.
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if hasattr(tensor, "element_size"):
+                size += tensor.numel() * tensor.element_size()
+
+    return size
 
 
 class WhisperProcess(multiprocessing.Process):
-    """Process to run whisper in it."""
+    """
+    Long lived process to run whisper jobs in it.
+
+    Batches of jobs are received from the `jobs` queue, and the loaded models are
+    kept in memory to be reused by the next jobs. A `None` batch stops the process.
+    """
 
     def __init__(
         self,
-        audio_file_path: str,
+        index: int,
         model_dir: str,
-        audio_language: str,
-        output_directory: str,
-        model: str,
-        device: str,
         threads: int,
-        options: dict,
+        events: multiprocessing.Queue,
+        memory_budget: int = 0,
+        idle_timeout: float = 300,
+        result_cache: Optional[ResultCache] = None,
+        verbose: bool = True,
+        map_weights: bool = False,
+        cpus: tuple[int, ...] = (),
+        trace: bool = False,
     ) -> None:
-        """Get arguments from the main process."""
-        super().__init__()
+        """
+        Get arguments from the main process.
 
-        self.audio_file_path = audio_file_path
-        self.output_directory = output_directory
-        self.model = model
-        self.device = device
+        With `map_weights` the weights of CPU models are mapped from a file that all
+        the workers share, instead of loading a copy in every worker.
+        The process runs only on the given `cpus`, or on any CPU when it's empty.
+        With `trace` the stages of every job are timed, and sent before it finishes.
+        """
+        # Don't outlive the main process if it didn't stop the worker.
+        super().__init__(daemon=True)
+
+        self.index = index
         self.threads = threads
-        self.options = options
+        self.model_dir = model_dir
+        self.events = events
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.result_cache = result_cache
+        self.verbose = verbose
+        self.map_weights = map_weights
+        self.cpus = cpus
+        self.trace = trace
 
-        if audio_language == "Auto":
-            self.audio_language = None
-        else:
-            self.audio_language = audio_language
+        # The job that is waiting for a model to be loaded.
+        self.__loading_for: Optional[TranscriptionJob] = None
+        # Writes the outputs while the next job is transcribed, started by `run`.
+        self.__writer: Optional[OutputWriter] = None
 
-        self.model_dir = model_dir
+        self.jobs: multiprocessing.Queue[Optional[list[TranscriptionJob]]]
+        self.jobs = multiprocessing.Queue()
+        # Number of batches that were sent, counted by the main process.
+        self.sent_batches = 0
+        # The batches up to this number are cancelled, set by the main process.
+        self.cancelled_batches = multiprocessing.Value("q", 0, lock=False)
+        # Number of batches that were received, counted by the worker.
+        self.__received_batches = 0
+        self.__running_batch = False
+
+    def send(self, batch: Optional[list[TranscriptionJob]]) -> None:
+        """Send a batch of jobs to the worker, or `None` to stop it."""
+        if batch is not None:
+            self.sent_batches += 1
+        self.jobs.put(batch)
+
+    def cancel(self) -> None:
+        """
+        Abandon the batches that were sent so far, from the main process.
+
+        The worker keeps its models, and reports the jobs that it abandons as failed.
+        """
+        assert CANCEL_SIGNAL is not None and self.pid is not None
+        # Set first, so a batch that didn't start yet is skipped when it does.
+        self.cancelled_batches.value = self.sent_batches
+        os.kill(self.pid, CANCEL_SIGNAL)
+
+    def __cancel_running_batch(self, signum: int, frame: Optional[FrameType]) -> None:
+        """Stop the running batch if it's cancelled, the signal might come late."""
+        if self.__running_batch and self.__batch_cancelled():
+            raise JobCancelled()
+
+    def __batch_cancelled(self) -> bool:
+        """Whether the last received batch was cancelled."""
+        return self.__received_batches <= self.cancelled_batches.value
 
     def run(self) -> None:
         """Run when the process starts."""
+        from .progress_bar import install_progress_bar
+
+        # Before torch starts its threads, so they inherit the affinity.
+        pin_process(self.cpus)
+
+        whisper = import_whisper()
+        install_progress_bar(whisper)
+        if self.trace:
+            tracer.enable(self.index)
+            install_tracing(whisper)
+
         if self.threads > 0:
             whisper.torch.set_num_threads(self.threads)
 
-        # TODO: If model is not downloaded, warn user that it will take time.
-        # TODO: If an english only model was used in other language warn user.
-        # TODO: If a non-english language was used in english warn user.
-        model = whisper.load_model(self.model, self.device, self.model_dir)
+        if CANCEL_SIGNAL is not None:
+            signal.signal(CANCEL_SIGNAL, self.__cancel_running_batch)
 
-        result = model.transcribe(
-            self.audio_file_path,
-            verbose=True,
-            language=self.audio_language,
-            **self.options
+        models = ModelCache(
+            self.__load_model,
+            model_size,
+            self.memory_budget,
+            self.idle_timeout,
+            estimate=self.__estimate_model_size,
+            release=self.__release,
         )
+        self.__writer = OutputWriter()
+
+        while True:
+            try:
+                batch = self.jobs.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self.__release(models.evict_idle())
+                continue
+
+            if batch is None:
+                break
+
+            self.__received_batches += 1
+            # Set before checking, so a cancellation can't come in between.
+            self.__running_batch = True
+            try:
+                if self.__batch_cancelled():
+                    raise JobCancelled()
+                self.__run_received(models, batch)
+            except JobCancelled:
+                for job in batch:
+                    self.report(job, "failed", "The job was cancelled.")
+            finally:
+                self.__running_batch = False
+
+            self.__release(models.evict_idle())
+
+        self.__writer.close()
+        models.clear()
+
+    def __run_received(self, models: ModelCache, batch: list[TranscriptionJob]) -> None:
+        """Run a batch that was received, reporting every one of its jobs."""
+        for job in batch:
+            self.report(job, "started")
+        self.__loading_for = batch[0]
+
+        if len(batch) > 1:
+            self.run_batch(models, batch)
+            return
+
+        job = batch[0]
+        try:
+            with tracer.jobs(job):
+                chunk_result = self.run_job(models, job)
+        except Exception as error:  # noqa: B902
+            self.report(job, "failed", str(error))
+        else:
+            # The writer reports when the outputs of a whole file are written.
+            if job.chunk is not None:
+                self.report(job, "finished", chunk_result)
+
+    def __load_model(self, model: str, device: str, precision: str) -> Any:
+        """
+        Load a model from the model directory, without downloading it.
+
+        Its checkpoint is hashed only if it was not verified before.
+        """
+        whisper = import_whisper()
+        started_at = time.monotonic()
+
+        with tracer.span("load_model"):
+            loaded, mapped = self.__load_weights(whisper, model, device, precision)
+
+        if tracer.enabled:
+            trace_model(loaded)
+
+        if self.__loading_for is not None:
+            rss, pss = process_memory()
+            self.report(
+                self.__loading_for,
+                "model_loaded",
+                (model, mapped, time.monotonic() - started_at, rss, pss),
+            )
+
+        return loaded
+
+    def __estimate_model_size(self, model: str, device: str, precision: str) -> int:
+        """
+        Memory in bytes of the weights of a model before it's loaded, or 0 if unknown.
+
+        Checkpoints store float16 weights, which are loaded as float32, and int8
+        packs most of them in a quarter of that.
+        """
+        if model in CHECKPOINTS:
+            checkpoint_path = CheckpointIndex(self.model_dir).checkpoint_path(model)
+        else:
+            checkpoint_path = Path(model)
+
+        try:
+            checkpoint_size = checkpoint_path.stat().st_size
+        except OSError:
+            return 0
+
+        return checkpoint_size // 2 if precision == "int8" else checkpoint_size * 2
+
+    def __load_weights(
+        self, whisper: ModuleType, model: str, device: str, precision: str
+    ) -> tuple[Any, bool]:
+        """Load a model in the given precision, and tell whether it's mapped."""
+        mapped = False
+
+        if model in CHECKPOINTS:
+            # Whisper skips its own verification when it's given a path.
+            checkpoint_path = CheckpointIndex(self.model_dir).ensure_verified(model)
+            digest: Optional[str] = CHECKPOINTS[model][0]
+        else:
+            # Whisper also accepts the path of a checkpoint.
+            checkpoint_path = Path(model)
+            digest = None
+
+        from .mapped_weights import load_mapped
+        from .mapped_weights import mapping_supported
+        from .quantization import load_quantized
+
+        if precision == "int8" and device != "cpu" and self.__loading_for is not None:
+            self.report(
+                self.__loading_for,
+                "warning",
+                "The int8 precision is only used on the CPU, so float32 is used.",
+            )
+
+        if precision == "int8" and device == "cpu":
+            # Quantized weights are packed, so they can't be mapped.
+            loaded = load_quantized(whisper, checkpoint_path, digest)
+        elif digest is None:
+            loaded = whisper.load_model(model, device, self.model_dir)
+        elif self.map_weights and device == "cpu" and mapping_supported():
+            loaded = load_mapped(whisper, checkpoint_path, digest)
+            mapped = True
+        else:
+            loaded = whisper.load_model(str(checkpoint_path), device)
+
+        return loaded, mapped
+
+    @staticmethod
+    def __release(evicted: int) -> None:
+        """Give the memory of evicted models back to the system."""
+        if evicted:
+            gc.collect()
+
+            whisper = import_whisper()
+            if whisper.torch.cuda.is_available():
+                whisper.torch.cuda.empty_cache()
+
+    def report(self, job: TranscriptionJob, kind: str, data: Any = None) -> None:
+        """Send an event about a job to the main process."""
+        if kind in ("finished", "failed") and tracer.enabled:
+            spans = tracer.take(job.job_id)
+            if spans:
+                self.events.put(WorkerEvent(self.index, "trace", job.job_id, spans))
+
+        self.events.put(WorkerEvent(self.index, kind, job.job_id, data))
+
+    def run_job(
+        self, models: ModelCache, job: TranscriptionJob
+    ) -> Optional[tuple[list[dict[str, Any]], str]]:
+        """
+        Transcribe a job and give its result to the writer, or use the result cache.
+
+        A chunk of a file is not written, its segments and language are returned.
+        """
+        if job.chunk is not None:
+            result = self.transcribe(models.get(*job.group), job, None)
+            return result["segments"], result["language"]
+
+        # No need to load the model at all for a cached result.
+        if self.__write_cached(job):
+            return None
+
+        journal = SegmentJournal(journal_key(job))
+        result = self.transcribe(models.get(*job.group), job, journal)
+        self.__write_later(job, result, journal)
+
+        return None
+
+    def __write_cached(self, job: TranscriptionJob) -> bool:
+        """Write the outputs of a job from the result cache, if it's there."""
+        if self.result_cache is None:
+            return False
+
+        result = self.result_cache.get(result_key(job))
+        if result is None:
+            return False
+
+        self.__write_later(job, result, None, cache=False)
+        return True
+
+    def __write_later(
+        self,
+        job: TranscriptionJob,
+        result: dict[str, Any],
+        journal: Optional[SegmentJournal],
+        cache: bool = True,
+    ) -> None:
+        """
+        Give the result of a job to the writer, so the worker is free for the next job.
+
+        The writer reports when the job finished, or failed to be written.
+        """
+        self.report(job, "transcribed")
+
+        if self.__writer is None:
+            self.__write(job, result, journal, cache)
+        else:
+            self.__writer.submit(self.__write, job, result, journal, cache)
+
+    def __write(
+        self,
+        job: TranscriptionJob,
+        result: dict[str, Any],
+        journal: Optional[SegmentJournal],
+        cache: bool,
+    ) -> None:
+        """Cache and write the result of a job, end its journal, and report it."""
+        try:
+            with tracer.jobs(job), tracer.span("write_output"):
+                if cache and self.result_cache is not None:
+                    self.result_cache.put(result_key(job), result)
+                write_outputs(result, job)
+
+            if journal is not None:
+                journal.remove()
+        except Exception as error:  # noqa: B902
+            self.report(job, "failed", str(error))
+        else:
+            self.report(job, "finished")
+
+    def run_batch(self, models: ModelCache, jobs: list[TranscriptionJob]) -> None:
+        """
+        Transcribe jobs of the same model together, reporting when every job finishes.
+
+        A job that can't be decoded fails alone, but an error from the model fails
+        all the jobs that were not finished yet.
+        """
+        from .batching import transcribe_batch
+
+        items = []
+        for job in jobs:
+            try:
+                with tracer.jobs(job):
+                    if job.chunk is None and self.__write_cached(job):
+                        continue
+
+                    model = models.get(*job.group)
+                    with attached_audio(job) as audio_block:
+                        items.append(self.__batch_item(model, job, audio_block))
+            except Exception as error:  # noqa: B902
+                self.report(job, "failed", str(error))
+
+        if not items:
+            return
+
+        try:
+            transcribe_batch(model, items, self.__report_window)
+        except Exception as error:  # noqa: B902
+            for item in items:
+                self.report(item.job, "failed", str(error))
+            return
+
+        for item in items:
+            result = item.result()
+            if item.job.chunk is not None:
+                self.report(
+                    item.job, "finished", (result["segments"], result["language"])
+                )
+                continue
+
+            self.__write_later(item.job, result, item.journal)
+
+    def __batch_item(
+        self,
+        model: Any,
+        job: TranscriptionJob,
+        audio_block: Optional[shared_memory.SharedMemory],
+    ) -> "BatchItem":
+        """Prepare a job to be transcribed in a batch, continuing its journal."""
+        from .batching import BatchItem
+
+        journal = None
+        if job.chunk is None:
+            journal = SegmentJournal(journal_key(job))
+
+        segments, start, language = journal.read() if journal else ([], 0.0, None)
+
+        audio, time_map = self.__load_audio(job, audio_block)
+        if language is None:
+            language = self.__detect_language(model, job, audio)
+        with tracer.span("mel"):
+            mel = import_whisper().log_mel_spectrogram(audio)
+
+        return BatchItem(model, job, mel, language, segments, start, time_map, journal)
+
+    def __report_window(self, item: "BatchItem") -> None:
+        """Report the progress of a batch item, and print its text when verbose."""
+        self.report(
+            item.job,
+            "segment",
+            (item.windows, item.position, item.duration),
+        )
+        if item.new_segments and item.job.chunk is None:
+            self.report(item.job, "text", segment_texts(item.new_segments))
+
+        if self.verbose:
+            for segment in item.new_segments:
+                print(
+                    "[{} --> {}] {}".format(
+                        format_timestamp(segment["start"]),
+                        format_timestamp(segment["end"]),
+                        segment["text"],
+                    )
+                )
+
+    def transcribe(
+        self, model: Any, job: TranscriptionJob, journal: Optional[SegmentJournal]
+    ) -> dict[str, Any]:
+        """
+        Transcribe a single job with an already loaded model.
+
+        The audio is transcribed in chunks that are committed to the journal, so an
+        interrupted job continues from the last committed chunk.
+        """
+        # The views of the block are gone with the frame that created them.
+        with attached_audio(job) as audio_block:
+            return self.__transcribe_audio(model, job, journal, audio_block)
+
+    def __load_audio(
+        self,
+        job: TranscriptionJob,
+        audio_block: Optional[shared_memory.SharedMemory],
+    ) -> tuple["numpy.ndarray", Optional["TimeMap"]]:
+        """
+        Get the audio of a job, from shared memory or by decoding its file.
+
+        Without the silence if it should be skipped, with the map to the original times.
+        """
+        import numpy
+
+        whisper = import_whisper()
+        sample_rate = whisper.audio.SAMPLE_RATE
+
+        with tracer.span("decode_audio"):
+            if audio_block is not None and job.audio is not None:
+                # A view of the shared memory, without copying it.
+                audio = numpy.ndarray(
+                    (job.audio.samples,), numpy.float32, buffer=audio_block.buf
+                )
+            elif job.chunk is not None:
+                chunk_start, chunk_end = job.chunk
+                audio = numpy.frombuffer(
+                    decode_audio(
+                        job.audio_file_path, chunk_start, chunk_end - chunk_start
+                    ),
+                    numpy.float32,
+                )
+            else:
+                audio = whisper.load_audio(job.audio_file_path)
+
+        time_map = None
+        if job.vad_aggressiveness:
+            from .vad import condense
+            from .vad import speech_regions
+            from .vad import TimeMap
+
+            # Only the speech is transcribed, the times are restored afterwards.
+            with tracer.span("skip_silence"):
+                regions = speech_regions(audio, sample_rate, job.vad_aggressiveness)
+                time_map = TimeMap(regions, sample_rate)
+                audio = condense(audio, regions)
+
+        self.report(job, "decoded", len(audio) / sample_rate)
+
+        return audio, time_map
+
+    def __detect_language(
+        self, model: Any, job: TranscriptionJob, audio: "numpy.ndarray"
+    ) -> Optional[str]:
+        """
+        Detect the language from the first window with speech, and report it.
+
+        Return the language to transcribe with, which is the detected one for `Auto`,
+        and warn when the selected language doesn't seem to be right.
+        """
+        from .vad import speech_regions
+
+        if job.locked_language:
+            return job.locked_language
+
+        whisper = import_whisper()
+        selected = None if job.audio_language == "Auto" else job.audio_language
+        selected_code = None
+        if selected is not None:
+            selected_code = whisper.tokenizer.TO_LANGUAGE_CODE.get(
+                selected.lower(), selected.lower()
+            )
+
+        if not model.is_multilingual:
+            # English only models can't detect the language.
+            if selected_code not in (None, "en"):
+                self.report(
+                    job,
+                    "warning",
+                    f"The {job.model} model only supports English, not {selected}.",
+                )
+            return selected
+
+        with tracer.span("detect_language"):
+            # Start from the speech, since whisper detects a language even in silence.
+            regions = speech_regions(audio, whisper.audio.SAMPLE_RATE, 1)
+            start = regions[0][0] if regions else 0
+            end = start + whisper.audio.N_SAMPLES
+            window = whisper.pad_or_trim(audio[start:end])
+
+            _, probabilities = model.detect_language(
+                whisper.log_mel_spectrogram(window).to(model.device)
+            )
+        detected = max(probabilities, key=probabilities.get)
+        probability = float(probabilities[detected])
+        self.report(job, "language", (detected, probability))
+
+        if selected is None:
+            return detected
+
+        if detected != selected_code and probability >= LANGUAGE_WARNING_PROBABILITY:
+            self.report(
+                job,
+                "warning",
+                "The audio seems to be in {} ({:.0%}), not {}.".format(
+                    whisper.tokenizer.LANGUAGES[detected].title(),
+                    probability,
+                    selected,
+                ),
+            )
+
+        return selected
+
+    def __transcribe_audio(
+        self,
+        model: Any,
+        job: TranscriptionJob,
+        journal: Optional[SegmentJournal],
+        audio_block: Optional[shared_memory.SharedMemory],
+    ) -> dict[str, Any]:
+        """Transcribe the audio from a shared memory block, or decode it first."""
+        from .progress_bar import ProgressBar
+
+        sample_rate = import_whisper().audio.SAMPLE_RATE
+
+        segments, start, language = journal.read() if journal else ([], 0.0, None)
+
+        audio, time_map = self.__load_audio(job, audio_block)
+        if language is None:
+            language = self.__detect_language(model, job, audio)
+        duration = len(audio) / sample_rate
+
+        windows = 0
+
+        def report(kind: str, data: Any) -> None:
+            nonlocal windows
+
+            # The position is relative to the current chunk.
+            if kind == "segment":
+                windows += 1
+                self.report(job, kind, (windows, start + data[1], duration))
+
+        ProgressBar.report = report
+        try:
+            while start < duration:
+                end = min(duration, start + JOURNAL_CHUNK_SECONDS)
+
+                # Give the model the context that it would have without chunks.
+                prompt = None
+                if job.options.get("condition_on_previous_text", True):
+                    prompt = "".join(
+                        segment["text"] for segment in segments[-PROMPT_SEGMENTS:]
+                    )
+
+                first, last = int(start * sample_rate), int(end * sample_rate)
+                result = model.transcribe(
+                    audio[first:last],
+                    # `None` doesn't print anything, not even a progress bar.
+                    verbose=True if self.verbose else None,
+                    language=language,
+                    initial_prompt=prompt or None,
+                    **job.options,
+                )
+                # Don't detect the language again for every chunk.
+                language = result["language"]
+
+                chunk_segments = [
+                    offset_segment(segment, start) for segment in result["segments"]
+                ]
+                if end < duration and len(chunk_segments) > 1:
+                    # The last segment might be cut by the end of the chunk.
+                    chunk_segments.pop()
+                    end = max(chunk_segments[-1]["end"], start + 1)
+
+                # The journal's positions stay in the condensed audio.
+                if time_map is not None:
+                    chunk_segments = [
+                        restore_segment_times(segment, time_map)
+                        for segment in chunk_segments
+                    ]
+
+                if journal is not None:
+                    journal.append(chunk_segments, end, language)
+                segments.extend(chunk_segments)
+                if chunk_segments and job.chunk is None:
+                    self.report(job, "text", segment_texts(chunk_segments))
+                start = end
+        finally:
+            ProgressBar.report = None
+
+        if job.chunk is not None:
+            chunk_start, _ = job.chunk
+            segments = [offset_segment(segment, chunk_start) for segment in segments]
+
+        for number, segment in enumerate(segments):
+            segment["id"] = number
 
-        # Save to .srt file
-        with open(
-            Path(self.output_directory) / (Path(self.audio_file_path).name + ".srt"),
-            "w",
-        ) as file:
-            whisper.utils.write_srt(result["segments"], file)
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": language,
+        }